@@ -0,0 +1,41 @@
+"""
+Benchmarks of the overhead of lifecycle hooks: on the full get_product round-trip against the stand-in
+dispatcher, without any hook and with a callback on every event, and on emitting one event.
+"""
+
+from harness import benchmark, resource
+
+from oda_api.api import DispatcherAPI
+from oda_api.hooks import EVENTS, HookRegistry
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def noop(event):
+    pass
+
+
+@benchmark('get_product[hooks]', hooks=['none', 'all'])
+def bench_get_product_hooks(hooks):
+    dispatcher = resource(MockDispatcher(job_n_polls=3, n_products=1, product_shape=(64, 64)))
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri')
+    disp.poll_interval_s = 0
+
+    if hooks == 'all':
+        for event in EVENTS:
+            disp.hooks.add(event, noop)
+
+    return lambda: disp.get_product(instrument='isgri', product='isgri_image', E1_keV=25., E2_keV=80.)
+
+
+@benchmark('HookRegistry.emit', number=100000, n_callbacks=[0, 1])
+def bench_emit(n_callbacks):
+    hooks = HookRegistry()
+    for _ in range(n_callbacks):
+        hooks.add('on_poll', noop)
+
+    def emit():
+        # as done in the client: events are only built if any hook is registered
+        if hooks:
+            hooks.emit('on_poll', job_id='JOB', url='http://127.0.0.1', status='progress', n_poll=1, duration_s=0.)
+
+    return emit
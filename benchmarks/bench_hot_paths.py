@@ -0,0 +1,216 @@
+"""
+Benchmarks of the client hot paths: response decoding, product codecs, FITS export,
+catalogs, data collections and the full get_product round-trip against the stand-in dispatcher.
+"""
+
+import os
+import tempfile
+
+import numpy
+
+from harness import benchmark, resource
+
+from oda_api.api import DispatcherAPI, DataCollection
+from oda_api.data_products import NumpyDataUnit, NumpyDataProduct, ApiCatalog
+from oda_api.mock_dispatcher import MockDispatcher
+
+def get_dispatcher(n_products=1, image_size=256):
+    return resource(MockDispatcher(job_n_polls=1, n_products=n_products, product_shape=(image_size, image_size)))
+
+
+def get_disp(dispatcher):
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri')
+    disp.poll_interval_s = 0
+    return disp
+
+
+def image_product(image_size, n_header_keys=20):
+    data = numpy.random.RandomState(0).normal(size=(image_size, image_size)).astype(numpy.float32)
+    header = {'KEY%04d' % i: float(i) for i in range(n_header_keys)}
+    return NumpyDataProduct(NumpyDataUnit(data, data_header=header, hdu_type='image', name='image'),
+                            name='image', meta_data=dict(product='mosaic', src_name='src'))
+
+
+def table_product(n_rows, n_header_keys=0):
+    data = numpy.zeros(n_rows, dtype=[('TIME', '<f8'), ('RATE', '<f4'), ('ERROR', '<f4')])
+    data['TIME'] = numpy.arange(n_rows)
+    data['RATE'] = numpy.random.RandomState(0).normal(size=n_rows)
+    data['ERROR'] = 1.
+    header = {'KEY%04d' % i: float(i) for i in range(n_header_keys)}
+    return NumpyDataProduct(NumpyDataUnit(data, data_header=header, hdu_type='bintable', name='RATE',
+                                          units_dict=dict(TIME='d', RATE='count/s', ERROR='count/s')),
+                            name='lc', meta_data=dict(product='light_curve', src_name='src'))
+
+
+def catalog_dict(n_sources):
+    rng = numpy.random.RandomState(0)
+    columns = dict(
+        meta_ID=list(range(n_sources)),
+        src_names=['src %d' % i for i in range(n_sources)],
+        significance=rng.uniform(5, 100, n_sources).tolist(),
+        ra=rng.uniform(0, 360, n_sources).tolist(),
+        dec=rng.uniform(-90, 90, n_sources).tolist(),
+        NEW_SOURCE=[0] * n_sources,
+        ISGRI_FLAG=[1] * n_sources,
+        FLAG=[0] * n_sources,
+        ERR_RAD=[float('nan')] * n_sources,
+    )
+
+    return dict(cat_frame='fk5',
+                cat_coord_units='deg',
+                cat_column_list=list(columns.values()),
+                cat_column_names=list(columns.keys()),
+                cat_lat_name='dec',
+                cat_lon_name='ra')
+
+
+@benchmark('decode_res_json', image_size=[64, 256])
+def bench_decode_res_json(image_size):
+    dispatcher = get_dispatcher(image_size=image_size)
+    disp = get_disp(dispatcher)
+
+    disp.parameters_dict = dict(instrument='isgri', product_type='isgri_image', session_id='BENCH')
+    response, spans = disp._http_get('run_analysis', params=disp.parameters_dict_payload)
+
+    return lambda: disp._decode_res_json(response)
+
+
+@benchmark('NumpyDataProduct.encode[pickle]', image_size=[256, 1024])
+def bench_product_encode_pickle(image_size):
+    product = image_product(image_size)
+
+    return lambda: product.encode(use_pickle=True)
+
+
+@benchmark('NumpyDataProduct.encode[json]', image_size=[64, 256])
+def bench_product_encode_json(image_size):
+    product = image_product(image_size)
+
+    return lambda: product.encode(use_pickle=False)
+
+
+@benchmark('NumpyDataProduct.decode[pickle]', image_size=[256, 1024])
+def bench_product_decode_pickle(image_size):
+    encoded = image_product(image_size).encode(use_pickle=True)
+
+    return lambda: NumpyDataProduct.decode(encoded)
+
+
+@benchmark('NumpyDataProduct.decode[json]', image_size=[64, 256])
+def bench_product_decode_json(image_size):
+    encoded = image_product(image_size).encode(use_pickle=False)
+
+    return lambda: NumpyDataProduct.decode(encoded)
+
+
+@benchmark('NumpyDataProduct.decode[table,pickle]', n_rows=[1000, 100000])
+def bench_table_decode_pickle(n_rows):
+    encoded = table_product(n_rows).encode(use_pickle=True)
+
+    return lambda: NumpyDataProduct.decode(encoded)
+
+
+@benchmark('NumpyDataProduct.decode[table,json]', n_rows=[1000, 10000])
+def bench_table_decode_json(n_rows):
+    encoded = table_product(n_rows).encode(use_pickle=False)
+
+    return lambda: NumpyDataProduct.decode(encoded)
+
+
+@benchmark('NumpyDataUnit.to_fits_hdu', number=10, image_size=[256, 1024], n_header_keys=[20, 500])
+def bench_to_fits_hdu(image_size, n_header_keys):
+    data_unit = image_product(image_size, n_header_keys=n_header_keys).data_unit[0]
+
+    return data_unit.to_fits_hdu
+
+
+@benchmark('NumpyDataUnit.to_fits_hdu[table]', number=10, n_rows=[1000, 100000])
+def bench_to_fits_hdu_table(n_rows):
+    data_unit = table_product(n_rows).data_unit[0]
+
+    return data_unit.to_fits_hdu
+
+
+@benchmark('NumpyDataProduct.to_fits_hdu_list', number=10, n_header_keys=[100, 2000])
+def bench_to_fits_hdu_list(n_header_keys):
+    # a light curve with a primary unit, both with the large headers of, e.g., mosaics of many science windows
+    product = table_product(1000, n_header_keys=n_header_keys)
+    header = dict(product.data_unit[0].header, SCWLIST=['%012d.001' % i for i in range(100)])
+    product.data_unit.insert(0, NumpyDataUnit(None, data_header=header, hdu_type='primary', name='PRIMARY'))
+
+    return product.to_fits_hdu_list
+
+
+@benchmark('ApiCatalog', n_sources=[10, 1000])
+def bench_api_catalog(n_sources):
+    cat_dict = catalog_dict(n_sources)
+
+    return lambda: ApiCatalog(cat_dict, name='dispatcher_catalog')
+
+
+@benchmark('ApiCatalog.get_api_dictionary', n_sources=[10, 1000])
+def bench_api_catalog_dictionary(n_sources):
+    catalog = ApiCatalog(catalog_dict(n_sources), name='dispatcher_catalog')
+
+    return catalog.get_api_dictionary
+
+
+@benchmark('DataCollection', number=10, n_products=[10, 100])
+def bench_data_collection(n_products):
+    products = [image_product(16) for _ in range(n_products)]
+
+    return lambda: DataCollection(products, instrument='isgri', product='isgri_image')
+
+
+@benchmark('DataCollection.save', n_products=[10], image_size=[256, 1024])
+def bench_data_collection_save(n_products, image_size):
+    collection = DataCollection([image_product(image_size) for _ in range(n_products)], instrument='isgri', product='isgri_image')
+    fn = os.path.join(resource(tempfile.TemporaryDirectory()), 'collection.pickle')
+
+    return lambda: collection.save(fn)
+
+
+@benchmark('DataCollection.save_all_data', n_products=[10], image_size=[256, 1024])
+def bench_data_collection_save_all_data(n_products, image_size):
+    collection = DataCollection([image_product(image_size) for _ in range(n_products)], instrument='isgri', product='isgri_image')
+    prefix = os.path.join(resource(tempfile.TemporaryDirectory()), 'bench')
+
+    return lambda: collection.save_all_data(prenpend_name=prefix)
+
+
+@benchmark('get_product', n_products=[1, 10], image_size=[64, 256])
+def bench_get_product(n_products, image_size):
+    dispatcher = get_dispatcher(n_products=n_products, image_size=image_size)
+    disp = get_disp(dispatcher)
+
+    return lambda: disp.get_product(instrument='isgri', product='isgri_image', E1_keV=25., E2_keV=80.)
+
+
+@benchmark('decode_products', n_products=[16], executor=['none', 'thread', 'process'])
+def bench_decode_products(n_products, executor):
+    products = {'numpy_data_product_list': [image_product(512).encode(use_pickle=True) for _ in range(n_products)]}
+    disp = DispatcherAPI(url='http://127.0.0.1', instrument='isgri')
+    disp.decode_executor = None if executor == 'none' else executor
+
+    return lambda: disp.decode_products(products)
+
+
+@benchmark('get_instrument_description', metadata_cache=['off', 'memory'])
+def bench_get_instrument_description(metadata_cache):
+    dispatcher = get_dispatcher()
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri', metadata_cache=None if metadata_cache == 'memory' else False)
+    disp.dig_list = lambda description: None
+
+    return disp.get_instrument_description
+
+
+@benchmark('get_product[submit]', number=3, submit=['get', 'post', 'post+gzip'], n_scw=[500])
+def bench_get_product_submit(submit, n_scw):
+    # a light curve over many science windows, polled ten times
+    dispatcher = resource(MockDispatcher(job_n_polls=10))
+    disp = get_disp(dispatcher)
+    disp.submit_method = submit.split('+')[0]
+    disp.compress_submission = submit.endswith('+gzip')
+    scw_list = ','.join('%08d0010.001' % (1000 + i) for i in range(n_scw))
+
+    return lambda: disp.get_product(instrument='isgri', product='isgri_lc', scw_list=scw_list)
@@ -0,0 +1,21 @@
+"""
+Import-time regression benchmarks: wall time of a fresh interpreter importing oda_api modules.
+
+The 'pass' case is the interpreter startup itself, to be subtracted when comparing.
+"""
+
+import os
+import subprocess
+import sys
+
+from harness import benchmark
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@benchmark('import', repeat=10, module=['pass', 'oda_api', 'oda_api.api', 'oda_api.data_products'])
+def bench_import(module):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root_dir] + os.environ.get('PYTHONPATH', '').split(os.pathsep)))
+    code = 'pass' if module == 'pass' else 'import %s' % module
+
+    return lambda: subprocess.check_call([sys.executable, '-c', code], env=env)
@@ -0,0 +1,48 @@
+"""
+Benchmarks of the light-curve engine on large curves: concatenation of many products,
+rebinning and stacking.
+"""
+
+import numpy
+
+from harness import benchmark
+
+from oda_api import lightcurve
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+
+
+def light_curves(n_bins, n_products):
+    rng = numpy.random.RandomState(0)
+
+    products = []
+    for i in range(n_products):
+        data = numpy.zeros(n_bins // n_products, dtype=[('TIME', '<f8'), ('RATE', '<f4'), ('ERROR', '<f4')])
+        data['TIME'] = numpy.arange(i, n_bins, n_products)
+        data['RATE'] = rng.normal(10., 1., len(data))
+        data['ERROR'] = 1.
+        products.append(NumpyDataProduct(NumpyDataUnit(data, hdu_type='bintable', name='RATE'),
+                                         name='lc',
+                                         meta_data=dict(time='TIME', rate='RATE', rate_err='ERROR', time_bin=1.)))
+
+    return products
+
+
+@benchmark('lightcurve.concatenate', repeat=3, n_bins=[10**5, 10**7], n_products=[100])
+def bench_concatenate(n_bins, n_products):
+    products = light_curves(n_bins, n_products)
+
+    return lambda: lightcurve.concatenate(products)
+
+
+@benchmark('lightcurve.rebin', repeat=3, n_bins=[10**5, 10**7])
+def bench_rebin(n_bins):
+    lc, = light_curves(n_bins, 1)
+
+    return lambda: lightcurve.rebin(lc, 100.)
+
+
+@benchmark('lightcurve.stack', repeat=3, n_bins=[10**5, 10**7], n_products=[4])
+def bench_stack(n_bins, n_products):
+    products = [light_curves(n_bins // n_products, 1)[0] for _ in range(n_products)]
+
+    return lambda: lightcurve.stack(products)
@@ -0,0 +1,64 @@
+"""
+Benchmarks of image display: first draw of a large mosaic, redraw after zooming in, and headless
+rendering of previews of many products.
+"""
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy
+
+from harness import benchmark, resource
+
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+from oda_api.plot_tools import OdaImage
+
+
+def mosaic(image_size):
+    data = numpy.random.RandomState(0).normal(size=(image_size, image_size)).astype(numpy.float32)
+    data[:10] = numpy.nan
+    return NumpyDataProduct(NumpyDataUnit(data, hdu_type='image', name='image'), name='mosaic', meta_data={})
+
+
+@benchmark('OdaImage.show', repeat=3, image_size=[1024, 4096])
+def bench_show(image_size):
+    from matplotlib import pyplot
+
+    product = mosaic(image_size)
+
+    def show():
+        oda_image = OdaImage(product)
+        oda_image.show()
+        oda_image.ax.figure.canvas.draw()
+        pyplot.close('all')
+
+    return show
+
+
+@benchmark('OdaImage.zoom', number=5, image_size=[1024, 4096])
+def bench_zoom(image_size):
+    oda_image = OdaImage(mosaic(image_size))
+    oda_image.show()
+
+    def zoom():
+        oda_image.zoom(2)
+        oda_image.ax.figure.canvas.draw()
+        oda_image.zoom(0.5)
+        oda_image.ax.figure.canvas.draw()
+
+    return zoom
+
+
+@benchmark('render_previews', repeat=3, n_products=[16], processes=[1, 4])
+def bench_render_previews(n_products, processes):
+    import tempfile
+
+    from oda_api.preview import render_previews
+
+    products = [mosaic(1024) for _ in range(n_products)]
+    output_dir = resource(tempfile.TemporaryDirectory())
+
+    def render():
+        render_previews(products, output_dir=output_dir, processes=processes)
+
+    return render
@@ -0,0 +1,53 @@
+"""
+Benchmarks of the hand-off of a large decoded product to a pool of worker processes: pickled
+to each task, or shared once through shared memory.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from harness import benchmark, resource
+
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+
+
+def mosaic(image_size):
+    data = numpy.random.RandomState(0).normal(size=(image_size, image_size)).astype(numpy.float32)
+    return NumpyDataProduct(NumpyDataUnit(data, hdu_type='image', name='image'), name='mosaic', meta_data={})
+
+
+def executor():
+    # started before the products are shared, as a long-lived pool of an analysis would be
+    pool = resource(ProcessPoolExecutor(max_workers=2))
+    pool.submit(int).result()
+    return pool
+
+
+def total_pickled(product):
+    return float(product.data_unit[0].data.sum())
+
+
+def total_shared(descriptor):
+    with NumpyDataProduct.from_shared_memory(descriptor) as product:
+        return float(product.data_unit[0].data.sum())
+
+
+@benchmark('handoff[pickle]', repeat=3, image_size=[1024, 4096], n_tasks=[16])
+def bench_handoff_pickle(image_size, n_tasks):
+    product = mosaic(image_size)
+    pool = executor()
+
+    return lambda: list(pool.map(total_pickled, [product] * n_tasks))
+
+
+@benchmark('handoff[shared_memory]', repeat=3, image_size=[1024, 4096], n_tasks=[16])
+def bench_handoff_shared(image_size, n_tasks):
+    product = mosaic(image_size)
+    pool = executor()
+
+    def handoff():
+        with product.to_shared_memory() as shared:
+            return list(pool.map(total_shared, [shared.descriptor] * n_tasks))
+
+    return handoff
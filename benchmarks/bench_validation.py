@@ -0,0 +1,30 @@
+"""
+Overhead of dispatcher response validation per poll, for the validation levels of DispatcherAPI,
+compared with jsonschema.validate as it was called on every poll before.
+"""
+
+from harness import benchmark, resource
+
+from oda_api.api import DispatcherAPI
+from oda_api.mock_dispatcher import MockDispatcher
+
+def get_response(image_size):
+    dispatcher = resource(MockDispatcher(job_n_polls=1, product_shape=(image_size, image_size), n_report_entries=1000))
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri')
+    disp.parameters_dict = dict(instrument='isgri', product_type='isgri_image', session_id='BENCH')
+    response, spans = disp._http_get('run_analysis', params=disp.parameters_dict_payload)
+
+    return disp, disp._decode_res_json(response)
+
+
+@benchmark('response_validation', number=100, level=['jsonschema.validate', 'off', 'envelope', 'full'])
+def bench_response_validation(level):
+    disp, response_json = get_response(256)
+
+    if level == 'jsonschema.validate':
+        from jsonschema import validate
+        return lambda: validate(response_json, disp.dispatcher_response_schema)
+
+    disp.response_validation_level = level
+    return lambda: disp.validate_response(response_json)
@@ -0,0 +1,53 @@
+"""
+Benchmarks of waiting for jobs running for 0.3 s on the stand-in dispatcher: polled at an interval,
+long-polled, or called back; the time beyond 0.3 s is how late completion is detected.
+"""
+
+import contextlib
+
+from harness import benchmark, resource
+
+from oda_api.api import DispatcherAPI
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+@contextlib.contextmanager
+def callbacks(disp):
+    disp.enable_callbacks()
+    try:
+        yield
+    finally:
+        disp.disable_callbacks()
+
+
+@benchmark('Job.run[wait]', repeat=3, wait_method=['poll', 'long_poll'], poll_interval_s=[0.5, 2])
+def bench_job_run(wait_method, poll_interval_s):
+    dispatcher = resource(MockDispatcher(job_duration_s=0.3))
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri')
+    disp.wait_method = wait_method
+    disp.poll_interval_s = poll_interval_s
+
+    def run():
+        job = disp.new_job(dict(instrument='isgri', product_type='isgri_image', session_id='BENCH'))
+        job.run(wait=True)
+
+    return run
+
+
+@benchmark('Job.run[batch]', repeat=3, wait=['poll', 'callback'], n_jobs=[20])
+def bench_batch(wait, n_jobs):
+    # jobs submitted without waiting, and then waited for one after the other
+    dispatcher = resource(MockDispatcher(job_duration_s=0.3))
+    disp = DispatcherAPI(url=dispatcher.url, instrument='isgri', wait=False)
+    disp.poll_interval_s = 0.5
+    if wait == 'callback':
+        resource(callbacks(disp))
+
+    def run():
+        jobs = [disp.new_job(dict(instrument='isgri', product_type='isgri_image', session_id='BENCH', T1=i)) for i in range(n_jobs)]
+        for job in jobs:
+            job.run(wait=False)
+        for job in jobs:
+            job.run(wait=True)
+
+    return run
@@ -0,0 +1,162 @@
+"""
+Minimal benchmark harness: registry, timing, peak memory and JSON results.
+
+A benchmark is a setup function, registered with @benchmark, which prepares its inputs
+and returns the callable to be measured. Each callable is timed over `repeat` rounds of
+`number` calls, then called once more under tracemalloc to record its peak memory.
+
+Servers, pools and temporary directories a setup needs are entered with resource(), and
+exited once the benchmark is measured, also if it fails.
+"""
+
+import contextlib
+import datetime
+import gc
+import io
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+__all__ = ['benchmark', 'resource', 'run_benchmarks', 'compare_results']
+
+_registry = []
+
+# resources of the benchmark being run, see resource
+_exit_stack = None
+
+
+def benchmark(name, number=1, repeat=5, **params):
+    """
+    registers setup function as benchmark; each keyword gives a list of parameter values to run it with
+    """
+    def decorator(setup):
+        _registry.append(dict(name=name, setup=setup, number=number, repeat=repeat, params=params))
+        return setup
+    return decorator
+
+
+def resource(context_manager):
+    """
+    enters context_manager, e.g. a MockDispatcher or a TemporaryDirectory, for the benchmark being set up,
+    and returns its value; it is exited when the benchmark is measured
+    """
+    if _exit_stack is None:
+        raise RuntimeError("benchmark resources can only be entered in a setup run by run_benchmarks")
+
+    return _exit_stack.enter_context(context_manager)
+
+
+def _expand(params):
+    keys = sorted(params)
+    for values in itertools.product(*[params[k] for k in keys]):
+        yield dict(zip(keys, values))
+
+
+def measure(func, number=1, repeat=5):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        time=dict(
+            min=min(times),
+            median=statistics.median(times),
+            mean=statistics.mean(times),
+            stdev=statistics.stdev(times) if len(times) > 1 else 0.,
+            number=number,
+            repeat=repeat,
+        ),
+        peak_memory_bytes=peak,
+    )
+
+
+def environment():
+    import numpy
+    import oda_api
+
+    return dict(
+        oda_api_version=oda_api.__version__,
+        python=sys.version.split()[0],
+        numpy=numpy.__version__,
+        platform=platform.platform(),
+        machine=platform.machine(),
+        date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    )
+
+
+def run_benchmarks(select=None, quick=False, verbose=True):
+    """
+    runs registered benchmarks with names containing select; quick runs each only once
+    """
+    results = []
+    for entry in _registry:
+        if select is not None and select not in entry['name']:
+            continue
+
+        for params in _expand(entry['params']):
+            number, repeat = (1, 1) if quick else (entry['number'], entry['repeat'])
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = _run(entry['setup'], params, number=number, repeat=repeat)
+
+            result = dict(name=entry['name'], params=params, **result)
+            results.append(result)
+
+            if verbose:
+                print('%-40s %-30s %10.3f ms %12.1f kB' % (
+                    entry['name'],
+                    ",".join('%s=%s' % (k, v) for k, v in params.items()),
+                    result['time']['median'] * 1e3,
+                    result['peak_memory_bytes'] / 1024.))
+
+    return dict(environment=environment(), results=results)
+
+
+def _run(setup, params, number, repeat):
+    global _exit_stack
+
+    with contextlib.ExitStack() as _exit_stack:
+        try:
+            func = setup(**params)
+            return measure(func, number=number, repeat=repeat)
+        finally:
+            _exit_stack = None
+
+
+def _key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare_results(baseline, current):
+    """
+    returns (name, params, baseline median, current median, ratio) for benchmarks present in both
+    """
+    baseline_by_key = {_key(r): r for r in baseline['results']}
+
+    comparison = []
+    for r in current['results']:
+        b = baseline_by_key.get(_key(r))
+        if b is None:
+            continue
+
+        comparison.append((r['name'], r['params'], b['time']['median'], r['time']['median'],
+                           r['time']['median'] / b['time']['median']))
+
+    return comparison
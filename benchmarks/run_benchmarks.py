@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Runs the oda_api benchmark suite (all bench_*.py modules in this directory).
+
+    python benchmarks/run_benchmarks.py -o results.json
+    python benchmarks/run_benchmarks.py -k decode --compare results-1.1.3.json
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+
+# benchmark the source tree the suite belongs to
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import run_benchmarks, compare_results
+
+
+def load_benchmark_modules():
+    for fn in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_*.py'))):
+        importlib.import_module(os.path.basename(fn)[:-3])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', '--select', default=None, help='run only benchmarks with names containing this string')
+    parser.add_argument('-o', '--output', default=None, help='write JSON results to this file')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--quick', action='store_true', help='run each benchmark once, to check that they work')
+    args = parser.parse_args(argv)
+
+    load_benchmark_modules()
+
+    results = run_benchmarks(select=args.select, quick=args.quick)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        print()
+        for name, params, t_baseline, t_current, ratio in compare_results(baseline, results):
+            print('%-40s %-30s %10.3f ms -> %10.3f ms  x%.2f' % (
+                name, ",".join('%s=%s' % (k, v) for k, v in params.items()), t_baseline * 1e3, t_current * 1e3, ratio))
+
+
+if __name__ == '__main__':
+    main()
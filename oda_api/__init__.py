@@ -18,10 +18,10 @@ pkg_name = os.path.basename(pkg_dir)
 
 __version__=_info['version']
 
+# iter_modules lists subpackages without importing them, as walk_packages would to recurse
 __all__=[]
-for importer, modname, ispkg in pkgutil.walk_packages(path=[pkg_dir],
-                                                      prefix=pkg_name+'.',
-                                                      onerror=lambda x: None):
+for importer, modname, ispkg in pkgutil.iter_modules(path=[pkg_dir],
+                                                     prefix=pkg_name+'.'):
 
     if ispkg == True:
         __all__.append(modname)
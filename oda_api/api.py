@@ -17,25 +17,49 @@ import time
 import os
 import inspect
 import sys
-from astropy.io import ascii
 import base64
 import  copy
 import pickle
 from . import __version__
 from . import custom_formatters
+from . import hooks
 from . import colors as C
+from . import memtrace
+from . import ratelimit
+from .metrics import MetricsRegistry, TimedHTTPAdapter, reset_connect_time, pop_connect_time
 from itertools import cycle
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import nullcontext
 import re
+import threading
 import traceback
-from jsonschema import validate as validate_json
+import weakref
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-from .data_products import NumpyDataProduct, BinaryData, ApiCatalog
+# the AST constructor of some python versions (e.g. 3.11) is not safe to use from concurrent threads
+_literal_eval_lock = threading.Lock()
+
+
+def _literal_eval(s):
+    with _literal_eval_lock:
+        return ast.literal_eval(s)
+
+# astropy, jsonschema and the data product codecs are slow to import,
+# they are imported on first use, so that the client starts quickly
+
+__all__ = ['Request', 'NoTraceBackWithLineNumber', 'NoTraceBackWithLineNumber', 'RemoteException', 'DispatcherAPI', 'Job']
+
+def __getattr__(name):
+    # data product classes used to be imported here, keep them available
+    if name in ['NumpyDataProduct', 'BinaryData', 'ApiCatalog']:
+        from . import data_products
+        return getattr(data_products, name)
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-__all__ = ['Request', 'NoTraceBackWithLineNumber', 'NoTraceBackWithLineNumber', 'RemoteException', 'DispatcherAPI']
 
 class Request(object):
     def __init__(self,):
@@ -64,6 +88,53 @@ class RemoteException(NoTraceBackWithLineNumber):
         self.debug_message=debug_message
 
 
+def _decode_product(kind, encoded):
+    """
+    decodes one product of a dispatcher response, returning it with the time it took;
+    defined at module level to be usable in a process pool
+    """
+    from .data_products import NumpyDataProduct, BinaryData, ApiCatalog
+
+    t0 = time.perf_counter()
+
+    with memtrace.stage('product', kind=kind) as record:
+        if kind == 'numpy_data_product':
+            product = NumpyDataProduct.decode(encoded)
+        elif kind == 'binary_data_product':
+            product = BinaryData().decode(encoded)
+        elif kind == 'catalog':
+            product = ApiCatalog(encoded, name='dispatcher_catalog')
+        elif kind == 'astropy_table_product_ascii':
+            from astropy.io import ascii
+            product = ascii.read(encoded['ascii'])
+        elif kind == 'astropy_table_product_binary':
+            from astropy.io import ascii
+            product = ascii.read(encoded)
+        else:
+            raise RuntimeError(f"unknown kind of product {kind}")
+
+        if record is not None:
+            record['product'] = getattr(product, 'name', None)
+            if isinstance(product, NumpyDataProduct):
+                record['data_nbytes'] = sum(u.data.nbytes for u in product.data_unit if u.data is not None)
+
+    return product, time.perf_counter() - t0
+
+
+# decoding numpy and binary products is mostly in base64, zlib and numpy, which release the GIL;
+# astropy table parsing is pure python, and only gains from processes
+_auto_decode_executors = {
+    'numpy_data_product': 'thread',
+    'binary_data_product': 'thread',
+    'astropy_table_product_ascii': 'process',
+    'astropy_table_product_binary': 'process',
+}
+
+
+# parameters by which dispatchers may route requests, sent in every poll
+_routing_parameters = ['instrument', 'product_type', 'query_type']
+
+
 def safe_run(func):
 
     def func_wrapper(*args, **kwargs):
@@ -75,15 +146,16 @@ def safe_run(func):
         while True:
             try:
                 return func(*args, **kwargs)
-            except UserError as e:
+            except (UserError, ratelimit.InFlightLimitError) as e:
                 logger.exception("user error: %s", e)
+                _release_in_flight(self)
                 raise
             except Exception as e:
                 message = ''
                 message += '\nunable to complete API call'
                 message += '\nin ' + str(func) + ' called with:'
                 message += '\n... ' + ", ".join([str(arg) for arg in args])
-                message += '\n... ' + ", ".join([k+": "+str(v) for k,v in kwargs])
+                message += '\n... ' + ", ".join([k+": "+str(v) for k,v in kwargs.items()])
                 message += '\npossible causes:'
                 message += '\n- connection error'
                 message += '\n- wrong credentials'
@@ -95,13 +167,578 @@ def safe_run(func):
                 n_tries_left -= 1 
 
                 if n_tries_left > 0:
+                    client = getattr(self, 'client', self)
+                    if client.hooks:
+                        client.hooks.emit('on_retry', job_id=getattr(self, 'job_id', None), url=client.url,
+                                          function=func.__name__, error=repr(e), tries_left=n_tries_left)
+
                     logger.warning("problem in API call, %i tries left:\n%s\n sleeping %i seconds until retry", n_tries_left, message, self.retry_sleep_s)
                 else:
+                    _release_in_flight(self)
                     raise RemoteException(message=message)
 
     return func_wrapper
 
+
+def _release_in_flight(obj):
+    # a job failing for good gives up its in-flight slot, and takes one again if it is polled later
+    if isinstance(obj, Job):
+        obj._release_in_flight()
+
+
+class Job(object):
+    """
+    one query to the dispatcher: its parameters, job id, status and last response
+
+    Jobs are created by a DispatcherAPI, which they share as transport (connection pool, metrics, journal),
+    so that one client can drive many jobs, also concurrently from different threads.
+    """
+
+    possible_status = [
+                        "not-prepared",
+                        "prepared",
+                        "submitted",
+                        "progress",
+                        "done",
+                        "ready",
+                        "failed",
+                    ]
+
+    def __init__(self, client, parameters_dict=None):
+        self.client = client
+
+        self.job_id = None
+        self.response_json = None
+        self.t0 = None
+        self.n_poll = 0
+
+        # if the job was submitted with its parameters in a POST body, and is polled by job_id and session_id only
+        self.submitted_with_post = False
+        # if the last request was held by the dispatcher until the status of the job changed
+        self.last_request_long_polled = False
+        # URL the dispatcher was asked to call back when the job completes, see oda_api.callback_receiver
+        self.callback_url = None
+        # if the dispatcher answered the submission with callback_url with an ODA-Callback header
+        self.callback_acknowledged = False
+        # for a query run as sub-jobs over shards of its scw_list, the jobs of the shards, see oda_api.sharding
+        self.shard_jobs = None
+
+        self.last_request_t0 = None
+        self.last_request_t_complete = None
+        self.last_request_spans = None
+        # memory traced for the last request and the decoding of its products, if enabled in the client
+        self.last_request_memory = None
+
+        self._query_status = 'not-prepared'
+        self._full_report_dict_list = []
+
+        # limits of the dispatcher, while this job holds one of its in-flight slots,
+        # and the release of the slot, also called if the job is garbage collected before it completes
+        self._in_flight_limits = None
+        self._in_flight_release = None
+        self._progress_iter = cycle(['|', '/', '-', '\\'])
+
+        if parameters_dict is not None:
+            self.parameters_dict = parameters_dict
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.job_id, self.query_status)
+
+    # retry settings are those of the client, used by safe_run
+
+    @property
+    def n_max_tries(self):
+        return self.client.n_max_tries
+
+    @property
+    def retry_sleep_s(self):
+        return self.client.retry_sleep_s
+
+    @property
+    def parameters_dict(self):
+        """
+        as provided in request, not modified by state changes
+        """
+        return getattr(self, '_parameters_dict', None)
+
+    @parameters_dict.setter
+    def parameters_dict(self, value):
+        self._parameters_dict = value
+        self._full_report_dict_list = []
+        self.query_status = 'prepared'
+
+    @property
+    def instrument(self):
+        return (self.parameters_dict or {}).get('instrument', self.client.instrument)
+
+    @property
+    def parameters_dict_payload(self):
+        if self.is_submitted and self.submitted_with_post:
+            # the dispatcher has the parameters since the job was submitted, but may route requests by some of them
+            p = {
+                    **{k: self.parameters_dict[k] for k in _routing_parameters if k in self.parameters_dict},
+                    'session_id': self.parameters_dict.get('session_id'),
+                    'api': 'True',
+                    'oda_api_version': __version__,
+                }
+        else:
+            p = {
+                    **self.parameters_dict,
+                    'api': 'True',
+                    'oda_api_version': __version__,
+                }
+
+        if self.is_submitted:
+            return {
+                    **p,
+                    'job_id': self.job_id,
+                    'query_status': self.query_status,
+                    'full_report_last_index': len(self.full_report_dict_list),
+                   }
+        else:
+            return p
+
+    @property
+    def full_report_dict_list(self):
+        """
+        job monitor report entries received so far for this job
+        """
+        return self._full_report_dict_list
+
+    def _merge_full_report(self, job_monitor):
+        """
+        merges report entries from the job monitor of the last response into local state
+
+        A server supporting delta polling answers to full_report_last_index with only the new entries,
+        and marks where they start with full_report_first_index; otherwise the list is complete.
+        """
+        entries = job_monitor.get('full_report_dict_list', [])
+        first_index = job_monitor.get('full_report_first_index')
+
+        if first_index is None:
+            self._full_report_dict_list = list(entries)
+        else:
+            report = self._full_report_dict_list
+            del report[first_index:]
+            report.extend(entries)
+
+        job_monitor['full_report_dict_list'] = self._full_report_dict_list
+
+    @property
+    def query_status(self):
+        return self._query_status
+
+    @query_status.setter
+    def query_status(self, new_status):
+        if new_status in self.possible_status:
+            self._query_status = new_status
+        else:
+            raise RuntimeError(f"unable to set status to {new_status}, possible values are {self.possible_status}")
+
+    @property
+    def is_submitted(self):
+        return self.query_status not in [ 'prepared', 'not-prepared' ]
+
+    @property
+    def is_prepared(self):
+        return self.query_status not in [ 'not-prepared' ]
+
+    @property
+    def is_ready(self):
+        return self.query_status in [ 'ready', 'done' ]
+
+    @property
+    def is_complete(self):
+        return self.query_status in [ 'ready', 'done', 'failed' ]
+
+    @property
+    def is_failed(self):
+        return self.query_status in [ 'failed' ]
+
+    def request_to_json(self, verbose=False, long_poll_s=None):
+        """
+        sends the job to the dispatcher, and returns the decoded response; if long_poll_s is given, the dispatcher
+        is asked to hold the request until the status of the job changes, for at most long_poll_s seconds
+        """
+        client = self.client
+
+        if verbose:
+            print(f'- waiting for remote response (since {time.strftime("%Y-%m-%d %H:%M:%S")}), please wait for {client.url}/{client.run_analysis_handle}')
+
+        try:
+            timeout = getattr(client, 'timeout', 120)
+            if long_poll_s is not None:
+                timeout = max(timeout, long_poll_s + 30)
+
+            with self._trace_memory(new=True):
+                self.last_request_t0 = time.time()
+                with memtrace.stage('transfer'):
+                    response, spans = self._send_request(timeout, long_poll_s)
+                self.last_request_t_complete = time.time()
+                self.last_request_spans = spans
+                self.last_request_long_polled = long_poll_s is not None and 'ODA-Long-Poll' in response.headers
+                if self.job_id is None and self.callback_url is not None:
+                    self.callback_acknowledged = 'ODA-Callback' in response.headers
+
+                with spans.span('json_decode'), memtrace.stage('json_decode'):
+                    response_json = client._decode_res_json(response)
+
+                with spans.span('validation'), memtrace.stage('validation'):
+                    client.validate_response(response_json)
+
+            return response_json
+        except json.decoder.JSONDecodeError as e:
+            print(f"{C.RED}{C.BOLD}unable to decode json from response:{C.NC}")
+            print(f"{C.RED}{response.text}{C.NC}")
+            raise
+
+    def _send_request(self, timeout, long_poll_s=None):
+        """
+        sends the job to the dispatcher: in a POST body, if so set in the client and the job is not submitted yet,
+        and as query parameters of a GET request otherwise, or if the dispatcher does not accept POST;
+        jobs are submitted with the URL of the callback receiver of the client, if it has one, and is called back
+        """
+        client = self.client
+
+        headers = {
+                    'Request-Timeout': str(timeout),
+                    'Connection-Timeout': str(timeout),
+                  }
+
+        params = self.parameters_dict_payload
+
+        if not self.is_submitted:
+            self.submitted_with_post = False
+
+            self.callback_url = client.callback_receiver.url if client._waits_for_callbacks() else None
+            if self.callback_url is not None:
+                params['callback_url'] = self.callback_url
+
+        if not self.is_submitted and client.submit_method == 'post' and client.post_submission_supported is not False:
+            response, spans = client._http_post(client.run_analysis_handle,
+                                                params,
+                                                compress=client.compress_submission,
+                                                headers=headers,
+                                                timeout=timeout)
+
+            # until a job was submitted with POST, any client error is taken to be about POST
+            # (or its compression), rather than about the job, which is submitted again with GET
+            unsupported = response.status_code in (405, 501) or (client.post_submission_supported is None and 400 <= response.status_code < 500)
+
+            if not unsupported:
+                client.post_submission_supported = True
+                self.submitted_with_post = True
+                return response, spans
+
+            logger.warning("dispatcher %s does not accept jobs submitted with POST (%s), submitting with GET",
+                           client.url, response.status_code)
+            client.post_submission_supported = False
+
+        if long_poll_s is not None:
+            params['long_poll_s'] = long_poll_s
+
+        return client._http_get(client.run_analysis_handle,
+                                params=params,
+                                headers=headers,
+                                timeout=timeout)
+
+    def _trace_memory(self, new=False):
+        """
+        context tracing memory, if enabled in the client: of a new request, or still of the last one
+        """
+        if not self.client.trace_memory:
+            return nullcontext()
+
+        if new or self.last_request_memory is None:
+            self.last_request_memory = memtrace.MemoryTrace()
+
+        return self.last_request_memory.activate()
+
+    @property
+    def memory_report(self):
+        """
+        memory allocated by stages of the last request and by its products, if traced; see oda_api.memtrace
+        """
+        if self.last_request_memory is None:
+            return None
+
+        return self.last_request_memory.report()
+
+    @safe_run
+    def poll(self, verbose=False, silent=False, long_poll_s=None):
+        """
+        Updates status of the job at the remote server
+
+        Submits the job on first call, the job_id assigned by the dispatcher is sent in all following polls;
+        with long_poll_s, the dispatcher may hold the poll until the status of the job changes, see run
+        """
+
+        if not self.is_prepared:
+            raise UserError(f"can not poll {self} before its parameters are set")
+
+        client = self.client
+
+        previous_status, previous_job_id = self.query_status, self.job_id
+
+        if self._in_flight_limits is None and not self.is_complete:
+            limits = ratelimit.get_limits(client.url)
+            if limits is not None:
+                # a job submitted earlier, e.g. reattached, is already running: it takes a slot without waiting
+                limits.acquire_job(wait=self.job_id is None)
+                self._in_flight_limits = limits
+                self._in_flight_release = weakref.finalize(self, limits.release_job, threading.get_ident())
+
+        # >
+        try:
+            self.response_json = self.request_to_json(verbose=verbose, long_poll_s=long_poll_s)
+        except BaseException:
+            if self.job_id is None:
+                self._release_in_flight()
+            raise
+        # <
+
+        self._merge_full_report(self.response_json.get('job_monitor', {}))
+
+        if self.response_json['query_status'] != self.query_status:
+            if not silent:
+                print(f"\n... query status {C.PURPLE}{self.query_status}{C.NC} => {C.PURPLE}{self.response_json['query_status']}{C.NC}")
+
+            self.query_status = self.response_json['query_status']
+
+        if self.job_id is None:
+            self.job_id = self.response_json['job_monitor']['job_id']
+
+            client.metrics.count_poll(self.job_id, complete=self.is_complete)
+
+            if self.callback_url is not None and not self.callback_acknowledged:
+                client._callbacks_not_acknowledged()
+
+            if not silent:
+                print(f"... assigned job id: {C.BROWN}{self.job_id}{C.NC}")
+        else:
+            client.metrics.count_poll(self.job_id, complete=self.is_complete)
+
+            if self.response_json['query_status'] != self.query_status:
+                raise RuntimeError("request returns job_id {res_json['query_status']} != known job_id {self.query_status}"
+                                   "this should not happen! Server must be misbehaving, or client forgot correct job id")
+
+        if client.journal is not None and (self.query_status != previous_status or self.job_id != previous_job_id):
+            client.journal.record(self.job_id, client.url, self.instrument, self.query_status, self.parameters_dict)
+
+        self.n_poll += 1
+
+        if client.hooks:
+            self._emit_poll_events(previous_status, previous_job_id)
+
+        if self.is_complete:
+            self._release_in_flight()
+
+        if silent:
+            pass
+
+        elif self.query_status == 'done':
+            print(f"\033[32mquery COMPLETED SUCCESSFULLY (state {self.query_status})\033[0m")
+
+        elif self.query_status == 'failed':
+            print(f"\033[31mquery COMPLETED with FAILURE (state {self.query_status})\033[0m")
+
+        else:
+            self.show_progress()
+
+    def _emit_poll_events(self, previous_status, previous_job_id):
+        hooks = self.client.hooks
+        url = self.client.url
+        spans = self.last_request_spans
+        duration_s = self.last_request_t_complete - self.last_request_t0 + spans.spans.get('json_decode', 0.) + spans.spans.get('validation', 0.)
+
+        if previous_job_id is None:
+            hooks.emit('on_submit', job_id=self.job_id, url=url, status=self.query_status,
+                       parameters=self.parameters_dict, duration_s=duration_s)
+
+        hooks.emit('on_poll', job_id=self.job_id, url=url, status=self.query_status, n_poll=self.n_poll,
+                   duration_s=duration_s, spans=dict(spans.spans))
+
+        elapsed_s = None if self.t0 is None else time.time() - self.t0
+
+        if self.query_status != previous_status:
+            hooks.emit('on_status_change', job_id=self.job_id, url=url, previous_status=previous_status,
+                       status=self.query_status, elapsed_s=elapsed_s)
+
+            if self.is_complete:
+                hooks.emit('on_complete', job_id=self.job_id, url=url, status=self.query_status,
+                           elapsed_s=elapsed_s, n_poll=self.n_poll)
+
+    def _release_in_flight(self):
+        if self._in_flight_limits is not None:
+            self._in_flight_release()
+            self._in_flight_limits = None
+            self._in_flight_release = None
+
+    def _progress_bar(self, info=''):
+        print(f"{C.GREY}\r {next(self._progress_iter)} the job is working remotely, please wait {info}{C.NC}", end='')
+
+    def format_custom_progress(self, full_report_dict_list):
+        if self.instrument == self.client.instrument:
+            return self.client.format_custom_progress(full_report_dict_list)
+
+        F = custom_formatters.find_custom_formatter(self.instrument)
+
+        if F is not None:
+            return F(full_report_dict_list)
+
+        return ""
+
+    def show_progress(self):
+        full_report_dict_list = self.response_json['job_monitor'].get('full_report_dict_list', [])
+
+        info = 'status=%s job_id=%s in %d messages since %d seconds'%(
+                    self.query_status,
+                    str(self.job_id)[:8],
+                    len(full_report_dict_list),
+                    time.time() - self.t0,
+                )
+
+        custom_info = self.format_custom_progress(full_report_dict_list)
+        if custom_info != "":
+            info += "; " + custom_info
+
+        self._progress_bar(info=info)
+
+    def run(self, wait=True, silent=False):
+        """
+        polls the job once, or, if wait, until it is done or failed: every poll_interval_s of the client,
+        or as set in its wait_method, or, if it has a callback receiver, when the dispatcher calls back;
+        if silent, without printing progress
+        """
+        if self.t0 is None:
+            self.t0 = time.time()
+
+        client = self.client
+
+        verbose = not silent
+        while True:
+            callbacks = self.callback_url is not None and client._waits_for_callbacks()
+            called_back = None
+
+            # a job found complete by the safety poll, without a callback, tells that the dispatcher may not call back
+            callbacks_confirmed = client.callbacks_confirmed
+
+            if wait and self.is_submitted and not self.is_complete and callbacks:
+                # polled when the dispatcher calls back, or, in case the callback is lost, after a long time;
+                # until the dispatcher is seen calling back, after poll_interval_s
+                called_back = client.callback_receiver.wait(self.job_id, timeout=client.callback_poll_interval_s
+                                                            if callbacks_confirmed else client.poll_interval_s)
+
+            long_poll = (wait and self.is_submitted and not callbacks
+                         and client.wait_method == 'long_poll' and client.long_poll_supported is not False)
+
+            self.poll(verbose, silent=silent, long_poll_s=client.long_poll_timeout_s if long_poll else None)
+
+            verbose = False
+
+            if called_back or (called_back is False and self.is_complete and callbacks_confirmed):
+                client._count_callback(called_back)
+
+            if long_poll and client.long_poll_supported is None:
+                client.long_poll_supported = self.last_request_long_polled
+                if not client.long_poll_supported:
+                    logger.warning("dispatcher %s does not hold long polls, polling every %s seconds", client.url, client.poll_interval_s)
+
+            if self.query_status in ['done', 'failed']:
+                return
+
+            if not wait:
+                return
+
+            # the callback URL is set on submission
+            if self.callback_url is not None and client._waits_for_callbacks():
+                continue
+
+            # right after submission, or after a poll held by the dispatcher, the job is long-polled again at once;
+            # a poll the dispatcher did not hold is sent again only after poll_interval_s
+            if client.wait_method == 'long_poll' and client.long_poll_supported is not False and (not long_poll or self.last_request_long_polled):
+                continue
+
+            time.sleep(client.poll_interval_s)
+
+    def process_failure(self, silent=False):
+        if self.response_json['exit_status']['status'] != 0 and not silent:
+            self.client.failure_report(self.response_json)
+
+        if self.query_status != 'failed':
+            if not silent:
+                print('query done succesfully!')
+        else:
+            raise RemoteException(debug_message=self.response_json['exit_status']['error_message'])
+
+    def collect_products(self, dry_run=False, wait=None, silent=False):
+        """
+        decodes the products of the completed job into a DataCollection
+
+        wait tells if the job was expected to be complete, by default as set in the client
+        """
+        client = self.client
+
+        if wait is None:
+            wait = client.wait
+
+        if self.is_failed:
+            return self.process_failure(silent=silent)
+        elif self.is_ready:
+            res_json = self.response_json
+        elif not self.is_complete:
+            if wait:
+                raise RuntimeError("should have waited, but did not - programming error!")
+            else:
+                if not silent:
+                    print(f"\n{C.BROWN}query not complete, please poll again later{C.NC}")
+                return
+        else:
+            raise RuntimeError("not failed, ready, but complete? programming error for client!")
+
+        data = None
+
+        if not dry_run:
+            timings = []
+            with self._trace_memory():
+                if client.hooks:
+                    client.hooks.emit('on_decode_start', job_id=self.job_id, url=client.url,
+                                      n_products=len(client._product_items(res_json['products'])))
+                    t_decode = time.perf_counter()
+
+                with self.last_request_spans.span('product_decode'), memtrace.stage('product_decode'):
+                    data = client.decode_products(res_json['products'], timings=timings)
+
+                if client.hooks:
+                    client.hooks.emit('on_decode_end', job_id=self.job_id, url=client.url, n_products=len(data),
+                                      duration_s=time.perf_counter() - t_decode, timings=list(timings))
+
+
+                with memtrace.stage('collection'):
+                    d=DataCollection(data, instrument=self.parameters_dict.get('instrument'), product=self.parameters_dict.get('product_type'))
+            d.decode_timings = timings
+            d.memory_report = self.memory_report
+            for p in d._p_list:
+                if hasattr(p,'meta_data') is False and hasattr(p,'meta') is True:
+                    p.meta_data = p.meta
+        else:
+            client.dig_list(client._decode_res_json(res_json['products']['instrument_parameters']))
+            d=None
+
+        return d
+
+    def result(self, dry_run=False, silent=False):
+        """
+        polls the job until it is complete, and returns its products; if silent, without printing progress
+        """
+        self.run(wait=True, silent=silent)
+        return self.collect_products(dry_run=dry_run, wait=True, silent=silent)
+
+
 class DispatcherAPI:
+    # connections kept open to the dispatcher, for jobs polled concurrently
+    max_connections = 100
+
     def __init__(self,
                  instrument='mock', 
                  url='https://www.astro.unige.ch/cdci/astrooda/dispatch-data',
@@ -111,6 +748,8 @@ class DispatcherAPI:
                  cookies=None,
                  protocol="https",
                  wait=True,
+                 journal=None,
+                 metadata_cache=None,
                  ):
 
 
@@ -142,14 +781,94 @@ class DispatcherAPI:
         self.cookies=cookies
         self.set_instr(instrument)
 
+        if journal is True or isinstance(journal, str):
+            from .journal import JobJournal
+            journal = JobJournal(None if journal is True else journal)
+
+        # if set, job state is recorded in this JobJournal on submission and on every status change
+        self.journal = journal
+
+        if metadata_cache is False:
+            metadata_cache = None
+        elif metadata_cache is None or metadata_cache is True or isinstance(metadata_cache, str):
+            from .metadata_cache import MetadataCache, default_metadata_cache_path
+            if metadata_cache is True:
+                metadata_cache = default_metadata_cache_path()
+            metadata_cache = MetadataCache(metadata_cache)
+
+        # unless disabled, instrument and product descriptions are kept in this MetadataCache (in memory, and in a
+        # directory if given), and downloaded again only if modified; see oda_api.metadata_cache
+        self.metadata_cache = metadata_cache
+
         self.n_max_tries = 20
         self.retry_sleep_s = 5
+        self.poll_interval_s = 2
+
+        # products of a response are decoded: one after another (None), in a 'thread' or 'process' pool,
+        # or ('auto') in threads for numpy and binary products and in processes for astropy tables;
+        # an Executor can also be given, to be reused between requests
+        self.decode_executor = None
+        self.decode_max_workers = None
+
+        # if set, identical get_product calls running at the same time share one dispatcher job and its products,
+        # coalesced in single_flight (by default, the one shared within the process)
+        self.deduplicate = False
+        self.single_flight = None
+
+        # if set, light curves and spectra over more than shard_size science windows are computed by sub-jobs
+        # over shards of scw_list, shard_parallel at a time, and merged here; see oda_api.sharding
+        self.shard_size = None
+        self.shard_parallel = 4
+        self.shard_max_retries = 2
+
+        # if set, memory allocated by each stage of getting products is traced, see oda_api.memtrace
+        self.trace_memory = False
+
+        # jobs are submitted with their parameters in the query string of every poll ('get'), or ('post') once,
+        # in the body of a POST request, gzip-compressed if compress_submission, and then polled by job_id and session_id;
+        # if the dispatcher does not accept POST (post_submission_supported is then False), they are submitted with GET
+        self.submit_method = 'get'
+        self.compress_submission = False
+        self.post_submission_supported = None
+
+        # while waiting, jobs are polled every poll_interval_s ('poll'), or ('long_poll') the dispatcher is asked to hold
+        # each poll until the status of the job changes, for at most long_poll_timeout_s; if it does not
+        # (long_poll_supported is then False), jobs are polled every poll_interval_s
+        self.wait_method = 'poll'
+        self.long_poll_timeout_s = 30
+        self.long_poll_supported = None
+
+        # if set, with enable_callbacks, jobs are submitted with the URL of this CallbackReceiver, and polled again
+        # when the dispatcher calls it back, or every callback_poll_interval_s once it called back any job
+        # (callbacks_confirmed), and every poll_interval_s before; see oda_api.callback_receiver
+        self.callback_receiver = None
+        self.callback_poll_interval_s = 300
+        self.callbacks_confirmed = False
+        # jobs found complete by the safety poll, without a callback, since the last callback; after callback_max_missed
+        # of them, or at once if the dispatcher does not acknowledge callback_url, the dispatcher is taken to ignore it,
+        # and jobs are polled as without a receiver
+        self.callbacks_missed = 0
+        self.callback_max_missed = 3
+        self._callbacks_lock = threading.Lock()
 
 
         if port is not None:
             self.logger.warning("please use 'url' to specify entire URL, no need to provide port separately")
 
-        self._progress_iter = cycle(['|', '/', '-', '\\'])
+        # the job last requested from this client; any number of other jobs can be created with new_job or new_product_job
+        self.job = None
+        self._current_job_lock = threading.Lock()
+
+        self.metrics = MetricsRegistry()
+        self.last_request_spans = None
+
+        # callbacks on events of jobs of this client (submit, poll, status change, retry, decode, complete), see oda_api.hooks
+        self.hooks = hooks.HookRegistry()
+
+        # the session is shared by all jobs of this client, and so are its pooled connections
+        self.session = requests.Session()
+        self.session.mount('http://', TimedHTTPAdapter(pool_maxsize=self.max_connections))
+        self.session.mount('https://', TimedHTTPAdapter(pool_maxsize=self.max_connections))
 
         # TODO this should really be just swagger/bravado; or at least derived from resources
         self.dispatcher_response_schema = {
@@ -171,134 +890,253 @@ class DispatcherAPI:
                     }
                 }
 
-    def set_custom_progress_formatter(self, F):
-        self.custom_progress_formatter = F
+        # off: no validation; envelope: only the top-level fields described in the schema; full: entire response
+        self.response_validation_level = 'envelope'
+        self._response_validator = None
+
+    def set_custom_progress_formatter(self, F):
+        self.custom_progress_formatter = F
+
+    @classmethod
+    def build_from_envs(cls):
+        cookies_path = os.environ.get('ODA_API_TOKEN')
+        cookies = dict(_oauth2_proxy=open(cookies_path).read().strip())
+        host_url = os.environ.get('DISP_URL')
+
+        return cls(host=host_url, instrument='mock', cookies=cookies, protocol='http')
+
+    def generate_session_id(self,size=16):
+        chars = string.ascii_uppercase + string.digits
+        return ''.join(random.choice(chars) for _ in range(size))
+
+    def set_instr(self,instrument):
+        self.instrument = instrument
+        self.custom_progress_formatter = custom_formatters.find_custom_formatter(instrument)
+
+
+    def format_custom_progress(self, full_report_dict_list):
+        F = getattr(self, 'custom_progress_formatter', None)
+
+        if F is not None:
+            return F(full_report_dict_list)
+
+        return ""
+
+    def enable_callbacks(self, host='127.0.0.1', port=0, public_url=None):
+        """
+        starts a CallbackReceiver, listening on host and port, or reachable by the dispatcher at public_url,
+        to be called back when jobs submitted from now on complete; returns it
+        """
+        from .callback_receiver import CallbackReceiver
+
+        self.disable_callbacks()
+        self.callback_receiver = CallbackReceiver(host=host, port=port, public_url=public_url).start()
+
+        with self._callbacks_lock:
+            self.callbacks_confirmed = False
+            self.callbacks_missed = 0
+
+        return self.callback_receiver
+
+    def disable_callbacks(self):
+        """
+        stops the callback receiver, if any; jobs waiting for callbacks are polled again at the next callback_poll_interval_s
+        """
+        if self.callback_receiver is not None:
+            self.callback_receiver.stop()
+            self.callback_receiver = None
+
+    def _waits_for_callbacks(self):
+        return self.callback_receiver is not None and self.callbacks_missed < self.callback_max_missed
+
+    def _count_callback(self, received):
+        with self._callbacks_lock:
+            if received:
+                self.callbacks_confirmed = True
+                self.callbacks_missed = 0
+                return
+
+            self.callbacks_missed += 1
+            n_missed = self.callbacks_missed
+
+        if n_missed == self.callback_max_missed:
+            logger.warning("dispatcher %s did not call back %d jobs, polling every %s seconds",
+                           self.url, n_missed, self.poll_interval_s)
+
+    def _callbacks_not_acknowledged(self):
+        with self._callbacks_lock:
+            if self.callbacks_missed >= self.callback_max_missed:
+                return
+
+            self.callbacks_missed = self.callback_max_missed
+
+        logger.warning("dispatcher %s does not acknowledge callback_url, polling every %s seconds",
+                       self.url, self.poll_interval_s)
+
+    def _http_get(self, endpoint, **kwargs):
+        """
+        sends GET request to endpoint of the dispatcher, recording connect, server wait and transfer time,
+        and, if the dispatcher has limits set in ratelimit, the time waited for the request rate limit
+        """
+        spans = self.metrics.new_request(endpoint)
+
+        return self._http_request('get', endpoint, spans, **kwargs)
 
-    @classmethod
-    def build_from_envs(cls):
-        cookies_path = os.environ.get('ODA_API_TOKEN')
-        cookies = dict(_oauth2_proxy=open(cookies_path).read().strip())
-        host_url = os.environ.get('DISP_URL')
+    def _http_post(self, endpoint, data, compress=False, headers=None, **kwargs):
+        """
+        sends POST request to endpoint of the dispatcher, with data form-encoded in its body, and gzip-compressed if compress;
+        times are recorded as for GET requests, and the time to encode the body too
+        """
+        from urllib.parse import urlencode
 
-        return cls(host=host_url, instrument='mock', cookies=cookies, protocol='http')
+        spans = self.metrics.new_request(endpoint)
 
-    def generate_session_id(self,size=16):
-        chars = string.ascii_uppercase + string.digits
-        return ''.join(random.choice(chars) for _ in range(size))
+        headers = {**(headers or {}), 'Content-Type': 'application/x-www-form-urlencoded'}
 
-    def set_instr(self,instrument):
-        self.instrument = instrument
-        self.custom_progress_formatter = custom_formatters.find_custom_formatter(instrument)
+        with spans.span('encode'):
+            body = urlencode({k: v for k, v in data.items() if v is not None}, doseq=True).encode()
 
-    def _progress_bar(self,info=''):
-        print(f"{C.GREY}\r {next(self._progress_iter)} the job is working remotely, please wait {info}{C.NC}", end='')
+            if compress:
+                import gzip
+                body = gzip.compress(body, compresslevel=6)
+                headers['Content-Encoding'] = 'gzip'
 
-    def format_custom_progress(self, full_report_dict_list):
-        F = getattr(self, 'custom_progress_formatter', None)
+        return self._http_request('post', endpoint, spans, data=body, headers=headers, **kwargs)
 
-        if F is not None:
-            return F(full_report_dict_list)
+    def _http_request(self, method, endpoint, spans, **kwargs):
+        self.last_request_spans = spans
 
-        return ""
+        limits = ratelimit.get_limits(self.url)
+        if limits is not None:
+            spans.add('queue_wait', limits.acquire_request())
 
-    def request_to_json(self, verbose=False):
-        if verbose:
-            print(f'- waiting for remote response (since {time.strftime("%Y-%m-%d %H:%M:%S")}), please wait for {self.url}/{self.run_analysis_handle}')
+        reset_connect_time()
+        t0 = time.perf_counter()
+        response = self.session.request(method, "%s/%s" % (self.url, endpoint), cookies=self.cookies, stream=True, **kwargs)
+        t_headers = time.perf_counter()
+        response.content
+        t_complete = time.perf_counter()
 
-        try:
-            timeout = getattr(self, 'timeout', 120)
-
-            self.last_request_t0 = time.time()
-            response = requests.get(
-                            "%s/%s" % (self.url, self.run_analysis_handle), 
-                            params=self.parameters_dict_payload,
-                            cookies=self.cookies, 
-                            headers={
-                                      'Request-Timeout': str(timeout),
-                                      'Connection-Timeout': str(timeout),
-                                    },
-                            timeout=timeout,
-                       )
-            self.last_request_t_complete = time.time()
+        connect = pop_connect_time()
+        spans.add('connect', connect)
+        spans.add('server_wait', t_headers - t0 - connect)
+        spans.add('transfer', t_complete - t_headers)
 
+        return response, spans
 
-            response_json = self._decode_res_json(response)
+    @property
+    def response_validator(self):
+        """
+        validator for dispatcher_response_schema, compiled once (and again if the schema is replaced)
+        """
+        if self._response_validator is None or self._response_validator.schema is not self.dispatcher_response_schema:
+            from jsonschema.validators import validator_for
 
-            validate_json(response_json, self.dispatcher_response_schema)
+            cls = validator_for(self.dispatcher_response_schema)
+            cls.check_schema(self.dispatcher_response_schema)
+            self._response_validator = cls(self.dispatcher_response_schema)
 
-            return response_json
-        except json.decoder.JSONDecodeError as e:
-            print(f"{C.RED}{C.BOLD}unable to decode json from response:{C.NC}")
-            print(f"{C.RED}{response.text}{C.NC}")
-            raise
+        return self._response_validator
+
+    def validate_response(self, response_json):
+        level = self.response_validation_level
+
+        if level == 'off':
+            return
+        elif level == 'envelope':
+            if isinstance(response_json, dict):
+                response_json = {k: response_json[k] for k in self.dispatcher_response_schema.get('properties', {}) if k in response_json}
+        elif level != 'full':
+            raise UserError(f"unknown response validation level {level}, possible values are off, envelope, full")
+
+        self.response_validator.validate(response_json)
+
+    def new_job(self, parameters_dict):
+        """
+        creates a Job with these parameters, to be submitted on its first poll
+        """
+        return Job(self, parameters_dict)
 
+    def set_limits(self, requests_per_second=None, burst=None, max_in_flight_jobs=None):
+        """
+        limits requests and jobs sent to the dispatcher at self.url, by all clients in the process;
+        see oda_api.ratelimit
+        """
+        return ratelimit.set_limits(self.url, requests_per_second, burst, max_in_flight_jobs)
+
+    @property
+    def limits(self):
+        return ratelimit.get_limits(self.url)
+
+    def _current_job(self):
+        if self.job is None:
+            self.job = Job(self)
+        return self.job
+
+    # state of the current job (the last one requested by this client), as it was kept before jobs were separate objects
 
     @property
     def parameters_dict(self):
         """
         as provided in request, not modified by state changes
         """
-        return getattr(self, '_parameters_dict', None)
-    
+        return getattr(self.job, 'parameters_dict', None)
+
     @parameters_dict.setter
     def parameters_dict(self, value):
-        self._parameters_dict = value
-        self.query_status = 'prepared'
-    
+        self.job = self.new_job(value)
 
     @property
     def parameters_dict_payload(self):
-        p = {
-                **self.parameters_dict,
-                'api': 'True',
-                'oda_api_version': __version__,
-            }
-
-        if self.is_submitted:
-            return {
-                    **p,
-                    'job_id': self.job_id,
-                    'query_status': self.query_status,
-                   }
-        else:
-            return p
+        return self._current_job().parameters_dict_payload
 
     @parameters_dict_payload.setter
     def parameters_dict_payload(self, value):
         raise UserError("please set parameters_dict and not parameters_dict_payload")
 
-    
     @property
     def job_id(self):
-        return getattr(self, '_job_id', None)
-    
+        return getattr(self.job, 'job_id', None)
+
     @job_id.setter
     def job_id(self, new_job_id):
-        self._job_id = new_job_id
+        self._current_job().job_id = new_job_id
 
+    @property
+    def full_report_dict_list(self):
+        """
+        job monitor report entries received so far for the current job
+        """
+        return getattr(self.job, 'full_report_dict_list', [])
 
     @property
     def query_status(self):
-        return getattr(self, '_query_status', 'not-prepared')
-    
+        return getattr(self.job, 'query_status', 'not-prepared')
+
     @query_status.setter
     def query_status(self, new_status):
-        possible_status = [
-                            "not-prepared",
-                            "prepared",
-                            "submitted",
-                            "progress",
-                            "done",
-                            "ready",
-                            "failed",
-                        ]
-
-        if new_status in possible_status:
-            self._query_status = new_status
-        else:
-            raise RuntimeError(f"unable to set status to {new_status}, possible values are {possible_status}")
+        self._current_job().query_status = new_status
+
+    @property
+    def response_json(self):
+        return getattr(self.job, 'response_json', None)
+
+    @response_json.setter
+    def response_json(self, value):
+        self._current_job().response_json = value
+
+    @property
+    def t0(self):
+        return getattr(self.job, 't0', None)
+
+    @t0.setter
+    def t0(self, value):
+        self._current_job().t0 = value
+
+    @property
+    def memory_report(self):
+        return getattr(self.job, 'memory_report', None)
 
-    
     @property
     def is_submitted(self):
         return self.query_status not in [ 'prepared', 'not-prepared' ]
@@ -306,7 +1144,7 @@ class DispatcherAPI:
     @property
     def is_prepared(self):
         return self.query_status not in [ 'not-prepared' ]
-    
+
     @property
     def is_ready(self):
         return self.query_status in [ 'ready', 'done' ]
@@ -319,65 +1157,17 @@ class DispatcherAPI:
     def is_failed(self):
         return self.query_status in [ 'failed' ]
 
-    @safe_run
+    def request_to_json(self, verbose=False):
+        return self._current_job().request_to_json(verbose=verbose)
+
     def poll(self, verbose=False, silent=False):
         """
-        Updates status of query at the remote server
-
-        Relies on self.parameters_dict to set parameters for request
-
-        Relies on self.query_status and self.job_id, which is created as necessary and submitted in paylad
+        Updates status of the current job at the remote server, see Job.poll
         """
+        return self._current_job().poll(verbose=verbose, silent=silent)
 
-        if not self.is_prepared:
-            raise UserError(f"can not poll query before parameters are set with {self}.request")
-
-
-        # >
-        self.response_json = self.request_to_json(verbose=verbose)
-        # <
-
-        if self.response_json['query_status'] != self.query_status:
-            if not silent:
-                print(f"\n... query status {C.PURPLE}{self.query_status}{C.NC} => {C.PURPLE}{self.response_json['query_status']}{C.NC}")
-
-            self.query_status = self.response_json['query_status']
-
-        if self.job_id is None:
-            self.job_id = self.response_json['job_monitor']['job_id']
-
-            if not silent:
-                print(f"... assigned job id: {C.BROWN}{self.job_id}{C.NC}")
-        else:
-            if self.response_json['query_status'] != self.query_status:
-                raise RuntimeError("request returns job_id {res_json['query_status']} != known job_id {self.query_status}"
-                                   "this should not happen! Server must be misbehaving, or client forgot correct job id")
-
-        if self.query_status == 'done':
-            print(f"\033[32mquery COMPLETED SUCCESSFULLY (state {self.query_status})\033[0m")
-
-        elif self.query_status == 'failed':
-            print(f"\033[31mquery COMPLETED with FAILURE (state {self.query_status})\033[0m")
-
-        else:
-            if not silent:
-                self.show_progress()
-        
     def show_progress(self):
-        full_report_dict_list = self.response_json['job_monitor'].get('full_report_dict_list', [])
-
-        info = 'status=%s job_id=%s in %d messages since %d seconds'%(
-                    self.query_status, 
-                    str(self.job_id)[:8], 
-                    len(full_report_dict_list),
-                    time.time() - self.t0,
-                )
-        
-        custom_info = self.format_custom_progress(full_report_dict_list)
-        if custom_info != "":
-            info += "; " + custom_info
-
-        self._progress_bar(info=info)
+        self._current_job().show_progress()
 
     def print_parameters(self):
         for k, v in self.parameters_dict.items():
@@ -386,7 +1176,11 @@ class DispatcherAPI:
     @safe_run
     def request(self, parameters_dict, handle=None, url=None, wait=None, quiet=True):
         """
-        sets request parameters, optionally polls them in a loop
+        creates a job with these parameters, and makes it the current job of this client;
+        polls it once, or in a loop if self.wait
+
+        returns the Job; before jobs were separate objects, it returned None, and the job was only reachable
+        through the state of the client, as it still is
         """
 
         if wait is not None:
@@ -400,44 +1194,112 @@ class DispatcherAPI:
         if handle is not None:
             self.logger.warning("overriding dispatcher handle from request not allowed, ignored!")
 
-        self.parameters_dict = parameters_dict
+        job = self.new_job(parameters_dict)
+        self._set_current_job(job)
+
+        self._start_job(job, quiet=quiet)
+
+        return job
+
+    @safe_run
+    def _request_product(self, parameters_dict):
+        """
+        as request, but the job becomes the current job of this client only once polled, and no job of
+        another call is ever read: get_product can be called concurrently, e.g. from threads
+        """
+        job = self.new_job(parameters_dict)
+
+        try:
+            self._start_job(job)
+        finally:
+            self._set_current_job(job)
+
+        return job
 
+    def _request_shared_product(self, parameters_dict):
+        # products of a get_product call, with the state of its job, for identical calls coalesced with it
+        job = self._request_product(parameters_dict)
+        job_state = dict(job_id=job.job_id, query_status=job.query_status, response_json=job.response_json)
 
-        if 'scw_list' in self.parameters_dict.keys():
-            print(self.parameters_dict['scw_list'])
+        return job_state, job.collect_products()
 
-        self.set_instr(self.parameters_dict.get('instrument', self.instrument))
+    def _start_job(self, job, quiet=True):
+        if 'scw_list' in job.parameters_dict.keys():
+            print(job.parameters_dict['scw_list'])
 
         if not quiet:
             self.print_parameters()
 
-        self.t0 = time.time()
+        job.t0 = time.time()
 
+        job.run(wait=self.wait)
 
-        verbose = True
-        while True:
-            self.poll(verbose)
+    def _set_current_job(self, job):
+        with self._current_job_lock:
+            self.job = job
+            self.set_instr(job.instrument)
 
-            verbose = False
+    def reattach(self, job_id, journal=None):
+        """
+        restores state of a job recorded in the journal, and continues polling it (in a loop if self.wait), without resubmitting
 
-            if self.query_status in ['done', 'failed']:
-                return
+        returns the Job, which also becomes the current job of this client
+        """
+        if journal is None:
+            journal = self.journal
 
-            if not self.wait:
-                return 
+        if journal is None:
+            raise UserError(f"can not reattach to job {job_id}: no journal given, and {self} has none")
 
-            time.sleep(2)
-        
+        entry = journal.get(job_id)
 
-    def process_failure(self):
-        if self.response_json['exit_status']['status'] != 0:
-            self.failure_report(self.response_json)
+        self.url = entry['url']
+        self.set_instr(entry['instrument'])
 
-        if self.query_status != 'failed':
-            print('query done succesfully!')
-        else:
-            raise RemoteException(debug_message=self.response_json['exit_status']['error_message'])
+        job = self.new_job(entry['parameters'])
+        job.job_id = entry['job_id']
+        job.query_status = entry['query_status']
+        self.job = job
+
+        job.t0 = time.time()
 
+        job.run(wait=self.wait)
+
+        return job
+
+    @classmethod
+    def resume_unfinished(cls, journal=None, url=None, wait=True, poll_interval_s=None, **kwargs):
+        """
+        reattaches to all unfinished jobs in the journal (by default, the one in ODA_API_JOURNAL or ~/.oda-api),
+        returning one DispatcherAPI per job; if wait, polls them all until they are complete
+        """
+        from .journal import JobJournal
+
+        if journal is None or isinstance(journal, str):
+            journal = JobJournal(journal)
+
+        resumed = []
+        for entry in journal.unfinished(url=url):
+            disp = cls(url=entry['url'], instrument=entry['instrument'], wait=False, journal=journal, **kwargs)
+            if poll_interval_s is not None:
+                disp.poll_interval_s = poll_interval_s
+            disp.reattach(entry['job_id'])
+            resumed.append(disp)
+
+        while wait and not all(disp.is_complete for disp in resumed):
+            time.sleep(min(disp.poll_interval_s for disp in resumed))
+
+            for disp in resumed:
+                if not disp.is_complete:
+                    disp.poll()
+
+        for disp in resumed:
+            disp.wait = wait
+
+        return resumed
+
+    def process_failure(self):
+        return self._current_job().process_failure()
 
     def failure_report(self, res_json):
         print('query failed!')
@@ -446,47 +1308,11 @@ class DispatcherAPI:
         print('Remote server debug_message->', res_json['exit_status']['debug_message'])
 
     def dig_list(self,b,only_prod=False):
-        from astropy.table import Table
-        #print ('start',type(b))
-        if isinstance(b, (set, tuple, list)):
-            for c in b:
-                self.dig_list(c)
-        else:
-            #print('not list',type(b))
-            try:
-                b = ast.literal_eval(str(b))
-                #print('b literal eval',(type(b)))
-            except:
-                #print ('b exception' ,b,type(b))
-                return str(b)
-            if isinstance(b, dict):
-                #print('dict',b)
-                _s = ''
-                for k, v in b.items():
-
-                    if 'query_name' == k or 'instrument' == k and only_prod==False:
-                        print('')
-                        print('--------------')
-                        _s += '%s' % k + ': ' + v
-                    if 'product_name' == k :
-                        _s += ' %s' % k + ': ' + v
-
-                for k in ['name', 'value', 'units']:
-                    if k in b.keys():
-                        _s += ' %s' % k + ': '
-                        if b[k] is not None:
-                            _s += '%s,' % str(b[k])
-                        else:
-                            _s += 'None,'
-                        _s += ' '
-                #if 'prod_dict' in b.keys():
-                #    print ('product dict',b)
-
-                if _s != '':
-                    print(_s)
-            else:
-                #print('no dict', type(b))
-                self.dig_list(b)
+        """
+        prints a summary of the queries, products and parameters described in a decoded dispatcher response
+        """
+        for line in custom_formatters.response_summary_lines(b, only_prod=only_prod):
+            print(line)
 
     @safe_run
     def _decode_res_json(self,res):
@@ -494,12 +1320,15 @@ class DispatcherAPI:
             if hasattr(res, 'content'):
                 #_js = json.loads(res.content)
                 #fixed issue with python 3.5
-                _js = res.json()
-                res = ast.literal_eval(str(_js).replace('null', 'None'))
+                with memtrace.stage('json'):
+                    _js = res.json()
+                with memtrace.stage('repr'):
+                    _js = str(_js).replace('null', 'None')
+                with memtrace.stage('literal_eval'):
+                    res = _literal_eval(_js)
             else:
-                res = ast.literal_eval(str(res).replace('null', 'None'))
+                res = _literal_eval(str(res).replace('null', 'None'))
 
-            self.dig_list(res)
             return res
         except Exception as e:
             #print (json.loads(res.text))
@@ -529,37 +1358,159 @@ class DispatcherAPI:
         if instrument is None:
             instrument=self.instrument
 
-        res=requests.get("%s/api/meta-data"%self.url,params=dict(instrument=instrument),cookies=self.cookies)
-        self._decode_res_json(res)
+        description = self._get_metadata("api/meta-data", dict(instrument=instrument))
+
+        self.dig_list(description)
+        return description
 
     @safe_run
     def get_product_description(self,instrument,product_name):
-        res = requests.get("%s/api/meta-data" % self.url, params=dict(instrument=instrument,product_type=product_name),cookies=self.cookies)
+        description = self._get_metadata("api/meta-data", dict(instrument=instrument,product_type=product_name))
 
         print('--------------')
         print ('parameters for  product',product_name,'and instrument',instrument)
-        self._decode_res_json(res)
+
+        self.dig_list(description)
+        return description
 
     @safe_run
     def get_instruments_list(self):
         #print ('instr',self.instrument)
-        res = requests.get("%s/api/instr-list" % self.url,params=dict(instrument=self.instrument),cookies=self.cookies)
-        return self._decode_res_json(res)
+        return self._get_metadata("api/instr-list", dict(instrument=self.instrument))
+
+    def _get_metadata(self, endpoint, params):
+        """
+        decoded response of a metadata endpoint: if cached, requested only if modified, see oda_api.metadata_cache
+        """
+        cache = self.metadata_cache
+        if cache is None:
+            res, spans = self._http_get(endpoint, params=params)
+            with spans.span('json_decode'):
+                return self._decode_res_json(res)
+
+        key = cache.key(self.url, endpoint, params, self.cookies)
+        entry = cache.get(key)
+
+        res, spans = self._http_get(endpoint, params=params, headers=cache.conditional_headers(entry))
+
+        if res.status_code == 304 and entry is not None:
+            return cache.not_modified(entry)
+
+        with spans.span('json_decode'):
+            content = self._decode_res_json(res)
+
+        if res.status_code == 200:
+            cache.put(key, res, content)
+
+        return content
 
 
     def report_last_request(self):
-        print(f"{C.GREY}last request completed in {self.last_request_t_complete - self.last_request_t0} seconds{C.NC}")
+        job = self._current_job()
 
+        print(f"{C.GREY}last request completed in {job.last_request_t_complete - job.last_request_t0} seconds{C.NC}")
 
-    def get_product(self, 
-                    product: str, 
-                    instrument: str,
-                    verbose: bool=False,
-                    dry_run: bool=False,
-                    product_type: str='Real', 
-                    **kwargs):
+        if job.last_request_spans is not None:
+            for name, duration in job.last_request_spans.spans.items():
+                print(f"{C.GREY}- {name}: {duration:.4f} seconds{C.NC}")
+
+
+    def _product_items(self, products):
         """
-        submit query, wait (if allowed by self.wait), decode output when found
+        kinds and encoded products listed in a dispatcher response, in the order they are decoded
+        """
+        items = []
+        if  'numpy_data_product'  in products.keys():
+            items.append(('numpy_data_product', products['numpy_data_product']))
+        elif  'numpy_data_product_list'  in products.keys():
+            items.extend([('numpy_data_product', d) for d in products['numpy_data_product_list']])
+
+        if 'binary_data_product_list' in products.keys():
+            items.extend([('binary_data_product', d) for d in products['binary_data_product_list']])
+
+        if 'catalog' in products.keys():
+            items.append(('catalog', products['catalog']))
+
+        if 'astropy_table_product_ascii_list' in products.keys():
+            items.extend([('astropy_table_product_ascii', d) for d in products['astropy_table_product_ascii_list']])
+
+        if 'astropy_table_product_binary_list' in products.keys():
+            items.extend([('astropy_table_product_binary', d) for d in products['astropy_table_product_binary_list']])
+
+        return items
+
+    def decode_products(self, products, timings=None):
+        """
+        decodes products of a completed query, in the order they are listed in the dispatcher response
+
+        products are decoded in a pool as set in decode_executor; if a list is given as timings,
+        the kind, name and decode time of each product are appended to it
+        """
+        items = self._product_items(products)
+
+        n_by_kind = {}
+        for kind, _ in items:
+            n_by_kind[kind] = n_by_kind.get(kind, 0) + 1
+
+        groups = {}
+        for i, (kind, _) in enumerate(items):
+            executor = self.decode_executor
+            if memtrace.current_trace() is not None:
+                # memory is traced in this thread
+                executor = None
+            elif executor == 'auto':
+                if n_by_kind[kind] > 1 and (os.cpu_count() or 1) > 1:
+                    executor = _auto_decode_executors.get(kind)
+                else:
+                    executor = None
+            groups.setdefault(executor, []).append(i)
+
+        results = [None] * len(items)
+        for executor, indices in groups.items():
+            for i, result in zip(indices, self._map_decode(executor, [items[i] for i in indices])):
+                results[i] = result
+
+        data = []
+        for (kind, _), (product, duration) in zip(items, results):
+            data.append(product)
+
+            # observed as an endpoint of its own, with one histogram per kind of product
+            self.metrics.observe('product_decode', kind, duration)
+
+            if timings is not None:
+                timings.append(dict(kind=kind, name=getattr(product, 'name', None), duration_s=duration))
+
+        return data
+
+    def _map_decode(self, executor, items):
+        if len(items) == 0:
+            return []
+
+        if executor is None:
+            return [_decode_product(kind, encoded) for kind, encoded in items]
+
+        if isinstance(executor, Executor):
+            return list(executor.map(_decode_product, *zip(*items)))
+
+        if executor == 'thread':
+            executor_class = ThreadPoolExecutor
+        elif executor == 'process':
+            executor_class = ProcessPoolExecutor
+        else:
+            raise UserError(f"unknown decode executor {executor}, possible values are None, thread, process, auto, or an Executor")
+
+        with executor_class(max_workers=self.decode_max_workers) as pool:
+            return list(pool.map(_decode_product, *zip(*items)))
+
+    def product_parameters(self,
+                           product: str,
+                           instrument: str,
+                           verbose: bool=False,
+                           dry_run: bool=False,
+                           product_type: str='Real',
+                           **kwargs):
+        """
+        builds request parameters for a product, checking their names against those known to the dispatcher
         """
 
         kwargs['instrument'] = instrument
@@ -571,7 +1522,7 @@ class DispatcherAPI:
         kwargs['session_id'] = self.generate_session_id()
         kwargs['dry_run'] = dry_run,
 
-        res = requests.get("%s/api/par-names" % self.url, params=dict(instrument=instrument,product_type=product), cookies=self.cookies)
+        res, spans = self._http_get("api/par-names", params=dict(instrument=instrument,product_type=product))
 
         if res.status_code == 200:
 
@@ -581,7 +1532,8 @@ class DispatcherAPI:
             for _i in _ignore_list:
                 del validation_dict[_i]
 
-            valid_names=self._decode_res_json(res)
+            with spans.span('json_decode'):
+                valid_names=self._decode_res_json(res)
             for n in validation_dict.keys():
                 if n not in valid_names:
                     if self.strict_parameter_check:
@@ -602,60 +1554,86 @@ class DispatcherAPI:
         else:
             warnings.warn('parameter check not available on remote server, check carefully parameters name')
 
-        ## >
-        self.request(kwargs)
-
-
-        if self.is_failed:
-            return self.process_failure()
-        elif self.is_ready:
-            res_json = self.response_json
-        elif not self.is_complete:
-            if self.wait:
-                raise RuntimeError("should have waited, but did not - programming error!")
-            else:
-                print(f"\n{C.BROWN}query not complete, please poll again later{C.NC}")
-                return
-        else:
-            raise RuntimeError("not failed, ready, but complete? programming error for client!")
-
-        ## <
-
-        data = None
-
-        if not dry_run:
-
-            data=[]
-            if  'numpy_data_product'  in res_json['products'].keys():
-                data.append(NumpyDataProduct.decode(res_json['products']['numpy_data_product']))
-            elif  'numpy_data_product_list'  in res_json['products'].keys():
+        return kwargs
 
-                data.extend([NumpyDataProduct.decode(d) for d in res_json['products']['numpy_data_product_list']])
-
-            if 'binary_data_product_list' in res_json['products'].keys():
-                data.extend([BinaryData().decode(d) for d in res_json['products']['binary_data_product_list']])
+    def new_product_job(self, product: str, instrument: str, **kwargs):
+        """
+        creates a Job for a product, not yet submitted; arguments are as for get_product
 
-            if 'catalog' in res_json['products'].keys():
-                data.append(ApiCatalog(res_json['products']['catalog'],name='dispatcher_catalog'))
+        The job does not change the state of this client, many of them can be polled concurrently, e.g. from threads:
 
-            if 'astropy_table_product_ascii_list' in res_json['products'].keys():
-                data.extend([ascii.read(table_text['ascii']) for table_text in res_json['products']['astropy_table_product_ascii_list']])
+            job = disp.new_product_job('isgri_image', 'isgri', ...)
+            data = job.result()
+        """
+        return self.new_job(self.product_parameters(product, instrument, **kwargs))
 
-            if 'astropy_table_product_binary_list' in res_json['products'].keys():
-                data.extend([ascii.read(table_binary) for table_binary in res_json['products']['astropy_table_product_binary_list']])
+    def get_product(self, 
+                    product: str, 
+                    instrument: str,
+                    verbose: bool=False,
+                    dry_run: bool=False,
+                    product_type: str='Real', 
+                    **kwargs):
+        """
+        submit query, wait (if allowed by self.wait), decode output when found
+        """
 
-            d=DataCollection(data, instrument=instrument, product=product)
-            for p in d._p_list:
-                if hasattr(p,'meta_data') is False and hasattr(p,'meta') is True:
-                    p.meta_data = p.meta
-        else:
-            self._decode_res_json(res.json()['products']['instrument_parameters'])
-            d=None
+        parameters = self.product_parameters(product, instrument, verbose=verbose, dry_run=dry_run, product_type=product_type, **kwargs)
+
+        if self.shard_size is not None and 'scw_list' in parameters and self.wait and not dry_run:
+            from . import sharding
+
+            kind = sharding.merge_kind(product)
+            if kind is not None and len(sharding.split_scw_list(parameters['scw_list'], self.shard_size)) > 1:
+                # the sharded run becomes the current job: it has no job id of its own, its shards are in shard_jobs
+                job = self.new_job(parameters)
+                job.shard_jobs = []
+                job.t0 = job.last_request_t0 = time.time()
+                try:
+                    data = sharding.run_sharded(self, parameters, self.shard_size, kind,
+                                                parallel=self.shard_parallel,
+                                                max_retries=self.shard_max_retries,
+                                                jobs=job.shard_jobs)
+                    job.query_status = 'done'
+                except BaseException:
+                    job.query_status = 'failed'
+                    raise
+                finally:
+                    job.last_request_t_complete = time.time()
+                    job.n_poll = sum(j.n_poll for j in job.shard_jobs)
+                    self._set_current_job(job)
+
+                return data
+
+        if self.deduplicate and self.wait and not dry_run:
+            from .singleflight import request_key, default_single_flight
+
+            single_flight = self.single_flight if self.single_flight is not None else default_single_flight
+
+            job_state, data = single_flight.do(request_key(self.url, parameters, self.cookies),
+                                               lambda: self._request_shared_product(parameters),
+                                               share=copy.deepcopy)
+
+            if job_state['job_id'] != self.job_id:
+                # coalesced with a call of another client: the job of that call becomes the current job of this one
+                job = self.new_job(parameters)
+                job.job_id = job_state['job_id']
+                job.query_status = job_state['query_status']
+                job.response_json = job_state['response_json']
+                self._set_current_job(job)
+
+            return data
 
-        del(res)
+        ## >
+        job = self._request_product(parameters)
 
-        return d
+        return job.collect_products(dry_run=dry_run)
 
+    def collect_products(self, dry_run=False):
+        """
+        decodes the products of the completed current job into a DataCollection
+        """
+        return self._current_job().collect_products(dry_run=dry_run)
 
 
     @staticmethod
@@ -703,6 +1681,11 @@ class DataCollection(object):
     def __init__(self,data_list,add_meta_to_name=['src_name','product'],instrument=None,product=None):
         self._p_list = []
         self._n_list = []
+
+        # kind, name and decode time of each product, when decoded from a dispatcher response
+        self.decode_timings = None
+        # memory allocated by the stages of getting the products, if traced by the client
+        self.memory_report = None
         for ID,data in enumerate(data_list):
 
             name=''
@@ -758,6 +1741,24 @@ class DataCollection(object):
     def save(self,file_name):
         pickle.dump(self, open(file_name, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
 
+    def to_shared_memory(self):
+        """
+        copies the arrays of the products into shared memory, for worker processes; returns the SharedProducts,
+        see oda_api.sharedmem
+        """
+        from .sharedmem import export_shared
+
+        return export_shared(self)
+
+    @classmethod
+    def from_shared_memory(cls,descriptor):
+        """
+        collection of a shared memory descriptor, viewing its arrays, as a context closing the view
+        """
+        from .sharedmem import attach_shared
+
+        return attach_shared(descriptor, kind='collection')
+
     def new_from_metadata(self,key,val):
         dc=None
         _l=[]
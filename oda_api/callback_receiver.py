@@ -0,0 +1,146 @@
+"""
+Local receiver of job completion callbacks from the dispatcher.
+
+When a client has a receiver, its jobs are submitted with the URL of the receiver as callback_url,
+and the dispatcher calls it back when they complete. Jobs waiting for completion then poll again only
+when called back, or, as a safety net if a callback is lost, every callback_poll_interval_s; until the first
+callback arrives, every poll_interval_s. A dispatcher which does not acknowledge callback_url, with an
+ODA-Callback header in the response to the submission, is polled as without a receiver:
+
+    disp = DispatcherAPI(url=...)
+    disp.enable_callbacks()  # on the loopback interface, on any free port
+    data = disp.get_product(...)
+
+The callback URL includes a random token, and calls to other URLs are rejected. For a remote dispatcher,
+the receiver has to listen on an interface it can reach, or behind a tunnel, given as public_url.
+
+Callbacks are HTTP GET or POST requests, with job_id and status as query or form parameters.
+"""
+
+import collections
+import logging
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+__all__ = ['CallbackReceiver']
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        self.handle_callback(b'')
+
+    def do_POST(self):
+        self.handle_callback(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+
+    def handle_callback(self, body):
+        parsed = urlparse(self.path)
+        receiver = self.server.receiver
+
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+
+        if parsed.path != receiver.path or 'job_id' not in params:
+            self.send_text('not found', 404)
+            return
+
+        receiver.notify(params['job_id'], params.get('status'), params)
+        self.send_text('ok', 200)
+
+    def send_text(self, text, status):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CallbackReceiver(object):
+    """
+    HTTP server, in a thread, recording callbacks by job id, for jobs waiting for them
+
+    The last max_received callbacks are kept, and so are callbacks of at most as many jobs not waited for yet.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, public_url=None, max_received=1000):
+        self.path = '/callback/' + secrets.token_hex(16)
+        self.public_url = public_url
+
+        # last callbacks received, in order, with the time they were received
+        self.received = collections.deque(maxlen=max_received)
+
+        self._condition = threading.Condition()
+        # jobs called back since they were last waited for, oldest first
+        self._pending = collections.OrderedDict()
+        self._max_pending = max_received
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), CallbackHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.receiver = self
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.url)
+
+    @property
+    def url(self):
+        if self.public_url is not None:
+            return self.public_url.rstrip('/') + self.path
+
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d%s' % (host, port, self.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs=dict(poll_interval=0.1), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def notify(self, job_id, status, params=None):
+        with self._condition:
+            self.received.append(dict(job_id=job_id, status=status, t=time.time(), params=params or {}))
+
+            self._pending[job_id] = True
+            self._pending.move_to_end(job_id)
+            if len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+
+            self._condition.notify_all()
+
+    def wait(self, job_id, timeout=None):
+        """
+        waits for a callback for the job, received since the last wait for it, for at most timeout seconds;
+        returns True if there was one
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._condition:
+            while job_id not in self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+            del self._pending[job_id]
+            return True
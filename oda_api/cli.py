@@ -0,0 +1,272 @@
+"""
+Runs a grid of product queries against a dispatcher.
+
+The grid is read from a CSV file (one query per row, one parameter per column), or from a JSON
+or YAML file holding either a list of queries, or a mapping with common "defaults", a list of
+"jobs", and/or a "grid" of parameter values, of which all combinations are queried:
+
+    defaults: {instrument: isgri, product: isgri_image, E1_keV: 20}
+    grid: {scw_list: ["066500230010.001", "066500240010.001"], E2_keV: [40, 80]}
+
+Each query takes the parameters of DispatcherAPI.get_product. Products are written as FITS files
+in the output directory, and a JSON report of the run, with per-job status and timings, is written
+at the end. Decoded products are cached locally, so that a query is not run again with the same
+parameters, e.g. when an interrupted run is restarted.
+
+    oda-api grid.yaml --url https://www.astro.unige.ch/cdci/astrooda/dispatch-data --parallel 8
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['load_grid', 'run_grid', 'main']
+
+logger = logging.getLogger(__name__)
+
+
+def load_grid(path):
+    """
+    reads the list of queries, each a dict of get_product parameters, from a CSV, JSON or YAML file
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    with open(path) as f:
+        if ext == '.csv':
+            # empty cells are parameters not set for this query
+            return [{k: v for k, v in row.items() if v not in (None, '')} for row in csv.DictReader(f)]
+        elif ext == '.json':
+            content = json.load(f)
+        elif ext in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("reading YAML parameter files needs pyyaml, please install it, or use JSON or CSV")
+            content = yaml.safe_load(f)
+        else:
+            raise RuntimeError(f"unknown parameter file format {ext}, possible are .csv, .json, .yaml")
+
+    if isinstance(content, list):
+        return content
+
+    if not isinstance(content, dict):
+        raise RuntimeError(f"parameter file {path} should hold a list of queries, or a mapping with defaults, jobs and/or grid")
+
+    defaults = content.get('defaults', {})
+    queries = [{**defaults, **job} for job in content.get('jobs', [])]
+
+    grid = content.get('grid')
+    if grid is not None:
+        names = list(grid)
+        for values in itertools.product(*[v if isinstance(v, list) else [v] for v in grid.values()]):
+            queries.append({**defaults, **dict(zip(names, values))})
+
+    if len(queries) == 0 and 'jobs' not in content:
+        queries = [defaults]
+
+    return queries
+
+
+class ResultCache(object):
+    """
+    decoded products of completed queries, pickled in a directory, by request key
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def get(self, key):
+        try:
+            with open(self._filename(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("unable to read cached result %s, ignoring it: %s", self._filename(key), e)
+            return None
+
+    def put(self, key, data):
+        tmp_filename = '%s.%d.tmp' % (self._filename(key), os.getpid())
+        with open(tmp_filename, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, self._filename(key))
+
+
+def run_query(disp, index, query, retries=0, retry_sleep_s=5, cache=None, output_dir=None):
+    """
+    runs one query of the grid, returning its entry in the run report
+    """
+    from .singleflight import request_key
+
+    parameters = dict(query)
+    product = parameters.pop('product', None)
+    instrument = parameters.pop('instrument', None)
+
+    entry = dict(index=index, parameters=query, status=None, job_id=None, attempts=0, cached=False, files=[], error=None)
+
+    t0 = time.perf_counter()
+
+    try:
+        if product is None or instrument is None:
+            raise RuntimeError("query sets no product or instrument")
+
+        key = request_key(disp.url, query, disp.cookies)
+        data = cache.get(key) if cache is not None else None
+
+        if data is not None:
+            entry['status'] = 'cached'
+            entry['cached'] = True
+        else:
+            while True:
+                entry['attempts'] += 1
+                job = None
+                try:
+                    job = disp.new_product_job(product, instrument, **parameters)
+                    data = job.result()
+                    entry['job_id'] = job.job_id
+                    entry['status'] = job.query_status
+                    break
+                except (Exception, SystemExit) as e:
+                    # failed jobs raise RemoteException, which exits; they would fail again, and are not retried
+                    if job is not None and job.is_failed:
+                        entry['job_id'] = job.job_id
+                        entry['status'] = 'failed'
+                        entry['error'] = job.response_json['exit_status'].get('error_message')
+                        break
+
+                    if entry['attempts'] > retries:
+                        raise
+
+                    logger.warning("query %d failed, %d retries left: %s", index, retries - entry['attempts'] + 1, repr(e)[:200])
+                    time.sleep(retry_sleep_s)
+
+            if data is not None and cache is not None:
+                cache.put(key, data)
+
+        if data is not None:
+            entry['n_products'] = len(data._p_list)
+            entry['decode_s'] = sum(t['duration_s'] for t in data.decode_timings or [])
+
+            if output_dir is not None:
+                prefix = os.path.join(output_dir, 'job%04d' % index)
+                data.save_all_data(prenpend_name=prefix)
+                entry['files'] = [prefix + '_' + name + '.fits' for name in data._n_list]
+
+    except (Exception, SystemExit) as e:
+        entry['status'] = 'error'
+        entry['error'] = repr(e)[:2000]
+
+    entry['wall_time_s'] = time.perf_counter() - t0
+
+    return entry
+
+
+def run_grid(disp, queries, parallel=4, retries=0, retry_sleep_s=5, cache_dir=None, output_dir=None, progress=None):
+    """
+    runs all queries with one DispatcherAPI, parallel at a time, and returns the run report
+    """
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+
+    if output_dir is not None and not os.path.isdir(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    def run(args):
+        entry = run_query(disp, *args, retries=retries, retry_sleep_s=retry_sleep_s, cache=cache, output_dir=output_dir)
+        if progress is not None:
+            progress(entry)
+        return entry
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        jobs = list(executor.map(run, enumerate(queries)))
+    wall_time = time.perf_counter() - t0
+
+    return dict(
+        url=disp.url,
+        n_jobs=len(jobs),
+        parallel=parallel,
+        wall_time_s=wall_time,
+        status_counts={s: sum(1 for j in jobs if j['status'] == s) for s in sorted(set(j['status'] for j in jobs))},
+        jobs=jobs,
+    )
+
+
+def main(argv=None):
+    from .api import DispatcherAPI
+
+    parser = argparse.ArgumentParser(prog='oda-api', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('parameter_file', help='CSV, JSON or YAML file with the queries')
+    parser.add_argument('--url', default=os.environ.get('DISP_URL', 'https://www.astro.unige.ch/cdci/astrooda/dispatch-data'),
+                        help='dispatcher URL, by default from DISP_URL')
+    parser.add_argument('--token-file', default=os.environ.get('ODA_API_TOKEN'),
+                        help='file with the authentication token, by default from ODA_API_TOKEN')
+    parser.add_argument('--parallel', type=int, default=4, help='queries running at the same time')
+    parser.add_argument('--retries', type=int, default=0, help='retries of queries which fail with an error (not failed jobs)')
+    parser.add_argument('--retry-sleep-s', type=float, default=5)
+    parser.add_argument('--poll-interval-s', type=float, default=2)
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.expanduser('~'), '.oda-api', 'results'),
+                        help='directory of cached results')
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--output-dir', default='.', help='directory for FITS files of the products')
+    parser.add_argument('--report', default='oda-api-report.json', help='run report file, - for standard output')
+    parser.add_argument('--verbose', action='store_true', help='show output of the client for every query')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    try:
+        queries = load_grid(args.parameter_file)
+    except (OSError, ValueError, RuntimeError) as e:
+        parser.error(str(e))
+
+    cookies = None
+    if args.token_file is not None:
+        with open(args.token_file) as f:
+            cookies = dict(_oauth2_proxy=f.read().strip())
+
+    disp = DispatcherAPI(url=args.url, cookies=cookies)
+    disp.poll_interval_s = args.poll_interval_s
+
+    def progress(entry):
+        print(f"job {entry['index']}: {entry['status']} in {entry['wall_time_s']:.1f} s", file=sys.stderr)
+
+    print(f"running {len(queries)} queries on {args.url}", file=sys.stderr)
+
+    # client output of concurrent queries is interleaved, and only useful for debugging
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stderr if args.verbose else devnull):
+        report = run_grid(disp,
+                          queries,
+                          parallel=args.parallel,
+                          retries=args.retries,
+                          retry_sleep_s=args.retry_sleep_s,
+                          cache_dir=None if args.no_cache else args.cache_dir,
+                          output_dir=args.output_dir,
+                          progress=progress)
+
+    if args.report == '-':
+        print(json.dumps(report, indent=4, default=str))
+    else:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=4, default=str)
+        print(f"report written to {args.report}: {report['status_counts']}", file=sys.stderr)
+
+    if any(j['status'] in ('failed', 'error') for j in report['jobs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
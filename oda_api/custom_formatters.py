@@ -1,4 +1,5 @@
 from . import colors as C
+import ast
 import re
 
 import logging
@@ -18,3 +19,39 @@ def custom_progress_formatter(L):
     nrestored = len(set([l.get('node', 'none') for l in L if l['message'] == 'restored from cache']))
     nnodes = len(set([l.get('node', 'none') for l in L]))
     return f"in {nscw} SCW so far; nodes ({nnodes}): {ndone} computed {nrestored} restored"
+
+
+def response_summary_lines(response, only_prod=False):
+    """
+    yields summary lines for the queries, products and parameters described in a decoded dispatcher response
+
+    Lists are walked with an explicit stack rather than recursively; strings holding a serialized list or dict are parsed.
+    """
+    stack = [response]
+    while stack:
+        b = stack.pop()
+
+        if isinstance(b, str) and b[:1] in ('[', '{'):
+            try:
+                b = ast.literal_eval(b)
+            except (ValueError, SyntaxError):
+                continue
+
+        if isinstance(b, (set, tuple, list)):
+            stack.extend(reversed(list(b)))
+        elif isinstance(b, dict):
+            _s = ''
+            for k, v in b.items():
+                if k == 'query_name' or (k == 'instrument' and not only_prod):
+                    yield ''
+                    yield '--------------'
+                    _s += '%s: %s' % (k, v)
+                if k == 'product_name':
+                    _s += ' %s: %s' % (k, v)
+
+            for k in ['name', 'value', 'units']:
+                if k in b:
+                    _s += ' %s: %s, ' % (k, b[k])
+
+            if _s != '':
+                yield _s
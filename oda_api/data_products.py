@@ -16,27 +16,28 @@ __author__ = "Andrea Tramacere"
 # Project
 # relative import eg: from .mod import f
 
-from json_tricks import numpy_encode,dumps,loads,numeric_types_hook,hashodict,json_numpy_obj_hook
-from astropy.io import fits as pf
-import json
-from astropy.utils.misc import JsonCustomEncoder
+# astropy and json_tricks are slow to import, they are imported where first needed
 
-from astropy.table import Table
-from astropy.coordinates import Angle
+import json
 
 import  numpy
 import  base64
 import  pickle
 import gzip
 import  hashlib
+import re
 from numpy import nan,inf
 from sys import version_info
+from . import memtrace
 try:
     from StringIO import StringIO
 except ImportError:
     from io import StringIO
 
 
+# keywords describing the structure of the data of an HDU, always taken from the data, never from the user header
+_structural_keyword = re.compile(r'^(SIMPLE|XTENSION|BITPIX|NAXIS\d*|PCOUNT|GCOUNT|TFIELDS|TTYPE\d+|TFORM\d+|TUNIT\d+|TDIM\d+)$')
+
 __all__=['sanitize_encoded','_chekc_enc_data','BinaryData','NumpyDataUnit','NumpyDataProduct','ApiCatalog','AstropyTable']
 
 
@@ -81,6 +82,8 @@ class ODAAstropyTable(object):
 
     @classmethod
     def from_file(cls, file_path, name=None, delimiter=None, format=None):
+        from astropy.table import Table
+
         _allowed_formats_=['ascii','ascii.ecsv','fits']
         if format == 'fits':
             # print('==>',file_name)
@@ -98,6 +101,7 @@ class ODAAstropyTable(object):
         return cls(table, meta_data=meta)
 
     def encode(self,use_binary=False,to_json = False):
+        from json_tricks import dumps
 
         _o_dict = {}
         _o_dict['binary']=None
@@ -134,6 +138,7 @@ class ODAAstropyTable(object):
                 t_rec= pickle.loads(t_rec,encoding='latin')
 
         else:
+            from astropy.io import ascii
             t_rec = ascii.read(_o_dict['ascii'])
 
         return cls(t_rec,name=encoded_name,meta_data=encoded_meta_data)
@@ -174,6 +179,14 @@ class NumpyDataUnit(object):
         self.hdu_type=hdu_type
         self.units_dict=units_dict
 
+        self._fits_header_cache = None
+
+    def __getstate__(self):
+        # the FITS header is built again when needed, after unpickling
+        state = dict(self.__dict__)
+        state['_fits_header_cache'] = None
+        return state
+
     def _chekc_data(self,data):
 
 
@@ -211,27 +224,60 @@ class NumpyDataUnit(object):
                    hdu_type=cls._map_hdu_type(hdu),name=name)
 
 
-    def to_fits_hdu(self):
-        try:
-            for k,v in self.header.items():
+    def _fits_header(self):
+        """
+        user header as a FITS header, built again only when the header changes; list values, as of scw lists,
+        are written as comma-separated strings, leaving the header unchanged
+        """
+        from astropy.io import fits as pf
+
+        key = repr(self.header)
+        cache = getattr(self, '_fits_header_cache', None)
+        if cache is None or cache[0] != key:
+            header = {}
+            for k, v in self.header.items():
                 if isinstance(v, list):
-                    s=''
-                    for l in v:
-                        s+='%s,'%str(l)
-                    
-                    self.header[k] = s
-                    #unicode(",".join(map(str,v)))
+                    v = ''.join('%s,' % str(l) for l in v)
+                header[k] = v
 
+            fits_header = pf.header.Header(header)
+            # cards are formatted once, their copies are written as they are
+            fits_header.tostring()
+            self._fits_header_cache = (key, fits_header)
+
+        return self._fits_header_cache[1]
+
+    def to_fits_hdu(self):
+        try:
             return  self.new_hdu_from_data(self.data,
-                                    header=pf.header.Header(self.header),
+                                    header=self._fits_header().copy(),
                                     hdu_type=self.hdu_type,units_dict=self.units_dict)
         except Exception as e:
             raise Exception("the platfrom encourntered a bug which happens when ScW list is sent as a file; we are working on it! raw message: "+repr(e))
 
 
 
+    def to_shared_memory(self):
+        """
+        copies the data into shared memory, for worker processes; returns the SharedProducts, see oda_api.sharedmem
+        """
+        from .sharedmem import export_shared
+
+        return export_shared(self)
+
+    @classmethod
+    def from_shared_memory(cls,descriptor):
+        """
+        data unit of a shared memory descriptor, viewing its data, as a context closing the view
+        """
+        from .sharedmem import attach_shared
+
+        return attach_shared(descriptor, kind='unit')
+
     @staticmethod
     def _map_hdu_type(hdu):
+        from astropy.io import fits as pf
+
         _t=''
         if isinstance(hdu,pf.PrimaryHDU):
             _t= 'primary'
@@ -247,6 +293,7 @@ class NumpyDataUnit(object):
         return _t
 
     def new_hdu_from_data(self,data,hdu_type, header=None,units_dict=None):
+        from astropy.io import fits as pf
 
         self._chekc_hdu_type(hdu_type)
 
@@ -262,13 +309,19 @@ class NumpyDataUnit(object):
             raise RuntimeError('hdu type ', hdu_type, 'not in allowed', self._hdu_type_list_)
 
 
-        _h=h(data=data, header=header)
-        _h.name=self.name
+        # the HDU is built from the data, and the header appended after the units are set, all at once:
+        # column keywords are then not inserted, one by one, in front of a possibly large header;
+        # structural keywords of the user header, possibly stale, are left out
+        _h=h(data=data)
         if units_dict is not None:
-
             for k in units_dict.keys():
                 _h.columns.change_unit(k,units_dict[k])
-            self.header=dict(_h.header)
+            _h.update_header()
+        if header is not None:
+            if not isinstance(header, pf.Header):
+                header = pf.Header(header)
+            _h.header.extend([c for c in header.cards if not _structural_keyword.match(c.keyword)], update=True, end=True)
+        _h.name=self.name
         return _h
 
     @staticmethod
@@ -293,6 +346,7 @@ class NumpyDataUnit(object):
         _dt = None
         _binarys = None
         if self.data is not None:
+            from json_tricks import numpy_encode
             _dt= numpy_encode(numpy.array(self.data))['dtype']
 
             if use_pickle is True:
@@ -311,6 +365,7 @@ class NumpyDataUnit(object):
 
 
             else:
+                from astropy.utils.misc import JsonCustomEncoder
                 _d= json.dumps(self.data, cls=JsonCustomEncoder)
 
 
@@ -351,11 +406,12 @@ class NumpyDataUnit(object):
         if _binarys is not None:
             #print('dec ->', type(_binarys))
             in_file = StringIO()
-            if version_info[0] > 2:
-                    _binarys=base64.b64decode(_binarys)
+            with memtrace.stage('base64_decode'):
+                if version_info[0] > 2:
+                        _binarys=base64.b64decode(_binarys)
 
-            else:
-                _binarys = base64.decodestring(_binarys)
+                else:
+                    _binarys = base64.decodestring(_binarys)
 
             if use_gzip ==True:
                 in_file.write(_binarys)
@@ -367,19 +423,21 @@ class NumpyDataUnit(object):
                 _data = pickle.loads(_data)
                 gzip_file.close()
             else:
-                if version_info[0] > 2:
-                    _data=pickle.loads(_binarys,encoding='bytes')
-                else:
-                    _data = pickle.loads(_binarys)
+                with memtrace.stage('unpickle'):
+                    if version_info[0] > 2:
+                        _data=pickle.loads(_binarys,encoding='bytes')
+                    else:
+                        _data = pickle.loads(_binarys)
 
         elif encoded_data is not None:
             #print('using JsonCustomEncoder')
-            encoded_data=eval(encoded_data)
+            with memtrace.stage('json_data'):
+                encoded_data=eval(encoded_data)
 
-            for ID,c in enumerate(encoded_data):
-                encoded_data[ID]=tuple(c)
+                for ID,c in enumerate(encoded_data):
+                    encoded_data[ID]=tuple(c)
 
-            _data=numpy.asanyarray(encoded_data,dtype=cls._eval_dt(encoded_dt))
+                _data=numpy.asanyarray(encoded_data,dtype=cls._eval_dt(encoded_dt))
 
         else:
             _data=None
@@ -461,6 +519,8 @@ class NumpyDataProduct(object):
 
 
     def encode(self,use_pickle=True,use_gzip=False,to_json=False):
+        from json_tricks import dumps
+
         _enc=[]
         #print('use_gzip',use_gzip)
         for ID, ed in enumerate(self.data_unit):
@@ -476,6 +536,8 @@ class NumpyDataProduct(object):
 
 
     def to_fits_hdu_list(self):
+        from astropy.io import fits as pf
+
         _hdul=pf.HDUList()
         for ID,_d in enumerate(self.data_unit):
             _hdul.append(_d.to_fits_hdu())
@@ -488,8 +550,27 @@ class NumpyDataProduct(object):
 
 
 
+    def to_shared_memory(self):
+        """
+        copies the data into shared memory, for worker processes; returns the SharedProducts, see oda_api.sharedmem
+        """
+        from .sharedmem import export_shared
+
+        return export_shared(self)
+
+    @classmethod
+    def from_shared_memory(cls,descriptor):
+        """
+        product of a shared memory descriptor, viewing its data, as a context closing the view
+        """
+        from .sharedmem import attach_shared
+
+        return attach_shared(descriptor, kind='product')
+
     @classmethod
     def from_fits_file(cls,filename,ext=None,hdu_name=None,meta_data={},name=''):
+        from astropy.io import fits as pf
+
         hdul=pf.open(filename)
         if ext is not None:
             hdul=[hdul[ext]]
@@ -508,7 +589,8 @@ class NumpyDataProduct(object):
         if encoded_obj is not None:
             if from_json==False:
                 try:
-                    encoded_obj = json.loads(sanitize_encoded(encoded_obj))
+                    with memtrace.stage('json_loads'):
+                        encoded_obj = json.loads(sanitize_encoded(encoded_obj))
                 except:
                     pass
 
@@ -535,6 +617,9 @@ class ApiCatalog(object):
 
 
     def __init__(self,cat_dict,name='catalog'):
+        from astropy.table import Table
+        from astropy.coordinates import Angle
+
         self.name=name
         _skip_list=['meta_ID']
 
@@ -0,0 +1,103 @@
+"""
+Hooks called on events of the life of jobs, for plugging in tracing or metrics.
+
+Each client has a HookRegistry, DispatcherAPI.hooks, to which callbacks are added by event:
+
+    def on_poll(event):
+        print(event['job_id'], event['status'], event['duration_s'])
+
+    disp.hooks.add('on_poll', on_poll)
+
+Callbacks receive a dict, with the event name, the time (time.time()) it happened at, the job id,
+and the timings of the event. They are called in the thread of the job, and should be quick;
+their exceptions are logged, and do not interrupt the job. When no callback is registered,
+events are not even built.
+
+Events:
+    on_submit: the dispatcher accepted a new job (job_id, status, parameters, duration_s of the request)
+    on_poll: a job was polled (job_id, status, n_poll, duration_s, spans: durations by stage of the request)
+    on_status_change: the status of a job changed (job_id, previous_status, status, elapsed_s since the job started)
+    on_retry: a failed call is retried (job_id, function, error, tries_left)
+    on_decode_start: products of a job are about to be decoded (job_id, n_products)
+    on_decode_end: they were decoded (job_id, n_products, duration_s, timings: per product)
+    on_complete: a job is done or failed (job_id, status, elapsed_s, n_poll)
+"""
+
+import logging
+import threading
+import time
+
+__all__ = ['EVENTS', 'HookRegistry']
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ('on_submit', 'on_poll', 'on_status_change', 'on_retry', 'on_decode_start', 'on_decode_end', 'on_complete')
+
+
+class HookRegistry(object):
+    """
+    callbacks by event; true if any is registered
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = {}
+
+    def __bool__(self):
+        return len(self._callbacks) > 0
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, {e: len(c) for e, c in self._callbacks.items()})
+
+    def _check_event(self, event):
+        if event not in EVENTS:
+            raise ValueError(f"unknown event {event}, possible are {', '.join(EVENTS)}")
+
+    def add(self, event, callback):
+        """
+        registers callback for event; returns it, to be used as decorator with functools.partial
+        """
+        self._check_event(event)
+
+        with self._lock:
+            # replaced, not modified, so that events being emitted are not affected
+            self._callbacks = {**self._callbacks, event: self._callbacks.get(event, ()) + (callback,)}
+
+        return callback
+
+    def remove(self, event, callback):
+        self._check_event(event)
+
+        with self._lock:
+            callbacks = tuple(c for c in self._callbacks.get(event, ()) if c is not callback)
+
+            self._callbacks = {e: c for e, c in self._callbacks.items() if e != event}
+            if len(callbacks) > 0:
+                self._callbacks[event] = callbacks
+
+    def clear(self, event=None):
+        with self._lock:
+            if event is None:
+                self._callbacks = {}
+            else:
+                self._callbacks = {e: c for e, c in self._callbacks.items() if e != event}
+
+    def callbacks(self, event):
+        return self._callbacks.get(event, ())
+
+    def emit(self, event, **payload):
+        """
+        calls the callbacks of event, with the payload, the event name and the time
+        """
+        callbacks = self._callbacks.get(event)
+        if not callbacks:
+            return
+
+        payload['event'] = event
+        payload['t'] = time.time()
+
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("hook %s for %s failed", callback, event)
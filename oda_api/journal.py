@@ -0,0 +1,109 @@
+"""
+Local journal of submitted dispatcher jobs.
+
+The journal is an SQLite database recording, for every job, the dispatcher URL, the
+request parameters, the job id and the last known query status. It is written on submission and
+on every status change, so that unfinished jobs can be reattached to after the client process
+restarts, instead of being submitted (and computed) again.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+__all__ = ['JobJournal', 'default_journal_path']
+
+
+def default_journal_path():
+    return os.environ.get('ODA_API_JOURNAL', os.path.join(os.path.expanduser('~'), '.oda-api', 'jobs.sqlite'))
+
+
+class JobJournal(object):
+    complete_statuses = ['done', 'ready', 'failed']
+
+    def __init__(self, path=None):
+        if path is None:
+            path = default_journal_path()
+
+        self.path = path
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                                job_id TEXT PRIMARY KEY,
+                                url TEXT,
+                                instrument TEXT,
+                                query_status TEXT,
+                                parameters TEXT,
+                                submitted REAL,
+                                updated REAL
+                            )''')
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.path)
+
+    def _connect(self):
+        # one short-lived connection per operation: safe to share the journal between threads and processes
+        return sqlite3.connect(self.path, timeout=60)
+
+    def record(self, job_id, url, instrument, query_status, parameters):
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute('''INSERT INTO jobs (job_id, url, instrument, query_status, parameters, submitted, updated)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(job_id) DO UPDATE SET query_status=excluded.query_status, updated=excluded.updated''',
+                         (job_id, url, instrument, query_status, json.dumps(parameters), now, now))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute('SELECT job_id, url, instrument, query_status, parameters, submitted, updated FROM jobs WHERE job_id=?',
+                               (job_id,)).fetchone()
+
+        if row is None:
+            raise KeyError('job %s is not in journal %s' % (job_id, self.path))
+
+        return self._row_to_dict(row)
+
+    def jobs(self, url=None, unfinished=False):
+        query = 'SELECT job_id, url, instrument, query_status, parameters, submitted, updated FROM jobs'
+        conditions = []
+        args = []
+
+        if url is not None:
+            conditions.append('url=?')
+            args.append(url)
+
+        if unfinished:
+            conditions.append('query_status NOT IN (%s)' % ','.join('?' * len(self.complete_statuses)))
+            args.extend(self.complete_statuses)
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        with self._connect() as conn:
+            rows = conn.execute(query + ' ORDER BY submitted', args).fetchall()
+
+        return [self._row_to_dict(row) for row in rows]
+
+    def unfinished(self, url=None):
+        return self.jobs(url=url, unfinished=True)
+
+    def forget(self, job_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM jobs WHERE job_id=?', (job_id,))
+
+    @staticmethod
+    def _row_to_dict(row):
+        job_id, url, instrument, query_status, parameters, submitted, updated = row
+        return dict(job_id=job_id,
+                    url=url,
+                    instrument=instrument,
+                    query_status=query_status,
+                    parameters=json.loads(parameters),
+                    submitted=submitted,
+                    updated=updated)
@@ -0,0 +1,186 @@
+"""
+Light-curve operations over NumpyDataProducts: concatenation, rebinning and stacking.
+
+Columns are those shown by plot_tools.OdaLightCurve, named in the product meta_data by the keys
+'time', 'rate' and 'rate_err', with the bin size in 'time_bin' (in units of the time column).
+All operations are vectorized with numpy, and return new products, leaving their inputs unchanged.
+
+    from oda_api import lightcurve
+    lc = lightcurve.concatenate(products)
+    lc_1h = lightcurve.rebin(lc, 1 / 24.)
+"""
+
+import numpy
+
+__all__ = ['lc_columns', 'concatenate', 'concatenate_data', 'rebin', 'stack']
+
+_default_columns = dict(time='TIME', rate='RATE', rate_err='ERROR')
+
+
+def lc_columns(product, unit_ID=None):
+    """
+    names of the time, rate and rate error columns, and the time bin, of a light curve product;
+    unit_ID is the light curve data unit, by default the first one with the time column
+    """
+    meta_data = product.meta_data or {}
+
+    columns = [meta_data.get(k, v) for k, v in _default_columns.items()]
+
+    if unit_ID is None:
+        for unit_ID, unit in enumerate(product.data_unit):
+            if unit.data is not None and unit.data.dtype.names is not None and columns[0] in unit.data.dtype.names:
+                break
+        else:
+            raise RuntimeError(f"product {product.name} has no data unit with time column {columns[0]}")
+
+    names = product.data_unit[unit_ID].data.dtype.names
+    for column in columns:
+        if column not in names:
+            raise RuntimeError(f"light curve column {column} is not among columns of {product.name}: {names}")
+
+    return tuple(columns) + (meta_data.get('time_bin'), unit_ID)
+
+
+def _new_product(product, unit_ID, data, **meta_data):
+    from .data_products import NumpyDataProduct, NumpyDataUnit
+
+    unit = product.data_unit[unit_ID]
+
+    # other data units, e.g. the primary one, are shared with the input product
+    data_units = list(product.data_unit)
+    data_units[unit_ID] = NumpyDataUnit(data,
+                                        data_header=dict(unit.header),
+                                        meta_data=unit.meta_data,
+                                        hdu_type=unit.hdu_type,
+                                        name=unit.name,
+                                        units_dict=unit.units_dict)
+
+    return NumpyDataProduct(data_units, name=product.name, meta_data={**product.meta_data, **meta_data})
+
+
+def concatenate_data(arrays, time_column, unique=False):
+    """
+    concatenates light curve tables, sorted by time; if unique, only the first of the bins with the same time is kept
+    """
+    data = numpy.concatenate(arrays)
+    data = data[numpy.argsort(data[time_column], kind='stable')]
+
+    if unique:
+        _, first = numpy.unique(data[time_column], return_index=True)
+        data = data[first]
+
+    return data
+
+
+def concatenate(products, unit_ID=None, unique=False):
+    """
+    concatenates light curves, e.g. one per science window, into one sorted by time
+    """
+    products = list(products)
+    time, rate, rate_err, time_bin, unit_ID = lc_columns(products[0], unit_ID)
+
+    data = concatenate_data([p.data_unit[unit_ID].data for p in products], time, unique=unique)
+
+    return _new_product(products[0], unit_ID, data)
+
+
+def _combine(data, index, n_bins, time, rate, rate_err, weighted):
+    """
+    combines the bins of data with the same index: rates are averaged, with inverse variance weights if weighted,
+    errors propagated; times and other numeric columns are averaged, as floats, and other columns are those of
+    the first bin
+    """
+    n = numpy.bincount(index, minlength=n_bins)
+    filled = n > 0
+
+    err = data[rate_err].astype(numpy.float64)
+
+    if weighted:
+        if not (err > 0).all():
+            raise RuntimeError(f"light curve bins can not be weighted by inverse variance, {numpy.sum(~(err > 0))} "
+                               f"of them have no positive {rate_err}; stack them with weighted=False")
+        w = 1. / err ** 2
+    else:
+        w = numpy.ones(len(data))
+
+    w_sum = numpy.bincount(index, weights=w, minlength=n_bins)
+
+    numeric = [name for name in data.dtype.names if numpy.issubdtype(data.dtype[name], numpy.number)]
+
+    # averages of integer columns are not truncated
+    out = numpy.zeros(n_bins, dtype=[(name, numpy.float64 if numpy.issubdtype(data.dtype[name], numpy.integer) else data.dtype[name])
+                                     for name in data.dtype.names])
+
+    for name in numeric:
+        if name == rate_err:
+            if weighted:
+                out[name] = 1. / numpy.sqrt(w_sum)
+            else:
+                out[name] = numpy.sqrt(numpy.bincount(index, weights=err ** 2, minlength=n_bins)) / numpy.maximum(n, 1)
+        elif name == rate:
+            out[name] = numpy.bincount(index, weights=w * data[name], minlength=n_bins) / numpy.where(filled, w_sum, 1)
+        else:
+            out[name] = numpy.bincount(index, weights=data[name], minlength=n_bins) / numpy.maximum(n, 1)
+
+    out = out[filled]
+
+    if len(numeric) < len(data.dtype.names):
+        _, first = numpy.unique(index, return_index=True)
+        for name in data.dtype.names:
+            if name not in numeric:
+                out[name] = data[name][first]
+
+    return out
+
+
+def rebin(product, time_bin, unit_ID=None):
+    """
+    rebins a light curve to a larger time_bin (in units of its time column), averaging rates and propagating errors;
+    new bins are aligned with the start of the first bin, and empty ones are left out
+    """
+    time, rate, rate_err, old_time_bin, unit_ID = lc_columns(product, unit_ID)
+    data = product.data_unit[unit_ID].data
+
+    if len(data) == 0:
+        return _new_product(product, unit_ID, data.copy(), time_bin=time_bin)
+
+    t = data[time]
+    t_start = t.min() - 0.5 * (old_time_bin or 0.)
+    index = numpy.floor((t - t_start) / time_bin).astype(numpy.int64)
+    n_bins = int(index.max()) + 1
+
+    out = _combine(data, index, n_bins, time, rate, rate_err, weighted=False)
+
+    # new bins are centered on their grid, not on the average of the old ones
+    out[time] = t_start + (numpy.flatnonzero(numpy.bincount(index, minlength=n_bins)) + 0.5) * time_bin
+
+    return _new_product(product, unit_ID, out, time_bin=time_bin)
+
+
+def stack(products, unit_ID=None, weighted=True, time_bin=None):
+    """
+    stacks light curves on the same time grid (e.g. of different instruments or energy ranges) into their
+    average, with inverse variance weights if weighted; bins are matched within half of time_bin, by default
+    the time bin of the first product
+    """
+    products = list(products)
+    time, rate, rate_err, first_time_bin, unit_ID = lc_columns(products[0], unit_ID)
+
+    if time_bin is None:
+        time_bin = first_time_bin
+
+    data = numpy.concatenate([p.data_unit[unit_ID].data for p in products])
+
+    t = data[time]
+    if time_bin:
+        # bins on a regular grid are indexed directly, without sorting
+        index = numpy.round((t - t.min()) / time_bin).astype(numpy.int64)
+        n_bins = int(index.max()) + 1
+    else:
+        bin_times, index = numpy.unique(t, return_inverse=True)
+        index = index.ravel()
+        n_bins = len(bin_times)
+
+    out = _combine(data, index, n_bins, time, rate, rate_err, weighted=weighted)
+
+    return _new_product(products[0], unit_ID, out)
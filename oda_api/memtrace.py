@@ -0,0 +1,158 @@
+"""
+Memory accounting of the stages of getting products, for finding where memory goes with large products.
+
+When enabled on the client (trace_memory = True), the memory allocated by the last request of a job
+(response body, JSON decode, validation), and by the decoding of its products (per product, with
+base64 strings and unpickled arrays), is traced with tracemalloc, and reported, by stage and by product,
+in the memory_report of the DataCollection, of the job, and of the client:
+
+    disp.trace_memory = True
+    data = disp.get_product(...)
+    for stage in data.memory_report['stages']:
+        print(stage['stage'], stage['allocated_bytes'], stage['peak_bytes'])
+
+For each stage, allocated_bytes is the memory it allocated and kept, and peak_bytes the highest
+memory it used at once, both relative to the memory in use when it started. Tracing is process-wide,
+and slows the client down: figures of jobs running at the same time in other threads mix.
+"""
+
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+__all__ = ['MemoryTrace', 'stage', 'current_trace']
+
+_local = threading.local()
+
+# tracemalloc is started by the first active trace, and stopped by the last one, unless it was already started
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+_no_stage = nullcontext()
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_started
+
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_started
+
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def current_trace():
+    """
+    trace active in this thread, or None
+    """
+    return getattr(_local, 'trace', None)
+
+
+def stage(name, **info):
+    """
+    context recording a stage in the trace active in this thread, if any; yields the record of the stage, or None
+    """
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        return _no_stage
+
+    return trace.stage(name, **info)
+
+
+class MemoryTrace(object):
+    """
+    records of memory allocated by stages, which may be nested, run while the trace is active
+    """
+
+    def __init__(self):
+        self.records = []
+        self._stack = []
+        self._n_started = 0
+
+    @contextmanager
+    def activate(self):
+        """
+        traces stages run in this thread, in this context
+        """
+        _start_tracing()
+        previous = getattr(_local, 'trace', None)
+        _local.trace = self
+        try:
+            yield self
+        finally:
+            _local.trace = previous
+            _stop_tracing()
+
+    @contextmanager
+    def stage(self, name, **info):
+        current, peak = tracemalloc.get_traced_memory()
+
+        if self._stack:
+            # peak is reset for this stage, the one of the enclosing stage so far is kept
+            parent = self._stack[-1]
+            parent['_peak'] = max(parent['_peak'], peak)
+
+        tracemalloc.reset_peak()
+
+        record = dict(stage='/'.join([r['name'] for r in self._stack] + [name]), name=name, **info)
+        record['_start'] = current
+        record['_peak'] = current
+        record['_order'] = self._n_started
+        self._n_started += 1
+        self._stack.append(record)
+
+        t0 = time.perf_counter()
+        try:
+            yield record
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, record.pop('_peak'))
+            start = record.pop('_start')
+
+            record['allocated_bytes'] = current - start
+            record['peak_bytes'] = peak - start
+            record['duration_s'] = time.perf_counter() - t0
+
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]['_peak'] = max(self._stack[-1]['_peak'], peak)
+
+            self.records.append(record)
+
+    def report(self):
+        """
+        stages, in the order they started, with the figures of stages run several times (e.g. for each data unit)
+        added, and peaks the highest; and products, one record for each
+        """
+        stages = {}
+        for record in sorted(self.records, key=lambda r: r['_order']):
+            s = stages.get(record['stage'])
+            if s is None:
+                s = stages[record['stage']] = dict(stage=record['stage'], count=0, allocated_bytes=0, peak_bytes=0, duration_s=0.)
+
+            s['count'] += 1
+            s['allocated_bytes'] += record['allocated_bytes']
+            s['peak_bytes'] = max(s['peak_bytes'], record['peak_bytes'])
+            s['duration_s'] += record['duration_s']
+
+        top = [r for r in self.records if '/' not in r['stage']]
+
+        return dict(
+            stages=list(stages.values()),
+            products=[{k: v for k, v in r.items() if k not in ('name', 'stage', '_order')}
+                      for r in sorted(self.records, key=lambda r: r['_order']) if r['name'] == 'product'],
+            allocated_bytes=sum(r['allocated_bytes'] for r in top),
+            peak_bytes=max([r['peak_bytes'] for r in top], default=0),
+        )
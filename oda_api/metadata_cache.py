@@ -0,0 +1,139 @@
+"""
+Cache of dispatcher metadata responses (instrument list, instrument and product descriptions), revalidated
+with conditional requests.
+
+The ETag and Last-Modified validators of each response are stored with its body and decoded content.
+The next request for the same metadata sends them back (If-None-Match, If-Modified-Since), and, if the
+dispatcher answers 304 Not Modified, the cached content is returned without downloading or decoding it again.
+Responses without validators are not cached, and are requested in full every time.
+
+Every client has a cache in memory; with a directory, entries are also kept there, for the next processes:
+
+    disp = DispatcherAPI(url=..., metadata_cache=True)  # in ODA_API_METADATA_CACHE, or ~/.oda-api/metadata
+"""
+
+import copy
+import logging
+import os
+import pickle
+import threading
+
+from .singleflight import request_key
+
+__all__ = ['MetadataCache', 'default_metadata_cache_path']
+
+logger = logging.getLogger(__name__)
+
+
+def default_metadata_cache_path():
+    return os.environ.get('ODA_API_METADATA_CACHE', os.path.join(os.path.expanduser('~'), '.oda-api', 'metadata'))
+
+
+class MetadataCache(object):
+    """
+    validators, bodies and decoded content of metadata responses, by request key; in memory, and in path if given
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = {}
+
+        # responses not modified, and fetched in full, since the cache was created
+        self.n_not_modified = 0
+        self.n_modified = 0
+
+    def __repr__(self):
+        return '<%s %s: %d entries>' % (self.__class__.__name__, self.path, len(self._entries))
+
+    @staticmethod
+    def key(url, endpoint, params, cookies=None):
+        return request_key('%s/%s' % (url, endpoint), params, cookies)
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def get(self, key):
+        """
+        entry for key, with etag, last_modified, body and content; or None
+        """
+        entry = self._entries.get(key)
+        if entry is not None or self.path is None:
+            return entry
+
+        try:
+            with open(self._filename(key), 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("unable to read cached metadata %s, ignoring it: %s", self._filename(key), e)
+            return None
+
+        with self._lock:
+            self._entries[key] = entry
+
+        return entry
+
+    def conditional_headers(self, entry):
+        headers = {}
+
+        if entry is not None:
+            if entry['etag'] is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified'] is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def put(self, key, response, content):
+        """
+        stores content decoded from response, if the response has validators; otherwise removes any entry for key
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        with self._lock:
+            self.n_modified += 1
+
+            if etag is None and last_modified is None:
+                self._entries.pop(key, None)
+                entry = None
+            else:
+                # a copy, since the caller keeps, and may modify, content
+                entry = self._entries[key] = dict(etag=etag, last_modified=last_modified, body=response.content,
+                                                  content=copy.deepcopy(content))
+
+        if self.path is not None:
+            if entry is None:
+                try:
+                    os.remove(self._filename(key))
+                except FileNotFoundError:
+                    pass
+            else:
+                tmp_filename = '%s.%d.%d.tmp' % (self._filename(key), os.getpid(), threading.get_ident())
+                with open(tmp_filename, 'wb') as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_filename, self._filename(key))
+
+    def not_modified(self, entry):
+        """
+        content of entry, confirmed by a 304 response; a copy, since callers may modify what they get
+        """
+        with self._lock:
+            self.n_not_modified += 1
+
+        return copy.deepcopy(entry['content'])
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+        if self.path is not None:
+            for filename in os.listdir(self.path):
+                if filename.endswith('.pickle'):
+                    os.remove(os.path.join(self.path, filename))
@@ -0,0 +1,268 @@
+"""
+Client-side timing metrics for dispatcher requests.
+
+Every HTTP request made by DispatcherAPI is split into spans (wait for the rate limit, connect, server wait,
+body transfer, JSON decode, schema validation, product decode); span durations are
+collected in per-endpoint histograms of a MetricsRegistry, together with a histogram of the number of polls per job.
+"""
+
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+__all__ = ['MetricsRegistry', 'RequestSpans', 'Histogram', 'TimedHTTPAdapter']
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+POLL_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+SPAN_NAMES = ('queue_wait', 'connect', 'server_wait', 'transfer', 'json_decode', 'validation', 'product_decode')
+
+
+_connect_time = threading.local()
+
+
+def reset_connect_time():
+    _connect_time.value = 0.
+
+
+def pop_connect_time():
+    value = getattr(_connect_time, 'value', 0.)
+    _connect_time.value = 0.
+    return value
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _connect_time.value = getattr(_connect_time, 'value', 0.) + time.perf_counter() - t0
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        t0 = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _connect_time.value = getattr(_connect_time, 'value', 0.) + time.perf_counter() - t0
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    requests adapter recording the time spent establishing connections (including TLS handshake)
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        cumulative = []
+        n = 0
+        for le, c in zip(self.buckets + (float('inf'),), self.bucket_counts):
+            n += c
+            cumulative.append((le, n))
+
+        return dict(
+            count=self.count,
+            sum=self.sum,
+            min=self.min,
+            max=self.max,
+            mean=self.sum / self.count if self.count > 0 else None,
+            buckets=cumulative,
+        )
+
+
+class RequestSpans(object):
+    """
+    durations of the stages of one request, also observed in the registry as they are added
+    """
+
+    def __init__(self, endpoint, registry=None):
+        self.endpoint = endpoint
+        self.registry = registry
+        self.spans = {}
+
+    @contextmanager
+    def span(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name, duration):
+        self.spans[name] = self.spans.get(name, 0.) + duration
+
+        if self.registry is not None:
+            self.registry.observe(self.endpoint, name, duration)
+
+    @property
+    def total(self):
+        return sum(self.spans.values())
+
+    def __repr__(self):
+        return '<RequestSpans %s: %s>' % (self.endpoint, ", ".join('%s=%.4fs' % (k, v) for k, v in self.spans.items()))
+
+
+class MetricsRegistry(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_jobs_polling=1000):
+        self.buckets = buckets
+        self.max_jobs_polling = max_jobs_polling
+
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._request_counts = {}
+        # polls of jobs not yet complete; jobs abandoned before completion are forgotten beyond max_jobs_polling
+        self._poll_counts = OrderedDict()
+        self._polls_per_job = Histogram(POLL_BUCKETS)
+        self._n_polls = 0
+
+    def new_request(self, endpoint):
+        with self._lock:
+            self._request_counts[endpoint] = self._request_counts.get(endpoint, 0) + 1
+
+        return RequestSpans(endpoint, registry=self)
+
+    def observe(self, endpoint, span, duration):
+        with self._lock:
+            key = (endpoint, span)
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(duration)
+
+    def count_poll(self, job_id, complete=False):
+        """
+        counts a poll of a job; once the job is complete, its number of polls is observed in the polls per job histogram
+        """
+        with self._lock:
+            self._n_polls += 1
+
+            n = self._poll_counts.pop(job_id, 0) + 1
+
+            if complete:
+                self._polls_per_job.observe(n)
+            else:
+                self._poll_counts[job_id] = n
+                while len(self._poll_counts) > self.max_jobs_polling:
+                    self._poll_counts.popitem(last=False)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._request_counts.clear()
+            self._poll_counts.clear()
+            self._polls_per_job = Histogram(POLL_BUCKETS)
+            self._n_polls = 0
+
+    def snapshot(self):
+        """
+        returns a plain dict copy of the collected metrics:
+        requests per endpoint, span histograms per endpoint, polls in total, poll counts of the jobs not yet complete,
+        and the histogram of polls per complete job
+        """
+        with self._lock:
+            spans = {}
+            for (endpoint, span), histogram in sorted(self._histograms.items()):
+                spans.setdefault(endpoint, {})[span] = histogram.snapshot()
+
+            return dict(
+                requests=dict(self._request_counts),
+                spans=spans,
+                n_polls=self._n_polls,
+                polls=dict(self._poll_counts),
+                polls_per_job=self._polls_per_job.snapshot(),
+            )
+
+    def to_prometheus(self, prefix='oda_api'):
+        """
+        renders the metrics in Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+
+        lines = []
+
+        lines.append('# HELP %s_requests_total HTTP requests sent to the dispatcher' % prefix)
+        lines.append('# TYPE %s_requests_total counter' % prefix)
+        for endpoint, n in sorted(snapshot['requests'].items()):
+            lines.append('%s_requests_total{endpoint="%s"} %d' % (prefix, _escape(endpoint), n))
+
+        lines.append('# HELP %s_request_span_seconds time spent in each stage of a request' % prefix)
+        lines.append('# TYPE %s_request_span_seconds histogram' % prefix)
+        for endpoint, spans in snapshot['spans'].items():
+            for span, h in spans.items():
+                labels = 'endpoint="%s",span="%s"' % (_escape(endpoint), span)
+                for le, n in h['buckets']:
+                    lines.append('%s_request_span_seconds_bucket{%s,le="%s"} %d' % (prefix, labels, _format_le(le), n))
+                lines.append('%s_request_span_seconds_sum{%s} %.9g' % (prefix, labels, h['sum']))
+                lines.append('%s_request_span_seconds_count{%s} %d' % (prefix, labels, h['count']))
+
+        lines.append('# HELP %s_polls_total polls sent for all jobs' % prefix)
+        lines.append('# TYPE %s_polls_total counter' % prefix)
+        lines.append('%s_polls_total %d' % (prefix, snapshot['n_polls']))
+
+        lines.append('# HELP %s_jobs_polling jobs polled and not yet complete' % prefix)
+        lines.append('# TYPE %s_jobs_polling gauge' % prefix)
+        lines.append('%s_jobs_polling %d' % (prefix, len(snapshot['polls'])))
+
+        h = snapshot['polls_per_job']
+        lines.append('# HELP %s_job_polls number of polls sent for each complete job' % prefix)
+        lines.append('# TYPE %s_job_polls histogram' % prefix)
+        for le, n in h['buckets']:
+            lines.append('%s_job_polls_bucket{le="%s"} %d' % (prefix, _format_le(le), n))
+        lines.append('%s_job_polls_sum %.9g' % (prefix, h['sum']))
+        lines.append('%s_job_polls_count %d' % (prefix, h['count']))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(label_value):
+    return label_value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_le(le):
+    if le == float('inf'):
+        return '+Inf'
+    return repr(float(le))
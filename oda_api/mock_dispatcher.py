@@ -0,0 +1,664 @@
+"""
+Local stand-in for the cdci_data_analysis dispatcher.
+
+Runs a small HTTP server on the loopback interface which answers the
+``run_analysis``, ``api/par-names``, ``api/meta-data`` and ``api/instr-list``
+handles the way the real dispatcher does, so that the client can be exercised,
+and benchmarked, without access to a live platform.
+
+Job durations, failures and product sizes are configurable, and deterministic
+when durations are given in polls. It can also be started from the command line:
+
+    python -m oda_api.mock_dispatcher --port 8000
+    python -m oda_api.mock_dispatcher --load 200 --concurrency 20
+"""
+
+import argparse
+import email.utils
+import gzip
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode, urlparse, parse_qs
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['MockDispatcher', 'run_load']
+
+
+DEFAULT_PAR_NAMES = ['E1_keV', 'E2_keV', 'osa_version', 'scw_list', 'RA', 'DEC', 'T1', 'T2', 'T_format',
+                     'radius', 'src_name', 'detection_threshold', 'image_scale_min', 'image_scale_max']
+
+DEFAULT_INSTRUMENTS = ['isgri', 'jemx', 'polar', 'spi_acs']
+
+# parameters by which requests are routed to instruments, by dispatchers requiring them in every request
+_routing_parameters = ['instrument', 'product_type', 'query_type']
+
+# parameters set by the client itself, not identifying the query
+_client_parameters = ['session_id', 'job_id', 'query_status', 'api', 'oda_api_version', 'full_report_last_index', 'long_poll_s', 'callback_url']
+
+
+class MockJob(object):
+    def __init__(self, job_id, parameters, n_polls=None, duration_s=None, fail=False):
+        self.job_id = job_id
+        self.parameters = parameters
+        self.n_polls_left = n_polls
+        self.duration_s = duration_s
+        self.fail = fail
+        self.t0 = time.time()
+        self.query_status = 'submitted'
+        self.full_report_dict_list = []
+
+    @property
+    def is_complete(self):
+        return self.query_status in ['done', 'failed']
+
+    def advance(self, n_report_entries):
+        if self.is_complete:
+            return
+
+        for _ in range(n_report_entries):
+            self.full_report_dict_list.append(dict(
+                node='node_%d' % (len(self.full_report_dict_list) % 7),
+                message='progress',
+                scwid='%012d.001' % len(self.full_report_dict_list),
+            ))
+
+        if self.duration_s is not None:
+            finished = time.time() - self.t0 >= self.duration_s
+        else:
+            self.n_polls_left -= 1
+            finished = self.n_polls_left <= 0
+
+        if finished:
+            self.query_status = 'failed' if self.fail else 'done'
+        else:
+            self.query_status = 'progress'
+
+
+class MockDispatcherHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+
+        self.server.dispatcher.count_received(len(self.requestline))
+        self.handle_request(parsed.path.strip('/'), params)
+
+    def do_POST(self):
+        """
+        jobs submitted with form-encoded, and possibly gzip-compressed, parameters, if enabled
+        """
+        parsed = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        dispatcher = self.server.dispatcher
+        dispatcher.count_received(len(self.requestline) + len(body))
+
+        if not dispatcher.post_submission:
+            self.send_text('method not allowed', status=405)
+            return
+
+        if self.headers.get('Content-Encoding') == 'gzip':
+            if not dispatcher.gzip_submission:
+                self.send_text('unsupported content encoding', status=415)
+                return
+            body = gzip.decompress(body)
+
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        params.update({k: v[-1] for k, v in parse_qs(body.decode()).items()})
+
+        self.handle_request(parsed.path.strip('/'), params)
+
+    def handle_request(self, handle, params):
+        dispatcher = self.server.dispatcher
+
+        if dispatcher.inject_http_error():
+            self.send_text('internal server error (injected)', status=500)
+        elif handle == 'run_analysis' and dispatcher.routing_parameters and not all(p in params for p in _routing_parameters):
+            self.send_text('missing %s' % ', '.join(p for p in _routing_parameters if p not in params), status=400)
+        elif handle == 'run_analysis':
+            headers = {}
+            if dispatcher.accepts_callback(params):
+                headers['ODA-Callback'] = 'accepted'
+
+            if dispatcher.long_poll and 'long_poll_s' in params:
+                dispatcher.hold_long_poll(params.get('job_id'), float(params['long_poll_s']))
+                headers['ODA-Long-Poll'] = params['long_poll_s']
+
+            self.send_json(dispatcher.run_analysis(params), headers=headers)
+        elif handle == 'api/par-names':
+            self.send_metadata(dispatcher.get_par_names(params))
+        elif handle == 'api/meta-data':
+            self.send_metadata(dispatcher.get_meta_data(params))
+        elif handle == 'api/instr-list':
+            self.send_metadata(dispatcher.get_instrument_list(params))
+        else:
+            self.send_text('unknown handle %s' % handle, status=404)
+
+    def send_json(self, obj, status=200, headers=None):
+        self.send_body(json.dumps(obj).encode(), 'application/json', status, headers)
+
+    def send_metadata(self, obj):
+        """
+        sends obj as JSON, with validators if enabled, or 304 if the client has it already
+        """
+        dispatcher = self.server.dispatcher
+
+        body = json.dumps(obj).encode()
+        if not dispatcher.metadata_validators:
+            self.send_body(body, 'application/json', 200)
+            return
+
+        etag, last_modified = dispatcher.metadata_validators_for(body)
+
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+
+        if if_none_match is not None:
+            not_modified = etag in [v.strip() for v in if_none_match.split(',')]
+        elif if_modified_since is not None:
+            not_modified = email.utils.parsedate_to_datetime(if_modified_since).timestamp() >= int(last_modified)
+        else:
+            not_modified = False
+
+        headers = {'ETag': etag, 'Last-Modified': email.utils.formatdate(last_modified, usegmt=True)}
+
+        if not_modified:
+            dispatcher.count_not_modified()
+            self.send_body(b'', None, 304, headers)
+        else:
+            self.send_body(body, 'application/json', 200, headers)
+
+    def send_text(self, text, status=200):
+        self.send_body(text.encode(), 'text/plain', status)
+
+    def send_body(self, body, content_type, status, headers=None):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.server.dispatcher.count_sent(body)
+
+
+_n_channels = 16
+
+
+def _scw_seed(scw):
+    return int(scw.split('.')[0]) % 2**32
+
+
+def _scw_light_curve(scw):
+    """
+    ten 10-second bins, starting at a time given by the science window number
+    """
+    data = numpy.zeros(10, dtype=[('TIME', '<f8'), ('RATE', '<f4'), ('ERROR', '<f4')])
+    data['TIME'] = int(scw[:8]) * 1000. + numpy.arange(10) * 10.
+    data['RATE'] = numpy.random.RandomState(_scw_seed(scw)).normal(10., 1., 10)
+    data['ERROR'] = 1.
+    return data
+
+
+def _scw_spectrum(scw):
+    """
+    spectrum of a science window, and its exposure
+    """
+    data = numpy.zeros(_n_channels, dtype=[('CHANNEL', '<i4'), ('RATE', '<f8'), ('STAT_ERR', '<f8')])
+    data['CHANNEL'] = numpy.arange(_n_channels)
+    data['RATE'] = numpy.random.RandomState(_scw_seed(scw)).normal(1., 0.1, _n_channels)
+    data['STAT_ERR'] = 0.1
+    return data, 1000. + _scw_seed(scw) % 7 * 100.
+
+
+def _encode(product):
+    encoded = product.encode(use_pickle=True)
+
+    # as it is sent in JSON
+    for encoded_unit in encoded['data_unit_list']:
+        encoded_unit['binarys'] = encoded_unit['binarys'].decode()
+
+    return encoded
+
+
+class MockDispatcher(object):
+    """
+    Stand-in dispatcher serving queries from memory
+
+    Every poll of a running job appends ``n_report_entries`` progress messages to the
+    job monitor report. The job completes after ``job_n_polls`` polls or, if
+    ``job_duration_s`` is set, after that many seconds since submission.
+
+    A fraction ``failure_rate`` of the jobs fails; whether a job fails is drawn from a generator
+    seeded with ``seed`` and the query parameters, so the same queries always fail.
+    A fraction ``http_error_rate`` of all requests is answered with HTTP 500.
+
+    Completed jobs return ``n_products`` image products of ``product_shape`` float32 pixels.
+
+    With ``delta_report`` enabled, polls carrying ``full_report_last_index`` receive
+    only the report entries past that index, as a dispatcher supporting delta polling would;
+    otherwise the full report is sent every time. ``bytes_sent`` counts response bodies.
+
+    With ``metadata_validators`` enabled, metadata responses carry ETag and Last-Modified
+    validators, and conditional requests for unchanged metadata are answered with 304 Not Modified,
+    counted in ``n_not_modified``.
+
+    With ``post_submission`` enabled, jobs can also be submitted with their parameters in a POST
+    body, possibly gzip-compressed, and polled with their job id only; otherwise POST is answered
+    with 405. Without ``gzip_submission``, compressed bodies are answered with 415. With
+    ``routing_parameters``, requests for jobs without instrument, product_type and query_type are
+    answered with 400. ``bytes_received`` counts request lines and bodies.
+
+    With ``long_poll`` enabled, polls carrying ``long_poll_s`` are held until the job completes, for
+    at most that many seconds, and answered with an ``ODA-Long-Poll`` header; jobs completing after
+    a number of polls, rather than ``job_duration_s``, are answered at once.
+
+    Jobs submitted with a ``callback_url``, and completing after ``job_duration_s``, are called back
+    at that URL when they complete, with their job id, session id and status, if ``callbacks`` is
+    enabled; the submission is then answered with an ``ODA-Callback`` header. Callbacks sent are
+    counted in ``n_callbacks``; with ``lose_callbacks``, they are acknowledged but never sent.
+    """
+
+    def __init__(self,
+                 host='127.0.0.1',
+                 port=0,
+                 job_n_polls=3,
+                 job_duration_s=None,
+                 n_report_entries=10,
+                 delta_report=True,
+                 failure_rate=0.,
+                 transient_failures=False,
+                 http_error_rate=0.,
+                 n_products=1,
+                 product_shape=(64, 64),
+                 par_names=None,
+                 instruments=None,
+                 metadata_validators=True,
+                 post_submission=True,
+                 gzip_submission=True,
+                 routing_parameters=False,
+                 long_poll=True,
+                 callbacks=True,
+                 lose_callbacks=False,
+                 seed=0):
+        self.job_n_polls = job_n_polls
+        self.job_duration_s = job_duration_s
+        self.n_report_entries = n_report_entries
+        self.delta_report = delta_report
+        self.failure_rate = failure_rate
+        # if set, a failing query fails only when it is first submitted, and succeeds when submitted again
+        self.transient_failures = transient_failures
+        self.http_error_rate = http_error_rate
+        self.n_products = n_products
+        self.product_shape = tuple(product_shape)
+        self.par_names = DEFAULT_PAR_NAMES if par_names is None else par_names
+        self.instruments = DEFAULT_INSTRUMENTS if instruments is None else instruments
+        self.metadata_validators = metadata_validators
+        self.post_submission = post_submission
+        self.gzip_submission = gzip_submission
+        self.routing_parameters = routing_parameters
+        self.long_poll = long_poll
+        self.callbacks = callbacks
+        self.lose_callbacks = lose_callbacks
+        self.seed = seed
+
+        self.jobs = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.n_requests = 0
+        self.n_not_modified = 0
+        self.n_callbacks = 0
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._http_error_random = random.Random(seed)
+        self._encoded_products = None
+        self._failed_queries = set()
+        # time each version of metadata was first sent, by its ETag
+        self._metadata_modified = {}
+
+        self.httpd = ThreadingHTTPServer((host, port), MockDispatcherHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.dispatcher = self
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, kwargs=dict(poll_interval=0.05), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_sent(self, body):
+        with self._lock:
+            self.bytes_sent += len(body)
+            self.n_requests += 1
+
+    def hold_long_poll(self, job_id, timeout_s):
+        """
+        waits until the job is due to complete, for at most timeout_s
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+
+        if job is None or job.is_complete or job.duration_s is None:
+            return
+
+        time.sleep(max(0., min(job.t0 + job.duration_s - time.time(), timeout_s)))
+
+    def accepts_callback(self, params):
+        """
+        if the job submitted with params is called back when it completes
+        """
+        return self.callbacks and 'callback_url' in params and self.job_duration_s is not None
+
+    def call_back(self, job):
+        """
+        tells the callback URL of the job that it is complete
+        """
+        if self.lose_callbacks:
+            return
+
+        query = dict(job_id=job.job_id, session_id=job.parameters.get('session_id', ''), status='failed' if job.fail else 'done')
+        url = job.parameters['callback_url'] + '?' + urlencode(query)
+
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                response.read()
+        except Exception as e:
+            logger.warning("unable to call back job %s at %s: %s", job.job_id, url, e)
+            return
+
+        with self._lock:
+            self.n_callbacks += 1
+
+    def count_received(self, n_bytes):
+        with self._lock:
+            self.bytes_received += n_bytes
+
+    def count_not_modified(self):
+        with self._lock:
+            self.n_not_modified += 1
+
+    def metadata_validators_for(self, body):
+        """
+        ETag and modification time of a metadata response body
+        """
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+
+        with self._lock:
+            last_modified = self._metadata_modified.setdefault(etag, time.time())
+
+        return etag, last_modified
+
+    def inject_http_error(self):
+        if self.http_error_rate <= 0:
+            return False
+
+        with self._lock:
+            return self._http_error_random.random() < self.http_error_rate
+
+    def is_failing(self, params):
+        if self.failure_rate <= 0:
+            return False
+
+        key = json.dumps({k: v for k, v in params.items() if k not in _client_parameters}, sort_keys=True)
+
+        if self.transient_failures:
+            if key in self._failed_queries:
+                return False
+            self._failed_queries.add(key)
+
+        return random.Random('%s:%s' % (self.seed, key)).random() < self.failure_rate
+
+    @property
+    def encoded_products(self):
+        """
+        products as encoded in the dispatcher response, built once for all jobs
+        """
+        if self._encoded_products is None:
+            from .data_products import NumpyDataProduct, NumpyDataUnit
+
+            rng = numpy.random.RandomState(self.seed)
+
+            products = []
+            for i in range(self.n_products):
+                data = rng.normal(size=self.product_shape).astype(numpy.float32)
+                unit = NumpyDataUnit(data, data_header=dict(EXTNAME='IMAGE', PRODID=i), hdu_type='image', name='image')
+                products.append(_encode(NumpyDataProduct(unit, name='mock_image', meta_data=dict(product='mosaic', src_name='', id=i))))
+
+            self._encoded_products = products
+
+        return self._encoded_products
+
+    def products_for(self, params):
+        """
+        encoded products for a query: light curves and spectra are computed for its scw_list, other products are images
+        """
+        from .data_products import NumpyDataProduct, NumpyDataUnit
+
+        product_type = params.get('product_type', '')
+        scws = [scw.strip() for scw in params.get('scw_list', '').split(',') if scw.strip() != '']
+
+        if len(scws) > 0 and product_type.endswith('_lc'):
+            data = numpy.concatenate([_scw_light_curve(scw) for scw in scws])
+            data = data[numpy.argsort(data['TIME'], kind='stable')]
+
+            unit = NumpyDataUnit(data, data_header=dict(EXTNAME='RATE'), hdu_type='bintable', name='RATE',
+                                 units_dict=dict(TIME='d', RATE='count/s', ERROR='count/s'))
+            return [_encode(NumpyDataProduct(unit, name='mock_lc', meta_data=dict(product='light_curve', src_name='mock_source')))]
+
+        if len(scws) > 0 and product_type.endswith('_spectrum'):
+            spectra = [_scw_spectrum(scw) for scw in scws]
+            exposures = numpy.array([exposure for _, exposure in spectra])
+
+            data = spectra[0][0].copy()
+            data['RATE'] = sum(s['RATE'] * e for s, e in spectra) / exposures.sum()
+            data['STAT_ERR'] = numpy.sqrt(sum((s['STAT_ERR'] * e) ** 2 for s, e in spectra)) / exposures.sum()
+
+            unit = NumpyDataUnit(data, data_header=dict(EXTNAME='SPECTRUM', EXPOSURE=exposures.sum()), hdu_type='bintable', name='SPECTRUM')
+            arf = numpy.zeros(_n_channels, dtype=[('ENERG_LO', '<f4'), ('SPECRESP', '<f4')])
+            arf['ENERG_LO'] = numpy.arange(_n_channels) * 10.
+            arf['SPECRESP'] = 100.
+            arf_unit = NumpyDataUnit(arf, data_header=dict(EXTNAME='SPECRESP'), hdu_type='bintable', name='SPECRESP')
+
+            return [_encode(NumpyDataProduct([unit, arf_unit], name='mock_spectrum', meta_data=dict(product='spectrum', src_name='mock_source')))]
+
+        return self.encoded_products
+
+    def run_analysis(self, params):
+        with self._lock:
+            job_id = params.get('job_id')
+
+            if job_id is None or job_id not in self.jobs:
+                job_id = uuid.uuid4().hex
+                self.jobs[job_id] = MockJob(job_id,
+                                            params,
+                                            n_polls=self.job_n_polls,
+                                            duration_s=self.job_duration_s,
+                                            fail=self.is_failing(params))
+
+                if self.accepts_callback(params):
+                    timer = threading.Timer(self.job_duration_s, self.call_back, args=(self.jobs[job_id],))
+                    timer.daemon = True
+                    timer.start()
+
+            job = self.jobs[job_id]
+            job.advance(self.n_report_entries)
+
+            job_monitor = dict(job_id=job.job_id, status=job.query_status)
+
+            last_index = params.get('full_report_last_index')
+            if self.delta_report and last_index is not None:
+                first_index = min(int(last_index), len(job.full_report_dict_list))
+                job_monitor['full_report_dict_list'] = job.full_report_dict_list[first_index:]
+                job_monitor['full_report_first_index'] = first_index
+            else:
+                job_monitor['full_report_dict_list'] = list(job.full_report_dict_list)
+
+            query_status = job.query_status
+
+        if query_status == 'failed':
+            exit_status = dict(status=1,
+                               message='failed: get dataserver products',
+                               error_message='mock failure (injected)',
+                               debug_message='')
+        else:
+            exit_status = dict(status=0, message='', error_message='', debug_message='')
+
+        products = {}
+        if query_status == 'done':
+            # as submitted: polls may carry only the job id
+            products['numpy_data_product_list'] = self.products_for(job.parameters)
+
+        return dict(
+            exit_status=exit_status,
+            query_status=query_status,
+            job_monitor=job_monitor,
+            products=products,
+        )
+
+    def get_par_names(self, params):
+        return list(self.par_names)
+
+    def get_meta_data(self, params):
+        instrument = params.get('instrument', 'mock')
+        product_type = params.get('product_type')
+
+        parameters = [dict(name=name, units=None, value=None) for name in self.par_names]
+
+        if product_type is None:
+            description = [dict(instrument=instrument), dict(prod_dict={'%s_image' % instrument: '%s_image_query' % instrument})]
+            description.append([dict(query_name='src_query')] + parameters)
+        else:
+            description = [dict(instrument=instrument)]
+            description.append([dict(query_name='%s_query' % product_type), dict(product_name=product_type)] + parameters)
+
+        return [description]
+
+    def get_instrument_list(self, params):
+        return list(self.instruments)
+
+
+def run_load(url, n_jobs=100, concurrency=10, instrument='isgri', product='isgri_image', poll_interval_s=0., **parameters):
+    """
+    submits n_jobs distinct queries from concurrency threads, all through one DispatcherAPI,
+    and waits for all of them; returns a report with per-job wall times and the overall throughput
+    """
+    from .api import DispatcherAPI
+
+    disp = DispatcherAPI(url=url, instrument=instrument)
+    disp.poll_interval_s = poll_interval_s
+
+    def run_job(i):
+        t0 = time.perf_counter()
+        job = None
+        try:
+            job = disp.new_product_job(instrument=instrument, product=product, T1=i, **parameters)
+            job.result(silent=True)
+            status = job.query_status
+        except (Exception, SystemExit) as e:
+            # failed jobs raise RemoteException, which exits
+            if job is not None and job.is_failed:
+                status = job.query_status
+            else:
+                status = 'error: %s' % repr(e)[:200]
+
+        n_polls = job.n_poll if job is not None else 0
+
+        return dict(job=i, status=status, wall_time=time.perf_counter() - t0, n_polls=n_polls)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        jobs = list(executor.map(run_job, range(n_jobs)))
+    wall_time = time.perf_counter() - t0
+
+    wall_times = sorted(j['wall_time'] for j in jobs)
+
+    return dict(
+        n_jobs=n_jobs,
+        concurrency=concurrency,
+        wall_time=wall_time,
+        jobs_per_second=n_jobs / wall_time,
+        job_wall_time_median=wall_times[len(wall_times) // 2],
+        job_wall_time_max=wall_times[-1],
+        status_counts={s: sum(1 for j in jobs if j['status'] == s) for s in set(j['status'] for j in jobs)},
+        jobs=jobs,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--job-n-polls', type=int, default=3)
+    parser.add_argument('--job-duration-s', type=float, default=None)
+    parser.add_argument('--failure-rate', type=float, default=0.)
+    parser.add_argument('--http-error-rate', type=float, default=0.)
+    parser.add_argument('--n-products', type=int, default=1)
+    parser.add_argument('--product-shape', type=int, nargs='+', default=[64, 64])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--load', type=int, default=None, metavar='N_JOBS',
+                        help='instead of serving, run N_JOBS concurrent jobs against the stand-in dispatcher and print a report')
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    dispatcher = MockDispatcher(host=args.host,
+                                port=args.port,
+                                job_n_polls=args.job_n_polls,
+                                job_duration_s=args.job_duration_s,
+                                failure_rate=args.failure_rate,
+                                http_error_rate=args.http_error_rate,
+                                n_products=args.n_products,
+                                product_shape=args.product_shape,
+                                seed=args.seed)
+
+    if args.load is not None:
+        with dispatcher:
+            report = run_load(dispatcher.url, n_jobs=args.load, concurrency=args.concurrency)
+        report.pop('jobs')
+        print(json.dumps(report, indent=4))
+    else:
+        print('serving stand-in dispatcher at %s' % dispatcher.url)
+        try:
+            dispatcher.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            dispatcher.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
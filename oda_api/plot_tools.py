@@ -20,12 +20,90 @@ __author__ = "Andrea Tramacere"
 
 # must
 import  numpy
-from matplotlib import  pylab as plt
-#from ipywidgets import *
-from matplotlib.widgets import Slider, Button, RadioButtons
 
+# pyplot, which selects an interactive backend, is imported only when showing a plot,
+# for headless rendering see oda_api.preview
+
+
+__all__=['OdaImage','OdaLightCurve','ImagePyramid','percentile_limits']
+
+def percentile_limits(data, percentiles=(0.5, 99.5), max_samples=1000000):
+    """
+    NaN-aware display limits, the percentiles of the finite pixels; for large images, of a regular sample of them
+    """
+    step = max(1, int(numpy.ceil(numpy.sqrt(data.size / max_samples))))
+    sample = numpy.asarray(data[::step, ::step], dtype=numpy.float64)
+    sample = sample[numpy.isfinite(sample)]
+
+    if sample.size == 0:
+        return 0., 1.
+
+    vmin, vmax = numpy.percentile(sample, percentiles)
+    if vmin == vmax:
+        vmax = vmin + 1.
+
+    return float(vmin), float(vmax)
+
+
+class ImagePyramid(object):
+    """
+    image at decreasing resolutions, each level averaging 2x2 pixels of the previous one (ignoring NaN);
+    levels are built on first use, and kept
+    """
+
+    def __init__(self, data, min_size=64):
+        self.shape = data.shape
+        self.levels = [data]
+        self.n_levels = 1
+        while max(self.shape) / 2 ** self.n_levels >= min_size:
+            self.n_levels += 1
+
+    def level(self, k):
+        k = min(max(k, 0), self.n_levels - 1)
+
+        while len(self.levels) <= k:
+            previous = numpy.asarray(self.levels[-1], dtype=numpy.float32)
+            ny, nx = previous.shape
+
+            padded = numpy.full((ny + ny % 2, nx + nx % 2), numpy.nan, dtype=numpy.float32)
+            padded[:ny, :nx] = previous
+            blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+
+            finite = numpy.isfinite(blocks)
+            n = finite.sum(axis=(1, 3))
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                self.levels.append(numpy.where(finite, blocks, 0).sum(axis=(1, 3)) / n)
+
+        return self.levels[k]
+
+    def level_for(self, view_size, n_pixels):
+        """
+        coarsest level still showing view_size image pixels with at least n_pixels screen pixels
+        """
+        k = int(numpy.floor(numpy.log2(max(view_size / max(n_pixels, 1), 1))))
+        return min(k, self.n_levels - 1)
+
+    def cutout(self, x0, x1, y0, y1, n_pixels):
+        """
+        part of the image within x0 < x < x1, y0 < y < y1 (in full resolution pixels), at the level fit for
+        showing it with n_pixels screen pixels; returns the array and its extent in full resolution pixels
+        """
+        ny, nx = self.shape
+        x0, x1 = max(int(numpy.floor(min(x0, x1) + 0.5)), 0), min(int(numpy.ceil(max(x0, x1) + 0.5)), nx)
+        y0, y1 = max(int(numpy.floor(min(y0, y1) + 0.5)), 0), min(int(numpy.ceil(max(y0, y1) + 0.5)), ny)
+
+        k = self.level_for(max(x1 - x0, y1 - y0, 1), n_pixels)
+        scale = 2 ** k
+
+        # cut on level pixel boundaries, so that the extent is exact
+        i0, i1 = y0 // scale, -(-y1 // scale)
+        j0, j1 = x0 // scale, -(-x1 // scale)
+        cut = self.level(k)[i0:i1, j0:j1]
+
+        extent = (j0 * scale - 0.5, min(j1 * scale, nx) - 0.5, min(i1 * scale, ny) - 0.5, i0 * scale - 0.5)
+
+        return cut, extent, k
 
-__all__=['OdaImage','OdaLightCurve']
 
 class OdaImage(object):
 
@@ -34,25 +112,110 @@ class OdaImage(object):
 
         self.meta = data
 
-    def show(self,data=None,meta=None,unit_ID=0):
+        self._pyramids = {}
+
+    def pyramid(self, unit_ID=0):
+        if unit_ID not in self._pyramids:
+            self._pyramids[unit_ID] = ImagePyramid(self.data.data_unit[unit_ID].data)
+        return self._pyramids[unit_ID]
+
+    def show(self,data=None,meta=None,unit_ID=0,percentiles=(0.5, 99.5)):
+        """
+        shows the image, with sliders for the color scale; the image is drawn at the resolution of the view,
+        from a pyramid of downsampled images, also when zooming and panning
+        """
         if data is None:
-            data=self.data.data_unit[unit_ID].data
+            pyramid = self.pyramid(unit_ID)
+        else:
+            pyramid = ImagePyramid(data)
         if meta is None:
             self.meta=self.data.meta_data
 
+        from matplotlib import pyplot as plt
+        from matplotlib.widgets import Slider
+
+        full = pyramid.level(0)
+
+        # computed once, on the full resolution image
+        vmin, vmax = percentile_limits(full, percentiles)
+        with numpy.errstate(invalid='ignore'):
+            dmin, dmax = float(numpy.nanmin(full)), float(numpy.nanmax(full))
+        if not numpy.isfinite(dmin) or dmin >= dmax:
+            dmin, dmax = vmin, vmax
+
+        self.pyramid_view = pyramid
+
         fig = plt.figure(figsize=(8 ,6))
         ax = fig.subplots(1,1)
-        self.line =ax.imshow(data ,interpolation='nearest')
+        self.ax = ax
+
+        ny, nx = pyramid.shape
+        cut, extent, self.level = pyramid.cutout(-0.5, nx - 0.5, -0.5, ny - 0.5, self._view_pixels())
+        self.line =ax.imshow(cut ,interpolation='nearest', extent=extent, vmin=vmin, vmax=vmax)
+        ax.set_xlim(-0.5, nx - 0.5)
+        ax.set_ylim(ny - 0.5, -0.5)
+        ax.set_autoscale_on(False)
+
         cmin = plt.axes([0.1, 0.05, 0.8, 0.02])
         cmax = plt.axes([0.1, 0.01, 0.8, 0.02])
-        self.smin = Slider(cmin, 'vmin',  data.min(), data.max(), valinit=data.min(),)
-        self.smax = Slider(cmax, 'vmax', data.min(), data.max(), valinit=data.max(),)
+        self.smin = Slider(cmin, 'vmin', dmin, dmax, valinit=vmin,)
+        self.smax = Slider(cmax, 'vmax', dmin, dmax, valinit=vmax,)
         self.smin.on_changed(self.update)
         self.smax.on_changed(self.update)
 
+        ax.callbacks.connect('xlim_changed', self._view_changed)
+        ax.callbacks.connect('ylim_changed', self._view_changed)
 
         plt.show()
 
+    def _view_pixels(self):
+        ax = getattr(self, 'ax', None)
+        if ax is None:
+            return 1024
+
+        bbox = ax.get_window_extent()
+        return max(bbox.width, bbox.height, 1)
+
+    def _view_changed(self, ax):
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+
+        cut, extent, level = self.pyramid_view.cutout(x0, x1, y0, y1, self._view_pixels())
+        if cut.size == 0:
+            # view is outside of the image
+            return
+
+        self.level = level
+        self.line.set_data(cut)
+        self.line.set_extent(extent)
+
+    def zoom(self, factor, x_center=None, y_center=None):
+        """
+        zooms the view in by factor (out, if smaller than 1), around the given pixel or the view center
+        """
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+
+        if x_center is None:
+            x_center = (x0 + x1) / 2
+        if y_center is None:
+            y_center = (y0 + y1) / 2
+
+        self.ax.set_xlim(x_center - (x_center - x0) / factor, x_center + (x1 - x_center) / factor)
+        self.ax.set_ylim(y_center - (y_center - y0) / factor, y_center + (y1 - y_center) / factor)
+        self.ax.figure.canvas.draw_idle()
+
+    def pan(self, dx, dy):
+        """
+        moves the view by dx, dy image pixels
+        """
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+
+        self.ax.set_xlim(x0 + dx, x1 + dx)
+        self.ax.set_ylim(y0 + dy, y1 + dy)
+        self.ax.figure.canvas.draw_idle()
+
     def update(self,x):
         #print('x',x)
         if self.smin.val<self.smax.val:
@@ -70,6 +233,8 @@ class OdaLightCurve(object):
 
     def show(self,data=None,meta=None,unit_ID=0):
 
+        from matplotlib import pyplot as plt
+
         if data is None:
             data=self.data.data_unit[unit_ID].data
         if meta is None:
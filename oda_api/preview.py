@@ -0,0 +1,191 @@
+"""
+Headless rendering of product previews to image files.
+
+Images and light curves are drawn with the Agg renderer directly, without pyplot or interactive
+widgets, so previews can be rendered on servers and in worker processes. Each process keeps and
+reuses its figure between products.
+
+    from oda_api.preview import render_previews
+    report = render_previews(data, output_dir='previews', processes=8)
+    print(report['products_per_second'])
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+__all__ = ['render_previews', 'render_product', 'preview_kind']
+
+logger = logging.getLogger(__name__)
+
+# figures of this process, by size and resolution
+_figures = {}
+
+
+def _get_figure(figsize, dpi):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    key = (tuple(figsize), dpi)
+    if key not in _figures:
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        _figures[key] = fig
+
+    fig = _figures[key]
+    fig.clf()
+
+    return fig
+
+
+def _image_unit_ID(product):
+    for unit_ID, unit in enumerate(getattr(product, 'data_unit', [])):
+        data = unit.data
+        if isinstance(data, numpy.ndarray) and data.ndim == 2 and data.dtype.names is None and data.size > 1:
+            return unit_ID
+
+
+def preview_kind(product):
+    """
+    'light_curve', 'image', or None if there is no preview for this product
+    """
+    from .lightcurve import lc_columns
+
+    if not hasattr(product, 'data_unit'):
+        return None
+
+    try:
+        lc_columns(product)
+        return 'light_curve'
+    except RuntimeError:
+        pass
+
+    if _image_unit_ID(product) is not None:
+        return 'image'
+
+    return None
+
+
+def _title(product):
+    meta_data = getattr(product, 'meta_data', None) or {}
+    return ' '.join(str(v) for v in (getattr(product, 'name', ''), meta_data.get('src_name', '')) if v)
+
+
+def _render_image(fig, product):
+    from .plot_tools import ImagePyramid, percentile_limits
+
+    data = product.data_unit[_image_unit_ID(product)].data
+    ny, nx = data.shape
+
+    # drawn at the resolution of the figure, as OdaImage.show does
+    pyramid = ImagePyramid(data)
+    width, height = fig.get_size_inches() * fig.dpi
+    cut, extent, level = pyramid.cutout(-0.5, nx - 0.5, -0.5, ny - 0.5, max(width, height))
+
+    vmin, vmax = percentile_limits(cut)
+
+    ax = fig.add_subplot(1, 1, 1)
+    im = ax.imshow(cut, interpolation='nearest', extent=extent, vmin=vmin, vmax=vmax)
+    fig.colorbar(im, ax=ax)
+    ax.set_title(_title(product))
+
+
+def _render_light_curve(fig, product):
+    from .lightcurve import lc_columns
+
+    time_column, rate, rate_err, time_bin, unit_ID = lc_columns(product)
+    data = product.data_unit[unit_ID].data
+
+    ax = fig.add_subplot(1, 1, 1)
+    ax.errorbar(data[time_column], data[rate], yerr=data[rate_err],
+                xerr=0.5 * time_bin if time_bin is not None else None, ls='')
+    ax.set_xlabel(time_column)
+    ax.set_ylabel(rate)
+    ax.set_title(_title(product))
+
+
+def render_product(product, filename, figsize=(8, 6), dpi=100):
+    """
+    renders a preview of the product to filename (of any format supported by matplotlib); returns the kind of preview
+    """
+    kind = preview_kind(product)
+    if kind is None:
+        raise RuntimeError(f"no preview available for product {getattr(product, 'name', product)}")
+
+    fig = _get_figure(figsize, dpi)
+
+    if kind == 'image':
+        _render_image(fig, product)
+    else:
+        _render_light_curve(fig, product)
+
+    fig.savefig(filename)
+
+    return kind
+
+
+def _render_task(task):
+    index, product, filename, figsize, dpi = task
+
+    t0 = time.perf_counter()
+    result = dict(index=index, filename=filename, kind=None, error=None)
+    try:
+        result['kind'] = render_product(product, filename, figsize=figsize, dpi=dpi)
+    except Exception as e:
+        result['error'] = repr(e)
+        result['filename'] = None
+    result['duration_s'] = time.perf_counter() - t0
+
+    return result
+
+
+def render_previews(products, output_dir='.', processes=None, figsize=(8, 6), dpi=100, format='png', chunksize=1):
+    """
+    renders previews of a DataCollection or a list of products to output_dir, in a pool of processes
+    (by default, one per CPU; serially in this process if 1); returns a report with the files written,
+    per-product errors and timings, and the throughput
+    """
+    from .api import DataCollection, clean_var_name
+
+    if isinstance(products, DataCollection):
+        names = list(products._n_list)
+        products = list(products._p_list)
+    else:
+        products = list(products)
+        names = [clean_var_name('%s_%d' % (getattr(p, 'name', '') or 'product', i)) for i, p in enumerate(products)]
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [(i, product, os.path.join(output_dir, '%s.%s' % (name, format)), figsize, dpi)
+             for i, (product, name) in enumerate(zip(products, names))]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    if processes <= 1 or len(tasks) <= 1:
+        results = [_render_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_render_task, tasks, chunksize=chunksize))
+    wall_time = time.perf_counter() - t0
+
+    for result in results:
+        if result['error'] is not None:
+            logger.warning("unable to render preview of product %d: %s", result['index'], result['error'])
+
+    n_rendered = sum(1 for r in results if r['error'] is None)
+
+    return dict(
+        n_products=len(results),
+        n_rendered=n_rendered,
+        processes=processes,
+        wall_time_s=wall_time,
+        products_per_second=n_rendered / wall_time if wall_time > 0 else None,
+        files=[r['filename'] for r in results if r['filename'] is not None],
+        products=results,
+    )
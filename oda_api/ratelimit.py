@@ -0,0 +1,231 @@
+"""
+Client-side limits on the load sent to a dispatcher.
+
+Limits are set per dispatcher URL, and shared by all clients in the process: a token bucket
+bounds the rate of HTTP requests, and a counter bounds the number of jobs in flight (submitted,
+and not yet done or failed). Time spent waiting for either is recorded, and reported with the
+other counters by DispatcherLimits.snapshot.
+
+    from oda_api import ratelimit
+    ratelimit.set_limits(url, requests_per_second=5, burst=10, max_in_flight_jobs=20)
+"""
+
+import threading
+import time
+
+from .metrics import Histogram
+
+__all__ = ['InFlightLimitError', 'TokenBucket', 'DispatcherLimits', 'set_limits', 'get_limits', 'clear_limits', 'limits_snapshot']
+
+
+class InFlightLimitError(RuntimeError):
+    """
+    no in-flight slot became free in time, or none ever could, being all held by the waiting thread
+    """
+
+
+class TokenBucket(object):
+    """
+    allows rate acquisitions per second on average, and up to burst at once
+    """
+
+    def __init__(self, rate, burst=None):
+        self.configure(rate, burst)
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._t_last = time.monotonic()
+
+    def configure(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, not {rate}")
+
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1., rate))
+
+    def acquire(self):
+        """
+        takes a token, sleeping until it is available; returns the time waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._t_last) * self.rate)
+            self._t_last = now
+
+            # the token is reserved now, callers queue in order of arrival
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.
+
+        if wait > 0:
+            time.sleep(wait)
+
+        return wait
+
+
+class DispatcherLimits(object):
+    def __init__(self, url, requests_per_second=None, burst=None, max_in_flight_jobs=None):
+        self.url = url
+
+        self.bucket = None
+        self.max_in_flight_jobs = None
+
+        self._condition = threading.Condition()
+        self.jobs_in_flight = 0
+        self.jobs_waiting = 0
+        # in-flight slots held, by thread which took them
+        self._holders = {}
+        self.max_jobs_in_flight_seen = 0
+
+        self.n_requests = 0
+        self.n_jobs = 0
+        self.request_wait = Histogram()
+        self.job_wait = Histogram()
+
+        self.configure(requests_per_second, burst, max_in_flight_jobs)
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.url)
+
+    def configure(self, requests_per_second=None, burst=None, max_in_flight_jobs=None):
+        """
+        changes the limits, None removes a limit; jobs already in flight keep their slots
+        """
+        with self._condition:
+            if requests_per_second is None:
+                self.bucket = None
+            elif self.bucket is None:
+                self.bucket = TokenBucket(requests_per_second, burst)
+            else:
+                self.bucket.configure(requests_per_second, burst)
+
+            self.max_in_flight_jobs = max_in_flight_jobs
+            self._condition.notify_all()
+
+    def acquire_request(self):
+        """
+        waits until a request can be sent; returns the time waited
+        """
+        bucket = self.bucket
+        wait = bucket.acquire() if bucket is not None else 0.
+
+        with self._condition:
+            self.n_requests += 1
+            self.request_wait.observe(wait)
+
+        return wait
+
+    def acquire_job(self, wait=True, timeout=None):
+        """
+        waits until a job can be submitted, and takes an in-flight slot for it; returns the time waited
+
+        Without wait, the slot is taken at once, also beyond the limit: for jobs already running on the dispatcher,
+        which waiting would not unload. Raises InFlightLimitError after timeout seconds, or at once if all slots are
+        held by jobs of the calling thread (e.g. submitted without waiting), which it would wait for forever.
+        """
+        t0 = time.monotonic()
+        deadline = None if timeout is None else t0 + timeout
+        thread = threading.get_ident()
+
+        with self._condition:
+            self.jobs_waiting += 1
+            try:
+                while wait and self.max_in_flight_jobs is not None and self.jobs_in_flight >= self.max_in_flight_jobs:
+                    if 0 < self.jobs_in_flight <= self._holders.get(thread, 0):
+                        raise InFlightLimitError(f"all {self.jobs_in_flight} in-flight slots of {self.url} are held by "
+                                                 f"jobs of this thread: poll them to completion before submitting more")
+
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise InFlightLimitError(f"no in-flight slot of {self.url} became free in {timeout} seconds")
+
+                    self._condition.wait(remaining)
+            finally:
+                self.jobs_waiting -= 1
+
+            self.jobs_in_flight += 1
+            self._holders[thread] = self._holders.get(thread, 0) + 1
+            self.max_jobs_in_flight_seen = max(self.max_jobs_in_flight_seen, self.jobs_in_flight)
+            self.n_jobs += 1
+
+            wait = time.monotonic() - t0
+            self.job_wait.observe(wait)
+
+        return wait
+
+    def release_job(self, thread=None):
+        """
+        frees a slot taken by acquire_job, in the given thread, by default in this one
+        """
+        if thread is None:
+            thread = threading.get_ident()
+
+        with self._condition:
+            self.jobs_in_flight -= 1
+
+            n_held = self._holders.pop(thread, 0) - 1
+            if n_held > 0:
+                self._holders[thread] = n_held
+
+            self._condition.notify()
+
+    def snapshot(self):
+        with self._condition:
+            return dict(
+                url=self.url,
+                requests_per_second=self.bucket.rate if self.bucket is not None else None,
+                burst=self.bucket.burst if self.bucket is not None else None,
+                max_in_flight_jobs=self.max_in_flight_jobs,
+                n_requests=self.n_requests,
+                request_wait=self.request_wait.snapshot(),
+                n_jobs=self.n_jobs,
+                jobs_in_flight=self.jobs_in_flight,
+                jobs_waiting=self.jobs_waiting,
+                max_jobs_in_flight_seen=self.max_jobs_in_flight_seen,
+                job_wait=self.job_wait.snapshot(),
+            )
+
+
+_registry_lock = threading.Lock()
+_registry = {}
+
+
+def _normalize_url(url):
+    return url.rstrip('/')
+
+
+def set_limits(url, requests_per_second=None, burst=None, max_in_flight_jobs=None):
+    """
+    sets the limits for a dispatcher, for all clients in the process
+    """
+    with _registry_lock:
+        limits = _registry.get(_normalize_url(url))
+        if limits is None:
+            limits = _registry[_normalize_url(url)] = DispatcherLimits(url)
+
+    limits.configure(requests_per_second, burst, max_in_flight_jobs)
+
+    return limits
+
+
+def get_limits(url):
+    """
+    limits for a dispatcher, or None if it has none
+    """
+    return _registry.get(_normalize_url(url))
+
+
+def clear_limits(url=None):
+    """
+    removes limits of a dispatcher, or of all of them
+    """
+    with _registry_lock:
+        if url is None:
+            _registry.clear()
+        else:
+            _registry.pop(_normalize_url(url), None)
+
+
+def limits_snapshot():
+    with _registry_lock:
+        limits = list(_registry.values())
+
+    return {l.url: l.snapshot() for l in limits}
@@ -0,0 +1,200 @@
+"""
+Splitting of long scw_list queries into parallel sub-jobs, merged on the client.
+
+Only additive products can be sharded: light curves, whose bins from different science windows
+are concatenated in time order, and spectra, whose rates are averaged with exposure weights
+(assuming, as for a mosaic spectrum, that the shards share the same response). Each shard is a
+separate dispatcher job, retried on its own when it fails.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+__all__ = ['split_scw_list', 'merge_kind', 'merge_products', 'merge_collections', 'run_sharded']
+
+logger = logging.getLogger(__name__)
+
+
+def split_scw_list(scw_list, shard_size):
+    """
+    splits scw_list, a list or a comma-separated string, in shards of at most shard_size science windows,
+    of the same type as scw_list
+    """
+    if shard_size < 1:
+        raise ValueError(f"shard size should be at least 1, not {shard_size}")
+
+    if isinstance(scw_list, str):
+        scws = [scw.strip() for scw in scw_list.split(',') if scw.strip() != '']
+        return [','.join(scws[i:i + shard_size]) for i in range(0, len(scws), shard_size)]
+
+    scws = list(scw_list)
+    return [scws[i:i + shard_size] for i in range(0, len(scws), shard_size)]
+
+
+def merge_kind(product):
+    """
+    how products of this name are merged: 'lc', 'spectrum', or None if they can not be sharded
+    """
+    if product.endswith('_lc') or product.endswith('_light_curve'):
+        return 'lc'
+
+    if product.endswith('_spectrum'):
+        return 'spectrum'
+
+    return None
+
+
+def _time_column(names):
+    for name in 'TIME', 'time':
+        if name in names:
+            return name
+
+
+def _merge_lc_units(units):
+    from .lightcurve import concatenate_data
+
+    data = concatenate_data([u.data for u in units], _time_column(units[0].data.dtype.names))
+
+    return data, dict(units[0].header)
+
+
+def _merge_spectrum_units(units):
+    names = units[0].data.dtype.names
+    exposures = numpy.array([float(u.header.get('EXPOSURE', 1.)) for u in units])
+    total_exposure = exposures.sum()
+
+    data = units[0].data.copy()
+
+    for name in names:
+        column = numpy.stack([u.data[name] for u in units])
+
+        if name in ('COUNTS', 'BACKGROUND_COUNTS'):
+            data[name] = column.sum(axis=0)
+        elif name in ('RATE', 'FLUX'):
+            data[name] = (column * exposures[:, None]).sum(axis=0) / total_exposure
+        elif name in ('STAT_ERR', 'ERROR', 'FLUX_ERR'):
+            data[name] = numpy.sqrt(((column * exposures[:, None]) ** 2).sum(axis=0)) / total_exposure
+
+    header = dict(units[0].header)
+    if 'EXPOSURE' in header:
+        header['EXPOSURE'] = total_exposure
+
+    return data, header
+
+
+def _is_additive(unit, kind):
+    if unit.data is None or unit.data.dtype.names is None:
+        return False
+
+    names = unit.data.dtype.names
+
+    if kind == 'lc':
+        return _time_column(names) is not None
+    else:
+        return any(name in names for name in ('COUNTS', 'RATE', 'FLUX'))
+
+
+def merge_products(products, kind):
+    """
+    merges NumpyDataProducts of the same source obtained from different shards;
+    data units which are not light curves or spectra (e.g. responses) are taken from the first shard
+    """
+    from .data_products import NumpyDataProduct, NumpyDataUnit
+
+    first = products[0]
+    n_units = len(first.data_unit)
+
+    if any(len(p.data_unit) != n_units for p in products):
+        raise RuntimeError(f"unable to merge products {first.name} from shards: numbers of data units differ")
+
+    merged_units = []
+    for i, unit in enumerate(first.data_unit):
+        units = [p.data_unit[i] for p in products]
+
+        if _is_additive(unit, kind):
+            if kind == 'lc':
+                data, header = _merge_lc_units(units)
+            else:
+                data, header = _merge_spectrum_units(units)
+
+            unit = NumpyDataUnit(data,
+                                 data_header=header,
+                                 meta_data=unit.meta_data,
+                                 hdu_type=unit.hdu_type,
+                                 name=unit.name,
+                                 units_dict=unit.units_dict)
+
+        merged_units.append(unit)
+
+    return NumpyDataProduct(merged_units, name=first.name, meta_data=first.meta_data)
+
+
+def _product_keys(collection):
+    # products of a collection by source, or by name for products without one; products of the same
+    # source (e.g. in different energy ranges) are told apart by their order
+    keys = []
+    for product in collection._p_list:
+        source = (product.meta_data or {}).get('src_name') or product.name
+        keys.append((source, sum(1 for k in keys if k[0] == source)))
+
+    return keys
+
+
+def merge_collections(collections, kind, instrument=None, product=None):
+    """
+    merges DataCollections from shards, product by product, matching products of the same source
+    """
+    from .api import DataCollection
+
+    by_key = [dict(zip(_product_keys(c), c._p_list)) for c in collections]
+    keys = _product_keys(collections[0])
+
+    for shard_products in by_key[1:]:
+        if set(shard_products) != set(keys):
+            raise RuntimeError("unable to merge products from shards: sources differ, e.g. because they were "
+                               f"detected only in some of the shards: {sorted(set(keys) ^ set(shard_products))}")
+
+    merged = DataCollection([merge_products([p[key] for p in by_key], kind) for key in keys],
+                            instrument=instrument,
+                            product=product)
+
+    merged.decode_timings = [t for c in collections for t in (c.decode_timings or [])]
+
+    return merged
+
+
+def run_sharded(disp, parameters, shard_size, kind, parallel=4, max_retries=2, jobs=None):
+    """
+    runs the query with these parameters (as built by DispatcherAPI.product_parameters) as sub-jobs
+    over shards of its scw_list, and returns the merged DataCollection; jobs, if given, is extended
+    with the completed job of each shard
+    """
+    shards = split_scw_list(parameters['scw_list'], shard_size)
+
+    def run_shard(shard):
+        attempt = 0
+        while True:
+            attempt += 1
+            job = disp.new_job({**parameters, 'scw_list': shard, 'session_id': disp.generate_session_id()})
+            try:
+                return job, job.result()
+            except (Exception, SystemExit) as e:
+                # failed jobs raise RemoteException, which exits
+                if attempt > max_retries:
+                    logger.error("shard %s failed after %d attempts", shard, attempt)
+                    raise
+
+                logger.warning("shard %s failed (attempt %d), retrying: %s", shard, attempt, repr(e)[:200])
+                time.sleep(disp.retry_sleep_s)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = list(executor.map(run_shard, shards))
+
+    collections = [data for _, data in results]
+    if jobs is not None:
+        jobs.extend(job for job, _ in results)
+
+    return merge_collections(collections, kind, instrument=parameters.get('instrument'), product=parameters.get('product_type'))
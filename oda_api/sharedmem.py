@@ -0,0 +1,268 @@
+"""
+Hand-off of decoded products to worker processes through shared memory.
+
+The arrays of a NumpyDataUnit, NumpyDataProduct or DataCollection are copied, once, into one
+shared memory block, and only a small descriptor (block name, and names, dtypes, shapes, headers
+and meta data) is sent to the workers, which attach to the block and see the arrays without copying.
+
+The exporting process owns the block, and removes it when the workers are done with it; workers
+close their view of the block when done; arrays are read-only in the workers:
+
+    with data.to_shared_memory() as shared:
+        results = pool.map(analyze, [shared.descriptor] * n_tasks)
+
+    def analyze(descriptor):
+        with DataCollection.from_shared_memory(descriptor) as data:
+            ...
+
+If the exporting process exits without removing the block, it is removed by its resource tracker.
+"""
+
+import logging
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+__all__ = ['SharedProducts', 'SharedProductsView', 'export_shared', 'attach_shared']
+
+logger = logging.getLogger(__name__)
+
+# arrays in the block start on cache lines
+_alignment = 64
+
+
+def _aligned(offset):
+    return -(-offset // _alignment) * _alignment
+
+
+def _shareable(data):
+    return isinstance(data, numpy.ndarray) and not data.dtype.hasobject
+
+
+class SharedProducts(object):
+    """
+    arrays of products copied into a new shared memory block, and the descriptor of the products;
+    the block is closed and removed when leaving the context, or by close and unlink
+    """
+
+    def __init__(self, obj):
+        self._arrays = []
+        self._size = 0
+
+        self.kind, description = self._describe(obj)
+
+        self.block = shared_memory.SharedMemory(create=True, size=max(self._size, 1))
+
+        try:
+            for offset, data in self._arrays:
+                numpy.ndarray(data.shape, dtype=data.dtype, buffer=self.block.buf, offset=offset)[...] = data
+        except BaseException:
+            self.block.close()
+            self.block.unlink()
+            raise
+        finally:
+            self._arrays = None
+
+        self.descriptor = dict(block=self.block.name, kind=self.kind, object=description, tracker=_tracker_pid())
+
+    def __repr__(self):
+        return '<%s %s %s, %d bytes>' % (self.__class__.__name__, self.kind, self.descriptor['block'], self._size)
+
+    def _describe_array(self, data):
+        if data is None:
+            return None
+
+        if not _shareable(data):
+            # e.g. arrays of objects, which are sent to the workers as they are
+            return dict(array=data)
+
+        offset = _aligned(self._size)
+        self._size = offset + data.nbytes
+        self._arrays.append((offset, data))
+
+        return dict(offset=offset, dtype=data.dtype, shape=data.shape)
+
+    def _describe_unit(self, unit):
+        return dict(name=unit.name,
+                    hdu_type=unit.hdu_type,
+                    header=unit.header,
+                    meta_data=unit.meta_data,
+                    units_dict=unit.units_dict,
+                    data=self._describe_array(unit.data))
+
+    def _describe_product(self, product):
+        return dict(name=product.name,
+                    meta_data=product.meta_data,
+                    data_unit=[self._describe_unit(u) for u in product.data_unit])
+
+    def _describe(self, obj):
+        from .api import DataCollection
+        from .data_products import NumpyDataProduct, NumpyDataUnit
+
+        if isinstance(obj, NumpyDataUnit):
+            return 'unit', self._describe_unit(obj)
+
+        if isinstance(obj, NumpyDataProduct):
+            return 'product', self._describe_product(obj)
+
+        if isinstance(obj, DataCollection):
+            # other products, e.g. catalogs, are sent as they are
+            return 'collection', dict(
+                products=[dict(product=self._describe_product(p)) if isinstance(p, NumpyDataProduct) else dict(object=p)
+                          for p in obj._p_list],
+                decode_timings=obj.decode_timings)
+
+        raise TypeError(f"unable to share {type(obj).__name__}, only NumpyDataUnit, NumpyDataProduct and DataCollection")
+
+    def close(self):
+        """
+        closes the view of the block of this process; the products are still available to the workers
+        """
+        self.block.close()
+
+    def unlink(self):
+        """
+        removes the block, once it is closed by all processes
+        """
+        try:
+            self.block.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.unlink()
+
+
+def _tracker_pid():
+    # resource tracker started by this process, or by the process it was forked from once the tracker ran;
+    # None in processes spawned with the tracker of their parent
+    return getattr(resource_tracker._resource_tracker, '_pid', None)
+
+
+def _attach_block(name, tracker=None):
+    try:
+        # since python 3.13, blocks are not tracked by processes only using them
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # before, attaching registers the block with the resource tracker of the process, which, if it is not
+    # the one of the exporting process (e.g. for pools started before the export), removes it when the worker
+    # exits: the registration is withdrawn, from that tracker only, since the exporting process relies on its own
+    block = shared_memory.SharedMemory(name=name)
+    pid = _tracker_pid()
+    if pid is not None and pid != tracker:
+        resource_tracker.unregister(block._name, 'shared_memory')
+
+    return block
+
+
+class SharedProductsView(object):
+    """
+    products of a descriptor, with arrays viewing the shared memory block; the view is closed
+    when leaving the context, or by close, after which the arrays are no longer available
+    """
+
+    def __init__(self, descriptor):
+        self.kind = descriptor['kind']
+        self.block = _attach_block(descriptor['block'], descriptor.get('tracker'))
+        self._units = []
+
+        description = descriptor['object']
+
+        if self.kind == 'unit':
+            self.data = self._unit(description)
+        elif self.kind == 'product':
+            self.data = self._product(description)
+        elif self.kind == 'collection':
+            self.data = self._collection(description)
+        else:
+            self.block.close()
+            raise RuntimeError(f"unknown kind of shared products: {self.kind}")
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.kind, self.block.name)
+
+    def _array(self, description):
+        if description is None:
+            return None
+
+        if 'array' in description:
+            return description['array']
+
+        data = numpy.ndarray(description['shape'], dtype=description['dtype'], buffer=self.block.buf, offset=description['offset'])
+        # shared with the other workers
+        data.flags.writeable = False
+
+        return data
+
+    def _unit(self, description):
+        from .data_products import NumpyDataUnit
+
+        unit = NumpyDataUnit(self._array(description['data']),
+                             data_header=description['header'],
+                             meta_data=description['meta_data'],
+                             hdu_type=description['hdu_type'],
+                             name=description['name'],
+                             units_dict=description['units_dict'])
+        self._units.append(unit)
+
+        return unit
+
+    def _product(self, description):
+        from .data_products import NumpyDataProduct
+
+        return NumpyDataProduct([self._unit(u) for u in description['data_unit']],
+                                name=description['name'],
+                                meta_data=description['meta_data'])
+
+    def _collection(self, description):
+        from .api import DataCollection
+
+        data = DataCollection([self._product(p['product']) if 'product' in p else p['object'] for p in description['products']])
+        data.decode_timings = description['decode_timings']
+
+        return data
+
+    def close(self):
+        """
+        removes the arrays from the products, and closes the view of the block
+        """
+        for unit in self._units:
+            unit.data = None
+        self._units = []
+        self.data = None
+
+        try:
+            self.block.close()
+        except BufferError:
+            logger.warning("arrays of shared products %s are still in use, the block is closed when they are released", self.block.name)
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_shared(obj):
+    """
+    copies the arrays of a NumpyDataUnit, NumpyDataProduct or DataCollection into shared memory;
+    the descriptor of the returned SharedProducts is sent to the workers
+    """
+    return SharedProducts(obj)
+
+
+def attach_shared(descriptor, kind=None):
+    """
+    products of a descriptor, as a SharedProductsView, to be used as a context;
+    kind, if given, is the one expected: 'unit', 'product' or 'collection'
+    """
+    if kind is not None and descriptor.get('kind') != kind:
+        raise RuntimeError(f"shared products are a {descriptor.get('kind')}, not a {kind}")
+
+    return SharedProductsView(descriptor)
@@ -0,0 +1,222 @@
+"""
+Coalescing of identical concurrent product requests.
+
+While a request for some parameters is in flight, identical requests from other threads wait
+for it and receive its result, or what share makes of it (e.g. a copy of their own), instead of
+submitting their own dispatcher job. Optionally, with a lock directory, requests are also coalesced
+between processes of the same user: the first one holds a lock file for the request, and leaves its
+result in the directory for those which waited for it, the last of which removes it. Results are not
+kept for requests arriving later.
+
+Results are pickled, the lock directory has to be private to the user (mode 0700), and is created so.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+
+__all__ = ['SingleFlight', 'request_key', 'default_single_flight']
+
+logger = logging.getLogger(__name__)
+
+# parameters which differ between otherwise identical requests
+_ignored_parameters = ['session_id', 'job_id', 'query_status', 'api', 'oda_api_version', 'full_report_last_index', 'long_poll_s', 'callback_url']
+
+
+def request_key(url, parameters, cookies=None):
+    """
+    key identifying a request: dispatcher url, canonical parameters and credentials,
+    so that results are never shared between users with different credentials
+    """
+    canonical = json.dumps(dict(
+                                url=url,
+                                parameters={k: v for k, v in parameters.items() if k not in _ignored_parameters},
+                                cookies=cookies,
+                            ),
+                           sort_keys=True, default=str)
+
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """
+    runs at most one call per key at a time, sharing its result with the callers of the same key
+
+    lock_dir, a directory private to the user, enables coalescing between processes
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir
+
+        self._lock = threading.Lock()
+        self._calls = {}
+
+        self.n_calls = 0
+        self.n_coalesced = 0
+        self.n_shared_between_processes = 0
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.lock_dir)
+
+    def do(self, key, func, share=None):
+        """
+        returns func(), or, if an identical call is in flight, waits for its result; share, if given, is applied
+        to the result received from a call of another thread
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                self.n_coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+
+            if call.exception is not None:
+                raise call.exception
+
+            return call.result if share is None else share(call.result)
+
+        try:
+            if self.lock_dir is None:
+                with self._lock:
+                    self.n_calls += 1
+                call.result = func()
+            else:
+                call.result = self._do_between_processes(key, func)
+        except BaseException as e:
+            # RemoteException exits, waiters should see it too
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def _do_between_processes(self, key, func):
+        try:
+            import fcntl
+        except ImportError:
+            logger.warning("file locks are not available on this platform, requests are coalesced only within the process")
+            with self._lock:
+                self.n_calls += 1
+            return func()
+
+        self._check_lock_dir()
+
+        paths = [os.path.join(self.lock_dir, key + suffix) for suffix in ('.pickle', '.lock', '.users')]
+        result_path, lock_path, users_path = paths
+
+        while True:
+            result = None
+            shared = False
+
+            # held by all processes running or waiting for the request, until they leave it
+            users_file = _lock(users_path, fcntl.LOCK_SH)
+            try:
+                lock_file = _lock(lock_path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+                if lock_file is not None:
+                    try:
+                        with self._lock:
+                            self.n_calls += 1
+
+                        result = func()
+
+                        tmp_path = '%s.%d.tmp' % (result_path, os.getpid())
+                        with open(tmp_path, 'wb') as f:
+                            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        os.replace(tmp_path, result_path)
+                    finally:
+                        lock_file.close()
+                else:
+                    # blocks while another process is running the request
+                    lock_file = _lock(lock_path, fcntl.LOCK_SH)
+                    try:
+                        with open(result_path, 'rb') as f:
+                            result = pickle.load(f)
+                        shared = True
+                    except FileNotFoundError:
+                        # the other process failed: the request is run again
+                        shared = None
+                    finally:
+                        lock_file.close()
+            finally:
+                users_file.close()
+                # the last process to leave the request removes its files
+                users_file = _lock(users_path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if users_file is not None:
+                    try:
+                        for path in paths:
+                            _remove(path)
+                    finally:
+                        users_file.close()
+
+            if shared is None:
+                continue
+
+            if shared:
+                with self._lock:
+                    self.n_shared_between_processes += 1
+
+            return result
+
+    def _check_lock_dir(self):
+        if not os.path.isdir(self.lock_dir):
+            os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+
+        # results are unpickled, which runs code: other users must not be able to write them
+        st = os.stat(self.lock_dir)
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError(f"lock directory {self.lock_dir} of {self} is not private: it should belong to this user, with mode 0700")
+
+
+def _lock(path, operation):
+    """
+    opens and locks the lock file at path, returning it, or None if it is locked and operation does not block;
+    lock files are removed by their holders, a file removed before it was locked is opened again
+    """
+    import fcntl
+
+    while True:
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file, operation)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+
+        try:
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(path)):
+                return lock_file
+        except FileNotFoundError:
+            pass
+
+        lock_file.close()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# shared by all clients of the process which do not set their own
+default_single_flight = SingleFlight()
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+benchmarks_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+
+@pytest.fixture
+def run_benchmarks():
+    sys.path.insert(0, benchmarks_dir)
+    try:
+        import run_benchmarks
+        run_benchmarks.load_benchmark_modules()
+        yield run_benchmarks
+    finally:
+        sys.path.remove(benchmarks_dir)
+
+
+@pytest.mark.parametrize("select", ["DataCollection", "get_product"])
+def test_benchmarks_run(run_benchmarks, select):
+    results = run_benchmarks.run_benchmarks(select=select, quick=True, verbose=False)
+
+    assert len(results['results']) > 0
+    for result in results['results']:
+        assert select in result['name']
+        assert result['time']['min'] > 0
+        assert result['peak_memory_bytes'] > 0
+
+    comparison = run_benchmarks.compare_results(results, results)
+    assert [ratio for *_, ratio in comparison] == [1.] * len(results['results'])
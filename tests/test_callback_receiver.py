@@ -0,0 +1,192 @@
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from oda_api.callback_receiver import CallbackReceiver
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def get_disp(dispatcher, **kwargs):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", **kwargs)
+    # completion is never found by polling in these tests, unless said otherwise
+    disp.poll_interval_s = 60
+    disp.callback_poll_interval_s = 60
+    disp.enable_callbacks()
+    return disp
+
+
+@pytest.mark.parametrize("submit_method", ["get", "post"])
+def test_get_product(submit_method):
+    with MockDispatcher(job_duration_s=0.3, n_products=2) as dispatcher:
+        disp = get_disp(dispatcher)
+        disp.submit_method = submit_method
+        receiver = disp.callback_receiver
+
+        try:
+            t0 = time.time()
+            data = disp.get_product(instrument="isgri", product="isgri_image")
+            wall_time = time.time() - t0
+        finally:
+            disp.disable_callbacks()
+
+    assert len(data._p_list) == 2
+    # woken by the callback, not by the safety poll
+    assert wall_time < disp.callback_poll_interval_s
+
+    # submitted, called back, and polled once more
+    assert disp.job.n_poll == 2
+    assert dispatcher.n_callbacks == 1
+    assert dispatcher.jobs[disp.job_id].parameters['callback_url'] == disp.job.callback_url
+
+    received, = receiver.received
+    assert received['job_id'] == disp.job_id
+    assert received['status'] == 'done'
+
+
+def test_batch():
+    with MockDispatcher(job_duration_s=0.3) as dispatcher:
+        disp = get_disp(dispatcher, wait=False)
+        receiver = disp.callback_receiver
+
+        try:
+            jobs = [disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST", T1=i)) for i in range(10)]
+            for job in jobs:
+                job.run(wait=False)
+
+            assert all(not job.is_complete for job in jobs)
+
+            t0 = time.time()
+            for job in jobs:
+                job.run(wait=True)
+            wall_time = time.time() - t0
+        finally:
+            disp.disable_callbacks()
+
+    assert all(job.is_ready for job in jobs)
+    assert wall_time < disp.callback_poll_interval_s
+    assert [job.n_poll for job in jobs] == [2] * 10
+    assert sorted(r['job_id'] for r in receiver.received) == sorted(job.job_id for job in jobs)
+
+
+def test_safety_polling():
+    with MockDispatcher(job_duration_s=0.3) as dispatcher:
+        disp = get_disp(dispatcher)
+        disp.callback_poll_interval_s = 0.5
+
+        try:
+            disp.get_product(instrument="isgri", product="isgri_image", T1=0)
+            assert disp.callbacks_confirmed
+
+            dispatcher.lose_callbacks = True
+
+            t0 = time.time()
+            disp.get_product(instrument="isgri", product="isgri_image", T1=1)
+            wall_time = time.time() - t0
+        finally:
+            disp.disable_callbacks()
+
+    assert dispatcher.n_callbacks == 1
+    assert disp.job.n_poll == 2
+    assert disp.callback_poll_interval_s <= wall_time < disp.poll_interval_s
+
+
+def test_short_safety_interval_before_first_callback():
+    with MockDispatcher(job_duration_s=0.3, lose_callbacks=True) as dispatcher:
+        disp = get_disp(dispatcher)
+        disp.poll_interval_s = 0.1
+
+        try:
+            t0 = time.time()
+            for i in range(3):
+                disp.get_product(instrument="isgri", product="isgri_image", T1=i)
+            wall_time = time.time() - t0
+        finally:
+            disp.disable_callbacks()
+
+    # acknowledged, so still submitted with callback_url, but polled every poll_interval_s, not callback_poll_interval_s
+    assert not disp.callbacks_confirmed
+    assert disp.callbacks_missed == 0
+    assert 'callback_url' in dispatcher.jobs[disp.job_id].parameters
+    assert wall_time < disp.callback_poll_interval_s
+
+
+def test_fallback_to_polling():
+    with MockDispatcher(job_duration_s=0.1) as dispatcher:
+        disp = get_disp(dispatcher)
+        disp.poll_interval_s = 0.05
+        disp.callback_poll_interval_s = 0.3
+        disp.callback_max_missed = 2
+
+        try:
+            disp.get_product(instrument="isgri", product="isgri_image", T1=0)
+
+            dispatcher.lose_callbacks = True
+            for i in range(1, 4):
+                disp.get_product(instrument="isgri", product="isgri_image", T1=i)
+        finally:
+            disp.disable_callbacks()
+
+    assert disp.callbacks_missed == 2
+    # after two jobs not called back, the fourth is submitted without callback_url, and polled every poll_interval_s
+    assert disp.job.callback_url is None
+    assert 'callback_url' not in dispatcher.jobs[disp.job_id].parameters
+    assert disp.job.n_poll >= 3
+
+
+def test_not_acknowledged():
+    with MockDispatcher(job_duration_s=0.3, callbacks=False) as dispatcher:
+        disp = get_disp(dispatcher)
+        disp.poll_interval_s = 0.1
+
+        try:
+            t0 = time.time()
+            disp.get_product(instrument="isgri", product="isgri_image", T1=0)
+            wall_time = time.time() - t0
+
+            disp.get_product(instrument="isgri", product="isgri_image", T1=1)
+        finally:
+            disp.disable_callbacks()
+
+    # the first job falls back to polling as soon as it is submitted, and the next is submitted without callback_url
+    assert wall_time < 5
+    assert disp.callbacks_missed == disp.callback_max_missed
+    assert 'callback_url' not in dispatcher.jobs[disp.job_id].parameters
+
+
+def test_receiver():
+    with CallbackReceiver() as receiver:
+        assert receiver.wait('JOB', timeout=0.05) is False
+
+        base_url = receiver.url[:-len(receiver.path)]
+        with pytest.raises(urllib.error.HTTPError) as e:
+            urllib.request.urlopen(base_url + '/callback/guessed?job_id=JOB&status=done')
+        assert e.value.code == 404
+
+        urllib.request.urlopen(receiver.url + '?job_id=JOB&status=done').read()
+        urllib.request.urlopen(receiver.url, data=b'job_id=OTHER&status=failed').read()
+
+        assert receiver.wait('JOB', timeout=1) is True
+        assert receiver.wait('JOB', timeout=0.05) is False
+        assert receiver.wait('OTHER', timeout=1) is True
+
+    assert [(r['job_id'], r['status']) for r in receiver.received] == [('JOB', 'done'), ('OTHER', 'failed')]
+
+    with CallbackReceiver(public_url='https://tunnel.example.org/') as receiver:
+        assert receiver.url == 'https://tunnel.example.org' + receiver.path
+
+
+def test_receiver_bounded():
+    receiver = CallbackReceiver(max_received=3)
+    try:
+        for i in range(10):
+            receiver.notify('JOB%d' % i, 'done')
+
+        assert [r['job_id'] for r in receiver.received] == ['JOB7', 'JOB8', 'JOB9']
+        assert receiver.wait('JOB0', timeout=0) is False
+        assert receiver.wait('JOB9', timeout=0) is True
+    finally:
+        receiver.httpd.server_close()
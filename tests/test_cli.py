@@ -0,0 +1,67 @@
+import json
+import os
+
+import pytest
+
+from oda_api.cli import load_grid, main
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def test_load_grid(tmpdir):
+    fn = str(tmpdir.join("grid.json"))
+    with open(fn, "w") as f:
+        json.dump(dict(defaults=dict(instrument="isgri", product="isgri_image"),
+                       jobs=[dict(E1_keV=20)],
+                       grid=dict(E1_keV=[25, 30], E2_keV=[80, 100])), f)
+
+    queries = load_grid(fn)
+    assert len(queries) == 5
+    assert all(q['instrument'] == "isgri" for q in queries)
+    assert queries[1:] == [dict(instrument="isgri", product="isgri_image", E1_keV=e1, E2_keV=e2) for e1 in (25, 30) for e2 in (80, 100)]
+
+    fn = str(tmpdir.join("grid.csv"))
+    with open(fn, "w") as f:
+        f.write("instrument,product,E1_keV,E2_keV\nisgri,isgri_image,20,\nisgri,isgri_image,25,80\n")
+
+    assert load_grid(fn) == [dict(instrument="isgri", product="isgri_image", E1_keV="20"),
+                             dict(instrument="isgri", product="isgri_image", E1_keV="25", E2_keV="80")]
+
+
+def test_run(tmpdir):
+    grid = str(tmpdir.join("grid.csv"))
+    with open(grid, "w") as f:
+        f.write("instrument,product,T1\n")
+        for i in range(6):
+            f.write("isgri,isgri_image,%d\n" % i)
+
+    report_fn = str(tmpdir.join("report.json"))
+    output_dir = str(tmpdir.join("products"))
+
+    with MockDispatcher(job_n_polls=2, n_products=2, product_shape=(4, 4), failure_rate=0.3, seed=3) as dispatcher:
+        args = [grid, "--url", dispatcher.url, "--parallel", "3", "--poll-interval-s", "0",
+                "--cache-dir", str(tmpdir.join("cache")), "--output-dir", output_dir, "--report", report_fn]
+
+        with pytest.raises(SystemExit):
+            main(args)
+
+        report = json.load(open(report_fn))
+        n_jobs_submitted = len(dispatcher.jobs)
+
+        assert report['n_jobs'] == 6
+        assert set(report['status_counts']) == {'done', 'failed'}
+        assert n_jobs_submitted == 6
+
+        for job in report['jobs']:
+            if job['status'] == 'done':
+                assert job['n_products'] == 2
+                assert all(os.path.exists(fn) for fn in job['files'])
+            assert job['wall_time_s'] > 0
+
+        # completed queries are taken from the cache, failed ones are run again
+        with pytest.raises(SystemExit):
+            main(args)
+
+        report_again = json.load(open(report_fn))
+
+        assert report_again['status_counts']['cached'] == report['status_counts']['done']
+        assert len(dispatcher.jobs) == n_jobs_submitted + report['status_counts']['failed']
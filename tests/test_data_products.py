@@ -0,0 +1,95 @@
+import numpy
+
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+
+
+def lc_unit(header):
+    data = numpy.zeros(5, dtype=[('TIME', 'f8'), ('RATE', 'f4')])
+    return NumpyDataUnit(data, data_header=header, hdu_type='bintable', name='LC', units_dict=dict(TIME='d', RATE='count/s'))
+
+
+def test_to_fits_hdu_header():
+    header = dict(KEY1=1, SCWLIST=['066500230010.001', '066500240010.001'])
+    unit = lc_unit(header)
+
+    hdu = unit.to_fits_hdu()
+
+    assert hdu.name == 'LC'
+    assert hdu.header['KEY1'] == 1
+    assert hdu.header['SCWLIST'] == '066500230010.001,066500240010.001,'
+    assert hdu.columns['RATE'].unit == 'count/s'
+    assert hdu.header['TUNIT2'] == 'count/s'
+
+    # header of the data unit is left unchanged
+    assert unit.header is header
+    assert header == dict(KEY1=1, SCWLIST=['066500230010.001', '066500240010.001'])
+
+
+def test_to_fits_hdu_header_cache():
+    unit = lc_unit(dict(KEY1=1))
+
+    hdu = unit.to_fits_hdu()
+    cached = unit._fits_header()
+    assert unit._fits_header() is cached
+
+    # HDUs do not share the cached header
+    hdu.header['KEY1'] = 2
+    assert unit.to_fits_hdu().header['KEY1'] == 1
+
+    # changes of the header are seen
+    unit.header['KEY1'] = 3
+    unit.header['KEY2'] = 'x'
+    hdu = unit.to_fits_hdu()
+    assert (hdu.header['KEY1'], hdu.header['KEY2']) == (3, 'x')
+
+    unit.header = dict(KEY3=True)
+    hdu = unit.to_fits_hdu()
+    assert hdu.header['KEY3'] is True
+    assert 'KEY1' not in hdu.header
+
+
+def test_fits_round_trip(tmpdir):
+    filename = str(tmpdir.join('lc.fits'))
+
+    product = NumpyDataProduct([NumpyDataUnit(None, data_header=dict(ORIGIN='ODA'), hdu_type='primary', name='PRIMARY'),
+                                lc_unit(dict(KEY1=1))], name='lc')
+    product.write_fits_file(filename)
+
+    read = NumpyDataProduct.from_fits_file(filename)
+    assert read.data_unit[0].header['ORIGIN'] == 'ODA'
+
+    # keywords of the data in the header read are replaced, not repeated, when written again
+    hdu = read.data_unit[1].to_fits_hdu()
+    assert list(hdu.header.keys()).count('TTYPE1') == 1
+    assert list(hdu.header.keys()).count('EXTNAME') == 1
+    assert hdu.header['KEY1'] == 1
+    assert hdu.header['NAXIS2'] == 5
+
+
+def test_to_fits_hdu_stale_header():
+    # structural keywords left in the header, e.g. by a table read before it was cut, without NAXIS or TFIELDS
+    unit = lc_unit(dict(NAXIS2=3, TTYPE1='OLD', TFORM1='J', TUNIT1='s', BITPIX=16, KEY1=1))
+
+    hdu = unit.to_fits_hdu()
+    assert hdu.header['NAXIS2'] == 5
+    assert hdu.header['TTYPE1'] == 'TIME'
+    assert hdu.header['TFORM1'] == 'D'
+    assert hdu.header['TUNIT1'] == 'd'
+    assert hdu.header['BITPIX'] == 8
+    assert hdu.header['KEY1'] == 1
+
+    image = NumpyDataUnit(numpy.zeros((3, 4), dtype='f4'), data_header=dict(NAXIS1=9, NAXIS2=9, BITPIX=16),
+                          hdu_type='image', name='IMAGE')
+    hdu = image.to_fits_hdu()
+    assert (hdu.header['NAXIS1'], hdu.header['NAXIS2'], hdu.header['BITPIX']) == (4, 3, -32)
+
+
+def test_pickle():
+    import pickle
+
+    unit = lc_unit(dict(KEY1=1))
+    unit.to_fits_hdu()
+
+    unpickled = pickle.loads(pickle.dumps(unit))
+    assert unpickled._fits_header_cache is None
+    assert unpickled.to_fits_hdu().header['KEY1'] == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def run_job(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="mock", wait=False)
+
+    disp.request(dict(instrument="mock", product_type="dummy", session_id="TEST"))
+    while not disp.is_complete:
+        disp.poll(silent=True)
+
+    return disp
+
+
+@pytest.mark.parametrize("delta_report", [True, False])
+def test_report_merged(delta_report):
+    with MockDispatcher(job_n_polls=5, n_report_entries=20, delta_report=delta_report) as dispatcher:
+        disp = run_job(dispatcher)
+
+        job = dispatcher.jobs[disp.job_id]
+
+    assert disp.is_ready
+    assert disp.full_report_dict_list == job.full_report_dict_list
+    assert disp.response_json['job_monitor']['full_report_dict_list'] == job.full_report_dict_list
+
+
+def test_delta_reduces_transfer():
+    bytes_sent = {}
+    for delta_report in True, False:
+        with MockDispatcher(job_n_polls=20, n_report_entries=50, delta_report=delta_report) as dispatcher:
+            run_job(dispatcher)
+            bytes_sent[delta_report] = dispatcher.bytes_sent
+
+    assert bytes_sent[True] * 5 < bytes_sent[False]
@@ -0,0 +1,145 @@
+import logging
+
+import pytest
+
+from oda_api.hooks import HookRegistry, EVENTS
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def record_events(disp, events=EVENTS):
+    recorded = []
+    for event in events:
+        disp.hooks.add(event, recorded.append)
+    return recorded
+
+
+def test_registry(caplog):
+    hooks = HookRegistry()
+    assert not hooks
+
+    seen = []
+    callback = hooks.add('on_poll', seen.append)
+    assert hooks
+
+    def failing(event):
+        raise RuntimeError("broken hook")
+
+    hooks.add('on_poll', failing)
+
+    with caplog.at_level(logging.ERROR, logger='oda_api.hooks'):
+        hooks.emit('on_poll', job_id='JOB', status='submitted')
+        hooks.emit('on_submit', job_id='JOB')
+
+    assert len(seen) == 1
+    assert seen[0]['event'] == 'on_poll'
+    assert seen[0]['job_id'] == 'JOB'
+    assert 't' in seen[0]
+    assert 'broken hook' in caplog.text
+
+    hooks.remove('on_poll', callback)
+    hooks.remove('on_poll', failing)
+    assert not hooks
+
+    with pytest.raises(ValueError):
+        hooks.add('on_something', seen.append)
+
+
+def test_get_product():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=3, n_products=2) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+        recorded = record_events(disp)
+
+        disp.get_product(instrument="isgri", product="isgri_image")
+
+    events = [e['event'] for e in recorded]
+    assert events[:3] == ['on_submit', 'on_poll', 'on_status_change']
+    assert events[-4:] == ['on_status_change', 'on_complete', 'on_decode_start', 'on_decode_end']
+    assert events.count('on_poll') == 3
+    assert 'on_retry' not in events
+
+    job_id = recorded[0]['job_id']
+    assert job_id is not None
+    assert all(e['job_id'] == job_id for e in recorded)
+    assert all(e['url'] == disp.url for e in recorded)
+
+    submit = recorded[0]
+    assert submit['status'] == 'progress'
+    assert submit['parameters']['product_type'] == 'isgri_image'
+    assert submit['duration_s'] > 0
+
+    polls = [e for e in recorded if e['event'] == 'on_poll']
+    assert [p['n_poll'] for p in polls] == [1, 2, 3]
+    assert polls[-1]['status'] == 'done'
+    for poll in polls:
+        assert poll['duration_s'] >= poll['spans']['validation']
+
+    changes = [(e['previous_status'], e['status']) for e in recorded if e['event'] == 'on_status_change']
+    assert changes == [('prepared', 'progress'), ('progress', 'done')]
+
+    complete = recorded[-3]
+    assert complete['status'] == 'done'
+    assert complete['n_poll'] == 3
+    assert complete['elapsed_s'] > 0
+
+    assert recorded[-2]['n_products'] == 2
+    decode_end = recorded[-1]
+    assert decode_end['n_products'] == 2
+    assert decode_end['duration_s'] >= sum(t['duration_s'] for t in decode_end['timings'])
+    assert [t['kind'] for t in decode_end['timings']] == ['numpy_data_product'] * 2
+
+
+def test_failed_job():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=1, failure_rate=1.) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", wait=False)
+        disp.poll_interval_s = 0
+        recorded = record_events(disp, ['on_complete', 'on_decode_start'])
+
+        job = disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST"))
+        job.run(wait=True)
+
+    assert job.is_failed
+    assert [e['event'] for e in recorded] == ['on_complete']
+    assert recorded[0]['status'] == 'failed'
+    assert recorded[0]['job_id'] == job.job_id
+
+
+def test_retry():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=1) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+        disp.retry_sleep_s = 0
+        recorded = record_events(disp, ['on_retry', 'on_complete'])
+
+        job = disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST"))
+
+        original_http_get = disp._http_get
+        n_failures = [2]
+
+        def flaky_http_get(*args, **kwargs):
+            if n_failures[0] > 0:
+                n_failures[0] -= 1
+                raise ConnectionError("connection reset")
+            return original_http_get(*args, **kwargs)
+
+        disp._http_get = flaky_http_get
+        job.run(wait=True)
+
+    assert job.is_ready
+
+    retries = [e for e in recorded if e['event'] == 'on_retry']
+    assert len(retries) == 2
+    assert retries[0]['function'] == 'poll'
+    assert retries[0]['job_id'] is None
+    assert 'connection reset' in retries[0]['error']
+    # retries are not delayed, and no delay is reported
+    assert 'sleep_s' not in retries[0]
+    assert retries[0]['tries_left'] == disp.n_max_tries - 1
+    assert retries[1]['tries_left'] == disp.n_max_tries - 2
+    assert recorded[-1]['event'] == 'on_complete'
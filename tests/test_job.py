@@ -0,0 +1,108 @@
+import contextlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def test_jobs_are_independent():
+    from oda_api.api import DispatcherAPI, Job
+
+    with MockDispatcher(job_n_polls=3) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="mock", wait=False)
+        disp.poll_interval_s = 0
+
+        disp.request(dict(instrument="mock", product_type="dummy", session_id="TEST"))
+
+        job = disp.new_job(dict(instrument="mock", product_type="other", session_id="TEST2"))
+        assert isinstance(job, Job)
+        assert not job.is_submitted
+
+        job.run(wait=True)
+
+        assert job.is_ready
+        assert job.job_id != disp.job_id
+        assert disp.job is not job
+        assert not disp.is_complete
+        assert dispatcher.jobs[job.job_id].parameters['product_type'] == 'other'
+
+
+def test_many_jobs_one_client():
+    from oda_api.api import DispatcherAPI
+
+    n_jobs = 50
+
+    with MockDispatcher(job_n_polls=3, product_shape=(4, 4)) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+
+        def run_job(i):
+            job = disp.new_product_job('isgri_image', 'isgri', T1=i)
+            return job, job.result()
+
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(run_job, range(n_jobs)))
+
+    job_ids = [job.job_id for job, _ in results]
+    assert len(set(job_ids)) == n_jobs
+
+    for i, (job, data) in enumerate(results):
+        assert job.is_ready
+        assert job.parameters_dict['T1'] == i
+        assert len(data._p_list) == 1
+
+    snapshot = disp.metrics.snapshot()
+    assert snapshot['polls'] == {}
+    assert snapshot['polls_per_job']['count'] == n_jobs
+    assert snapshot['polls_per_job']['min'] == snapshot['polls_per_job']['max'] == 3
+    # connections are pooled and shared between the jobs, not opened for each request
+    assert snapshot['spans']['run_analysis']['connect']['min'] == 0
+
+
+def test_poll_before_request():
+    from oda_api.api import DispatcherAPI, UserError
+
+    disp = DispatcherAPI(url="http://127.0.0.1:1", instrument="mock")
+
+    with pytest.raises(UserError):
+        disp.poll()
+
+
+def test_request_returns_current_job():
+    from oda_api.api import DispatcherAPI, Job
+
+    with MockDispatcher(job_n_polls=2) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+
+        job = disp.request(dict(instrument="mock", product_type="dummy", session_id="TEST"))
+
+    assert isinstance(job, Job)
+    assert job is disp.job
+    assert disp.instrument == "mock"
+
+
+def test_concurrent_get_product():
+    from oda_api.api import DispatcherAPI
+
+    n_calls = 10
+
+    with MockDispatcher(job_n_polls=3, product_shape=(4, 4)) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0.01
+
+        def get_product(i):
+            return disp.get_product(instrument="isgri", product="isgri_image", T1=i)
+
+        with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=n_calls) as executor:
+            results = list(executor.map(get_product, range(n_calls)))
+
+    # one job per call
+    job_ids = set(dispatcher.jobs)
+    assert sorted(job.parameters['T1'] for job in dispatcher.jobs.values()) == sorted(str(i) for i in range(n_calls))
+    assert all(len(data._p_list) == 1 for data in results)
+    # the current job of the client is the one of the call completed last
+    assert disp.job_id in job_ids
+    assert disp.job.is_ready
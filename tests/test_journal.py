@@ -0,0 +1,67 @@
+import pytest
+
+from oda_api.journal import JobJournal
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    with MockDispatcher(job_n_polls=4, product_shape=(8, 8)) as dispatcher:
+        yield dispatcher
+
+
+def test_journal_records(tmpdir):
+    journal = JobJournal(str(tmpdir.join("jobs.sqlite")))
+
+    journal.record("job-1", "http://dispatcher", "isgri", "submitted", dict(scw_list=["1", "2"], dry_run=(False,)))
+    journal.record("job-2", "http://dispatcher", "isgri", "submitted", dict())
+    journal.record("job-1", "http://dispatcher", "isgri", "progress", dict())
+
+    entry = journal.get("job-1")
+    assert entry['query_status'] == 'progress'
+    assert entry['parameters'] == dict(scw_list=["1", "2"], dry_run=[False])
+
+    journal.record("job-2", "http://dispatcher", "isgri", "done", dict())
+    assert [e['job_id'] for e in journal.unfinished()] == ["job-1"]
+    assert journal.unfinished(url="http://other") == []
+
+    journal.forget("job-1")
+    with pytest.raises(KeyError):
+        journal.get("job-1")
+
+
+def test_resume_after_restart(dispatcher, tmpdir):
+    from oda_api.api import DispatcherAPI
+
+    journal_path = str(tmpdir.join("jobs.sqlite"))
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", wait=False, journal=journal_path)
+    assert disp.get_product(instrument="isgri", product="isgri_image", E1_keV=25.) is None
+    job_id = disp.job_id
+
+    assert [e['job_id'] for e in JobJournal(journal_path).unfinished()] == [job_id]
+
+    # client restarts, losing all state
+    del disp
+
+    resumed = DispatcherAPI.resume_unfinished(journal=journal_path, poll_interval_s=0)
+
+    assert len(resumed) == 1
+    assert resumed[0].job_id == job_id
+    assert resumed[0].is_ready
+    assert list(dispatcher.jobs) == [job_id]
+
+    data = resumed[0].collect_products()
+    assert data._p_list[0].data_unit[0].data.shape == (8, 8)
+
+    assert JobJournal(journal_path).unfinished() == []
+    assert JobJournal(journal_path).get(job_id)['query_status'] == 'done'
+
+
+def test_reattach_requires_journal(dispatcher):
+    from oda_api.api import DispatcherAPI, UserError
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+
+    with pytest.raises(UserError):
+        disp.reattach("job-1")
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("module", ["oda_api", "oda_api.api", "oda_api.data_products", "oda_api.plot_tools", "oda_api.preview"])
+def test_no_heavy_imports(module):
+    heavy = ['astropy', 'jsonschema', 'json_tricks', 'matplotlib']
+
+    imported = subprocess.check_output([
+        sys.executable, '-c',
+        f'import sys, {module}; print(" ".join(m for m in {heavy} if m in sys.modules))'
+    ]).decode().split()
+
+    assert imported == []
+
+
+def test_data_products_from_api():
+    from oda_api import api, data_products
+
+    assert api.NumpyDataProduct is data_products.NumpyDataProduct
+
+    with pytest.raises(AttributeError):
+        api.NotAProduct
@@ -0,0 +1,104 @@
+import numpy
+import pytest
+
+from oda_api import lightcurve
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+
+
+def light_curve(t, rate, err, time_bin=10.):
+    data = numpy.zeros(len(t), dtype=[('TIME', '<f8'), ('RATE', '<f4'), ('ERROR', '<f4'), ('FRACEXP', '<f4')])
+    data['TIME'] = t
+    data['RATE'] = rate
+    data['ERROR'] = err
+    data['FRACEXP'] = 1.
+
+    return NumpyDataProduct([NumpyDataUnit(numpy.zeros(1), hdu_type='primary', name='PRIMARY'),
+                             NumpyDataUnit(data, data_header=dict(EXTNAME='RATE'), hdu_type='bintable', name='RATE')],
+                            name='lc',
+                            meta_data=dict(src_name='source', time='TIME', rate='RATE', rate_err='ERROR', time_bin=time_bin))
+
+
+def test_lc_columns():
+    assert lightcurve.lc_columns(light_curve([0.], [1.], [1.])) == ('TIME', 'RATE', 'ERROR', 10., 1)
+
+
+def test_concatenate():
+    t = numpy.arange(100) * 10.
+    parts = [light_curve(t[i::3], t[i::3] / 10., 1.) for i in (2, 0, 1)]
+
+    lc = lightcurve.concatenate(parts)
+
+    data = lc.data_unit[1].data
+    assert (data['TIME'] == t).all()
+    assert (data['RATE'] == t / 10.).all()
+    assert lc.meta_data['time_bin'] == 10.
+
+    assert len(lightcurve.concatenate(parts + parts[:1], unique=True).data_unit[1].data) == 100
+
+
+def test_rebin():
+    t = numpy.arange(100) * 10.
+    lc = light_curve(t, numpy.arange(100), 2.)
+
+    rebinned = lightcurve.rebin(lc, 50.)
+    data = rebinned.data_unit[1].data
+
+    assert len(data) == 20
+    assert rebinned.meta_data['time_bin'] == 50.
+    assert data['TIME'] == pytest.approx(numpy.arange(20) * 50. + 20.)
+    assert data['RATE'] == pytest.approx(numpy.arange(20) * 5 + 2)
+    assert data['ERROR'] == pytest.approx(numpy.full(20, 2. / numpy.sqrt(5)))
+    assert data['FRACEXP'] == pytest.approx(numpy.ones(20))
+
+    # empty bins are left out
+    assert len(lightcurve.rebin(light_curve(t[t < 200], numpy.ones(20), 1.), 50.).data_unit[1].data) == 4
+
+    # input is not changed
+    assert len(lc.data_unit[1].data) == 100
+
+
+def test_stack():
+    t = numpy.arange(10) * 10.
+    lc1 = light_curve(t, numpy.ones(10), 1.)
+    lc2 = light_curve(t + 0.1, numpy.full(10, 4.), 2.)
+
+    stacked = lightcurve.stack([lc1, lc2]).data_unit[1].data
+
+    assert len(stacked) == 10
+    assert stacked['RATE'] == pytest.approx(numpy.full(10, (1 + 4 / 4.) / (1 + 1 / 4.)))
+    assert stacked['ERROR'] == pytest.approx(numpy.full(10, 1 / numpy.sqrt(1 + 1 / 4.)))
+
+    stacked = lightcurve.stack([lc1, lc2], weighted=False).data_unit[1].data
+    assert stacked['RATE'] == pytest.approx(numpy.full(10, 2.5))
+    assert stacked['ERROR'] == pytest.approx(numpy.full(10, numpy.sqrt(5) / 2))
+
+
+def test_combine_columns():
+    t = numpy.arange(10) * 10.
+    lc = light_curve(t, numpy.ones(10), 1.)
+
+    # an integer and a string column
+    data = lc.data_unit[1].data
+    columns = numpy.zeros(len(data), dtype=data.dtype.descr + [('COUNTS', '<i4'), ('FLAG', '<U4')])
+    for name in data.dtype.names:
+        columns[name] = data[name]
+    columns['COUNTS'] = numpy.arange(10)
+    columns['FLAG'] = ['ok%d' % i for i in range(10)]
+    lc.data_unit[1].data = columns
+
+    rebinned = lightcurve.rebin(lc, 20.).data_unit[1].data
+
+    assert rebinned['COUNTS'] == pytest.approx(numpy.arange(5) * 2 + 0.5)
+    assert list(rebinned['FLAG']) == ['ok0', 'ok2', 'ok4', 'ok6', 'ok8']
+
+
+def test_stack_zero_errors():
+    t = numpy.arange(10) * 10.
+    lc1 = light_curve(t, numpy.ones(10), 1.)
+    lc2 = light_curve(t, numpy.ones(10), numpy.where(t == 50., 0., 1.))
+
+    with pytest.raises(RuntimeError):
+        lightcurve.stack([lc1, lc2])
+
+    stacked = lightcurve.stack([lc1, lc2], weighted=False).data_unit[1].data
+    assert stacked['RATE'] == pytest.approx(numpy.ones(10))
@@ -0,0 +1,84 @@
+import time
+
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def wait_for_job(dispatcher, wait_method, poll_interval_s=1., **kwargs):
+    """
+    runs a job until it is complete; returns the client, the job, and how late its completion was detected
+    """
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = poll_interval_s
+    disp.wait_method = wait_method
+    for k, v in kwargs.items():
+        setattr(disp, k, v)
+
+    job = disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST"))
+    job.run(wait=True)
+    t_detected = time.time()
+
+    mock_job = dispatcher.jobs[job.job_id]
+
+    return disp, job, t_detected - (mock_job.t0 + mock_job.duration_s)
+
+
+def test_detection_latency():
+    with MockDispatcher(job_duration_s=0.3) as dispatcher:
+        _, job, latency_poll = wait_for_job(dispatcher, 'poll')
+        assert job.is_ready
+        assert job.n_poll == 2
+
+        disp, job, latency_long_poll = wait_for_job(dispatcher, 'long_poll')
+        assert job.is_ready
+        assert disp.long_poll_supported
+        assert job.last_request_long_polled
+
+    # polled at submission, and once more a second later
+    assert 0.5 < latency_poll < 5.
+    # submission, and one poll held until completion
+    assert job.n_poll == 2
+    assert 0 <= latency_long_poll < latency_poll
+
+
+def test_long_poll_timeout():
+    with MockDispatcher(job_duration_s=1.) as dispatcher:
+        disp, job, latency = wait_for_job(dispatcher, 'long_poll', long_poll_timeout_s=0.3)
+
+    assert job.is_ready
+    # polls returning at timeout are sent again at once, not after poll_interval_s
+    assert job.n_poll >= 4
+    assert 0 <= latency < disp.poll_interval_s
+
+
+def test_fallback_to_interval_polling():
+    with MockDispatcher(job_duration_s=0.3, long_poll=False) as dispatcher:
+        disp, job, latency = wait_for_job(dispatcher, 'long_poll', poll_interval_s=0.5)
+
+    assert job.is_ready
+    assert disp.long_poll_supported is False
+    assert not job.last_request_long_polled
+    # submission, one immediate poll found unsupported, then polls every 0.5 seconds
+    assert job.n_poll == 3
+    assert 0.1 < latency < 5.
+
+
+def test_post_submission():
+    with MockDispatcher(job_duration_s=0.3) as dispatcher:
+        disp, job, latency = wait_for_job(dispatcher, 'long_poll', submit_method='post')
+
+    assert job.submitted_with_post
+    assert job.n_poll == 2
+    assert 0 <= latency < disp.poll_interval_s
+
+
+def test_polls_not_held():
+    # the dispatcher held long polls earlier, and no longer does
+    with MockDispatcher(job_duration_s=0.6, long_poll=False) as dispatcher:
+        disp, job, latency = wait_for_job(dispatcher, 'long_poll', poll_interval_s=0.2, long_poll_supported=True)
+
+    assert job.is_ready
+    assert not job.last_request_long_polled
+    # polls every 0.2 seconds, not in a tight loop
+    assert job.n_poll <= 6
@@ -0,0 +1,100 @@
+import tracemalloc
+
+import pytest
+
+from oda_api import memtrace
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def test_nested_stages():
+    trace = memtrace.MemoryTrace()
+
+    with trace.activate():
+        with memtrace.stage('outer'):
+            big = bytearray(4 * 2**20)
+            with memtrace.stage('inner'):
+                temporary = bytearray(8 * 2**20)
+                del temporary
+            kept = bytearray(2**20)
+            del big
+
+    assert not tracemalloc.is_tracing()
+    assert memtrace.current_trace() is None
+
+    report = trace.report()
+    outer, inner = report['stages']
+
+    assert inner['stage'] == 'outer/inner'
+    assert inner['peak_bytes'] >= 8 * 2**20
+    assert inner['allocated_bytes'] < 2**16
+
+    # the peak of the inner stage is also one of the outer one
+    assert outer['stage'] == 'outer'
+    assert outer['peak_bytes'] >= 12 * 2**20
+    assert 2**20 <= outer['allocated_bytes'] < 2**20 + 2**16
+
+    assert report['peak_bytes'] == outer['peak_bytes']
+    assert len(kept) == 2**20
+
+
+def test_inactive():
+    assert memtrace.stage('anything').__enter__() is None
+
+
+def test_get_product():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=2, n_products=3, product_shape=(256, 256)) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+
+        data = disp.get_product(instrument="isgri", product="isgri_image")
+        assert data.memory_report is None
+        assert disp.memory_report is None
+
+        disp.trace_memory = True
+        disp.decode_executor = 'thread'
+        data = disp.get_product(instrument="isgri", product="isgri_image")
+
+    assert not tracemalloc.is_tracing()
+
+    report = data.memory_report
+    assert report == disp.memory_report
+
+    stages = {s['stage']: s for s in report['stages']}
+    assert list(stages)[:4] == ['transfer', 'json_decode', 'json_decode/json', 'json_decode/repr']
+
+    for name in ['transfer', 'json_decode/literal_eval', 'validation', 'product_decode', 'collection',
+                 'product_decode/product/json_loads', 'product_decode/product/base64_decode', 'product_decode/product/unpickle']:
+        assert name in stages
+
+    assert stages['product_decode/product']['count'] == 3
+    assert stages['product_decode/product/unpickle']['count'] == 3
+
+    # each image is 256 x 256 float32, once unpickled
+    image_nbytes = 256 * 256 * 4
+    assert stages['product_decode/product/unpickle']['allocated_bytes'] >= 3 * image_nbytes
+    assert stages['product_decode']['allocated_bytes'] >= 3 * image_nbytes
+    assert stages['transfer']['allocated_bytes'] > 3 * image_nbytes
+
+    assert [p['product'] for p in report['products']] == ['mock_image'] * 3
+    for product in report['products']:
+        assert product['kind'] == 'numpy_data_product'
+        assert product['data_nbytes'] >= image_nbytes
+        assert product['allocated_bytes'] >= image_nbytes
+        assert product['peak_bytes'] >= product['allocated_bytes']
+
+    assert report['peak_bytes'] >= stages['product_decode']['peak_bytes']
+
+
+def test_tracing_already_started():
+    tracemalloc.start()
+    try:
+        trace = memtrace.MemoryTrace()
+        with trace.activate():
+            with memtrace.stage('stage'):
+                pass
+
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
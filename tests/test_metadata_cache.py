@@ -0,0 +1,108 @@
+from oda_api.metadata_cache import MetadataCache
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def test_not_modified():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher() as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+
+        instruments = disp.get_instruments_list()
+        description = disp.get_instrument_description()
+        product_description = disp.get_product_description("isgri", "isgri_image")
+        assert dispatcher.n_not_modified == 0
+
+        bytes_sent = dispatcher.bytes_sent
+
+        # callers may modify what they get, the cached content is not affected
+        instruments.append('modified')
+
+        assert disp.get_instruments_list() == instruments[:-1]
+        assert disp.get_instrument_description() == description
+        assert disp.get_product_description("isgri", "isgri_image") == product_description
+
+        assert dispatcher.n_not_modified == 3
+        assert dispatcher.bytes_sent == bytes_sent
+        assert disp.metadata_cache.n_not_modified == 3
+        assert disp.metadata_cache.n_modified == 3
+
+        dispatcher.instruments = ['isgri', 'new_instrument']
+        assert disp.get_instruments_list() == ['isgri', 'new_instrument']
+        assert disp.get_instruments_list() == ['isgri', 'new_instrument']
+        assert dispatcher.n_not_modified == 4
+
+
+def test_without_validators():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(metadata_validators=False) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+
+        for _ in range(2):
+            assert disp.get_instruments_list() == dispatcher.instruments
+
+        assert dispatcher.n_requests == 2
+        assert disp.metadata_cache.n_not_modified == 0
+        assert disp.metadata_cache._entries == {}
+
+
+def test_disabled():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher() as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", metadata_cache=False)
+        assert disp.metadata_cache is None
+
+        for _ in range(2):
+            assert disp.get_instruments_list() == dispatcher.instruments
+
+        assert dispatcher.n_not_modified == 0
+
+
+def test_on_disk(tmpdir):
+    from oda_api.api import DispatcherAPI
+
+    path = str(tmpdir.join('metadata'))
+
+    with MockDispatcher() as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", metadata_cache=path)
+        description = disp.get_instrument_description()
+
+        # as in another process
+        other = DispatcherAPI(url=dispatcher.url, instrument="isgri", metadata_cache=path)
+        assert other.metadata_cache is not disp.metadata_cache
+        assert other.get_instrument_description() == description
+        assert dispatcher.n_not_modified == 1
+
+        # not shared between different credentials
+        other = DispatcherAPI(url=dispatcher.url, instrument="isgri", metadata_cache=path, cookies=dict(token='other'))
+        other.get_instrument_description()
+        assert dispatcher.n_not_modified == 1
+
+
+def test_last_modified_only():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher() as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.get_instruments_list()
+
+        entry, = disp.metadata_cache._entries.values()
+        entry['etag'] = None
+
+        headers = disp.metadata_cache.conditional_headers(entry)
+        assert list(headers) == ['If-Modified-Since']
+
+        assert disp.get_instruments_list() == dispatcher.instruments
+        assert dispatcher.n_not_modified == 1
+
+
+def test_unreadable_entry(tmpdir):
+    cache = MetadataCache(str(tmpdir))
+    key = cache.key('http://dispatcher', 'api/instr-list', dict(instrument='isgri'))
+
+    with open(cache._filename(key), 'w') as f:
+        f.write('not a pickle')
+
+    assert cache.get(key) is None
@@ -0,0 +1,64 @@
+from oda_api.metrics import MetricsRegistry
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+def test_histogram_and_prometheus():
+    metrics = MetricsRegistry(buckets=(0.1, 1))
+
+    for duration in 0.05, 0.5, 5:
+        metrics.observe("run_analysis", "server_wait", duration)
+    metrics.count_poll("job-1")
+    metrics.count_poll("job-1")
+    metrics.count_poll("job-2")
+    metrics.count_poll("job-2", complete=True)
+
+    h = metrics.snapshot()['spans']['run_analysis']['server_wait']
+    assert h['count'] == 3
+    assert h['buckets'] == [(0.1, 1), (1, 2), (float('inf'), 3)]
+    assert metrics.snapshot()['polls'] == {'job-1': 2}
+    assert metrics.snapshot()['n_polls'] == 4
+    assert metrics.snapshot()['polls_per_job']['count'] == 1
+    assert metrics.snapshot()['polls_per_job']['sum'] == 2
+
+    text = metrics.to_prometheus()
+    assert 'oda_api_request_span_seconds_bucket{endpoint="run_analysis",span="server_wait",le="+Inf"} 3' in text
+    assert 'oda_api_polls_total 4' in text
+    assert 'oda_api_jobs_polling 1' in text
+    assert 'oda_api_job_polls_bucket{le="2.0"} 1' in text
+    # job ids are not exported as labels
+    assert 'job-1' not in text
+
+
+def test_polling_jobs_bounded():
+    metrics = MetricsRegistry(max_jobs_polling=10)
+
+    for i in range(100):
+        metrics.count_poll("job-%d" % i)
+
+    assert list(metrics.snapshot()['polls']) == ["job-%d" % i for i in range(90, 100)]
+    assert metrics.snapshot()['n_polls'] == 100
+
+
+def test_request_spans():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=3) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="mock", wait=False)
+
+        disp.request(dict(instrument="mock", product_type="dummy", session_id="TEST"))
+        while not disp.is_complete:
+            disp.poll(silent=True)
+
+    snapshot = disp.metrics.snapshot()
+
+    assert snapshot['requests'] == {'run_analysis': 3}
+    assert snapshot['polls'] == {}
+    assert snapshot['polls_per_job']['count'] == 1
+    assert snapshot['polls_per_job']['sum'] == 3
+    assert set(snapshot['spans']['run_analysis']) == {'connect', 'server_wait', 'transfer', 'json_decode', 'validation'}
+    assert snapshot['spans']['run_analysis']['server_wait']['count'] == 3
+    # the connection is opened once and kept alive between polls
+    assert snapshot['spans']['run_analysis']['connect']['max'] > 0
+    assert snapshot['spans']['run_analysis']['connect']['min'] == 0
+
+    assert set(disp.last_request_spans.spans) == set(snapshot['spans']['run_analysis'])
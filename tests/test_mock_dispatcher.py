@@ -0,0 +1,74 @@
+import numpy
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher, run_load
+
+
+@pytest.fixture
+def dispatcher():
+    with MockDispatcher(job_n_polls=2, n_products=2, product_shape=(10, 20)) as dispatcher:
+        yield dispatcher
+
+
+def get_disp(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = 0
+    return disp
+
+
+def test_metadata(dispatcher):
+    disp = get_disp(dispatcher)
+
+    assert disp.get_instruments_list() == ['isgri', 'jemx', 'polar', 'spi_acs']
+
+    disp.get_instrument_description()
+    disp.get_product_description("isgri", "isgri_image")
+
+
+def test_get_product(dispatcher):
+    disp = get_disp(dispatcher)
+
+    data = disp.get_product(instrument="isgri", product="isgri_image", E1_keV=25.0, E2_keV=80.0, scw_list="066500220010.001")
+
+    assert disp.is_ready
+    assert len(data._p_list) == 2
+    assert data._n_list == ['mock_image_0_mosaic', 'mock_image_1_mosaic']
+    assert data.mock_image_0_mosaic.data_unit[0].data.shape == (10, 20)
+    assert data.mock_image_0_mosaic.data_unit[0].data.dtype == numpy.float32
+    assert dispatcher.jobs[disp.job_id].parameters['E1_keV'] == '25.0'
+
+
+def test_failure_injection():
+    with MockDispatcher(job_n_polls=1, failure_rate=0.5, seed=1) as dispatcher:
+        failing = [dispatcher.is_failing(dict(T1=str(i), session_id=str(i))) for i in range(100)]
+
+        assert failing == [dispatcher.is_failing(dict(T1=str(i), session_id='other')) for i in range(100)]
+        assert 20 < sum(failing) < 80
+
+        disp = get_disp(dispatcher)
+        T1 = failing.index(True)
+
+        with pytest.raises(SystemExit):
+            disp.get_product(instrument="isgri", product="isgri_image", T1=T1)
+
+        assert disp.is_failed
+        assert disp.response_json['exit_status']['status'] == 1
+
+
+def test_load(capsys):
+    statuses = []
+    for _ in range(2):
+        with MockDispatcher(job_n_polls=3, failure_rate=0.3, product_shape=(4, 4)) as dispatcher:
+            report = run_load(dispatcher.url, n_jobs=20, concurrency=5)
+
+        # jobs are run silently, without redirecting stdout of the process
+        assert capsys.readouterr().out == ''
+
+        assert report['n_jobs'] == 20
+        assert all(job['n_polls'] == 3 for job in report['jobs'])
+        statuses.append([job['status'] for job in report['jobs']])
+
+    assert statuses[0] == statuses[1]
+    assert set(statuses[0]) == {'done', 'failed'}
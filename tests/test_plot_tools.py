@@ -0,0 +1,62 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy
+import pytest
+
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+from oda_api.plot_tools import ImagePyramid, OdaImage, percentile_limits
+
+
+def test_pyramid():
+    data = numpy.arange(36, dtype=numpy.float32).reshape(6, 6)
+    data[0:2, 0:2] = numpy.nan
+    data[0, 2] = numpy.nan
+
+    pyramid = ImagePyramid(data, min_size=1)
+
+    level1 = pyramid.level(1)
+    assert level1.shape == (3, 3)
+    assert numpy.isnan(level1[0, 0])
+    assert level1[0, 1] == pytest.approx(numpy.mean([3, 8, 9]))
+    assert level1[2, 2] == pytest.approx(numpy.mean([28, 29, 34, 35]))
+
+    # odd sizes are padded
+    assert pyramid.level(2).shape == (2, 2)
+    assert pyramid.level(100).shape == (2, 2)
+
+
+def test_percentile_limits():
+    data = numpy.linspace(0, 1, 10000).reshape(100, 100)
+    data[0] = numpy.nan
+    data[1] = numpy.inf
+
+    vmin, vmax = percentile_limits(data, (0, 100))
+    assert vmin == pytest.approx(data[2, 0])
+    assert vmax == 1.
+
+    assert percentile_limits(numpy.full((10, 10), numpy.nan)) == (0., 1.)
+
+
+def test_show_levels():
+    data = numpy.random.RandomState(0).normal(size=(2048, 2048)).astype(numpy.float32)
+    image = OdaImage(NumpyDataProduct(NumpyDataUnit(data, hdu_type='image', name='image'), name='mosaic', meta_data={}))
+
+    image.show()
+
+    # whole image is shown downsampled, to about the size of the view
+    assert image.level > 0
+    assert max(image.line.get_array().shape) < 2048
+
+    image.zoom(32)
+    assert image.level == 0
+    assert max(image.line.get_array().shape) <= 2048 / 32 + 2
+
+    x0, x1 = image.ax.get_xlim()
+    image.pan(100, 0)
+    assert image.line.get_extent()[0] == pytest.approx(int(x0 + 100 + 0.5) - 0.5, abs=1)
+
+    image.smin.set_val(-1)
+    image.smax.set_val(1)
+    assert image.line.get_clim() == (-1, 1)
+
@@ -0,0 +1,87 @@
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+
+scw_list = ','.join('%08d0010.001' % (1000 + i) for i in range(2000))
+
+
+def get_lc(dispatcher, submit_method='get', compress_submission=False):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = 0
+    disp.submit_method = submit_method
+    disp.compress_submission = compress_submission
+
+    data = disp.get_product(instrument="isgri", product="isgri_lc", scw_list=scw_list)
+
+    return disp, data
+
+
+@pytest.mark.parametrize("compress_submission", [False, True])
+def test_post_submission(compress_submission):
+    with MockDispatcher(job_n_polls=5) as dispatcher:
+        _, data_get = get_lc(dispatcher)
+        bytes_received_get = dispatcher.bytes_received
+
+        disp, data = get_lc(dispatcher, 'post', compress_submission)
+        bytes_received_post = dispatcher.bytes_received - bytes_received_get
+
+    assert disp.post_submission_supported
+    assert disp.job.submitted_with_post
+
+    # products are those of the submitted parameters
+    assert dispatcher.jobs[disp.job_id].parameters['scw_list'] == scw_list
+    assert len(data._p_list[0].data_unit[0].data) == len(data_get._p_list[0].data_unit[0].data) == 20000
+
+    # parameters are sent once, not in every poll
+    assert bytes_received_post < bytes_received_get / 3
+    if compress_submission:
+        assert bytes_received_post < bytes_received_get / 10
+
+
+def test_polls_by_job_id():
+    with MockDispatcher(job_n_polls=3) as dispatcher:
+        disp, _ = get_lc(dispatcher, 'post')
+
+        payload = disp.job.parameters_dict_payload
+
+    # and the parameters by which dispatchers may route them
+    assert set(payload) == {'session_id', 'api', 'oda_api_version', 'job_id', 'query_status', 'full_report_last_index',
+                            'instrument', 'product_type', 'query_type'}
+    assert payload['session_id'] == disp.parameters_dict['session_id']
+
+
+def test_fallback_to_get():
+    with MockDispatcher(job_n_polls=3, post_submission=False) as dispatcher:
+        disp, data = get_lc(dispatcher, 'post')
+
+        assert disp.post_submission_supported is False
+        assert not disp.job.submitted_with_post
+        assert len(data._p_list[0].data_unit[0].data) == 20000
+
+        # not tried again
+        job = disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST"))
+        job.run(wait=True)
+        assert job.is_ready
+        assert not job.submitted_with_post
+
+
+def test_routing_parameters_in_polls():
+    with MockDispatcher(job_n_polls=3, routing_parameters=True) as dispatcher:
+        disp, data = get_lc(dispatcher, 'post')
+
+    assert disp.job.submitted_with_post
+    assert disp.job.is_ready
+    assert len(data._p_list[0].data_unit[0].data) == 20000
+
+
+def test_fallback_to_get_on_client_error():
+    # the dispatcher accepts POST, but not compressed bodies
+    with MockDispatcher(job_n_polls=3, gzip_submission=False) as dispatcher:
+        disp, data = get_lc(dispatcher, 'post', compress_submission=True)
+
+    assert disp.post_submission_supported is False
+    assert not disp.job.submitted_with_post
+    assert disp.job.is_ready
+    assert len(data._p_list[0].data_unit[0].data) == 20000
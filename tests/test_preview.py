@@ -0,0 +1,63 @@
+import os
+
+import numpy
+import pytest
+
+from oda_api.api import DataCollection
+from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+from oda_api.preview import preview_kind, render_previews
+
+
+def image_product(size=256):
+    data = numpy.random.RandomState(0).normal(size=(size, size)).astype(numpy.float32)
+    return NumpyDataProduct(NumpyDataUnit(data, hdu_type='image', name='image'), name='mosaic_image', meta_data={})
+
+
+def lc_product(n_bins=100):
+    data = numpy.zeros(n_bins, dtype=[('TIME', 'f8'), ('RATE', 'f4'), ('ERROR', 'f4')])
+    data['TIME'] = numpy.arange(n_bins)
+    data['RATE'] = numpy.random.RandomState(0).normal(10, 1, n_bins)
+    data['ERROR'] = 1
+    return NumpyDataProduct([NumpyDataUnit(numpy.zeros(0), hdu_type='primary', name='primary'),
+                             NumpyDataUnit(data, hdu_type='bintable', name='LC')],
+                            name='isgri_lc', meta_data=dict(src_name='Crab', time_bin=1.))
+
+
+def table_product():
+    data = numpy.zeros(3, dtype=[('NAME', 'U8'), ('FLUX', 'f4')])
+    return NumpyDataProduct(NumpyDataUnit(data, hdu_type='bintable', name='CAT'), name='catalog', meta_data={})
+
+
+def test_preview_kind():
+    assert preview_kind(image_product()) == 'image'
+    assert preview_kind(lc_product()) == 'light_curve'
+    assert preview_kind(table_product()) is None
+    assert preview_kind(object()) is None
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_render_previews(tmpdir, processes):
+    products = [image_product(), lc_product(), table_product(), image_product(64)]
+
+    report = render_previews(products, output_dir=str(tmpdir), processes=processes, figsize=(4, 3), dpi=50)
+
+    assert report['n_products'] == 4
+    assert report['n_rendered'] == 3
+    assert report['products_per_second'] > 0
+
+    assert [p['kind'] for p in report['products']] == ['image', 'light_curve', None, 'image']
+    assert report['products'][2]['error'] is not None
+
+    assert report['files'] == [os.path.join(str(tmpdir), name + '.png') for name in ('mosaic_image_0', 'isgri_lc_1', 'mosaic_image_3')]
+    for filename in report['files']:
+        with open(filename, 'rb') as f:
+            assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+
+def test_render_collection(tmpdir):
+    data = DataCollection([image_product(), lc_product()], instrument='isgri', product='image')
+
+    report = render_previews(data, output_dir=str(tmpdir), processes=1, format='svg')
+
+    assert report['files'] == [os.path.join(str(tmpdir), name + '.svg') for name in data._n_list]
+    assert all(os.path.getsize(f) > 0 for f in report['files'])
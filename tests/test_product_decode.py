@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+@pytest.mark.parametrize("decode_executor", [None, 'thread', 'process', 'auto', 'executor'])
+def test_decode_order(decode_executor):
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=1, n_products=5, product_shape=(8, 8)) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+
+        if decode_executor == 'executor':
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                disp.decode_executor = executor
+                data = disp.get_product(instrument="isgri", product="isgri_image")
+        else:
+            disp.decode_executor = decode_executor
+            data = disp.get_product(instrument="isgri", product="isgri_image")
+
+    assert [p.meta_data['id'] for p in data._p_list] == list(range(5))
+    assert [p.data_unit[0].header['PRODID'] for p in data._p_list] == list(range(5))
+    assert [t['name'] for t in data.decode_timings] == ['mock_image'] * 5
+    assert all(t['kind'] == 'numpy_data_product' and t['duration_s'] > 0 for t in data.decode_timings)
+
+    assert disp.metrics.snapshot()['spans']['product_decode']['numpy_data_product']['count'] == 5
+
+
+def test_unknown_executor():
+    from oda_api.api import DispatcherAPI, UserError
+
+    disp = DispatcherAPI(url="http://127.0.0.1:1", instrument="mock")
+    disp.decode_executor = 'gpu'
+
+    with pytest.raises(UserError):
+        disp.decode_products({'binary_data_product_list': ['YWJj']})
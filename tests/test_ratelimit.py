@@ -0,0 +1,156 @@
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from oda_api import ratelimit
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    with MockDispatcher(job_n_polls=3, product_shape=(4, 4)) as dispatcher:
+        yield dispatcher
+
+    ratelimit.clear_limits()
+
+
+def test_token_bucket():
+    bucket = ratelimit.TokenBucket(rate=20, burst=2)
+
+    t0 = time.monotonic()
+    waits = [bucket.acquire() for _ in range(6)]
+
+    assert waits[:2] == [0, 0]
+    assert time.monotonic() - t0 >= 4 / 20 * 0.9
+
+
+def test_request_rate(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = 0
+    disp.set_limits(requests_per_second=20, burst=1)
+
+    t0 = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        disp.get_product(instrument="isgri", product="isgri_image")
+
+    # parameter check and three polls
+    assert time.monotonic() - t0 >= 3 / 20 * 0.9
+
+    limits = disp.limits.snapshot()
+    assert limits['n_requests'] == 4
+    assert limits['request_wait']['sum'] > 0
+    assert disp.metrics.snapshot()['spans']['run_analysis']['queue_wait']['count'] == 3
+
+
+def test_max_in_flight_jobs(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    ratelimit.set_limits(dispatcher.url, max_in_flight_jobs=2)
+
+    def run(i):
+        # separate clients share the limits of the dispatcher
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0.02
+        return disp.get_product(instrument="isgri", product="isgri_image", T1=i)
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(run, range(8)))
+
+    limits = ratelimit.limits_snapshot()[dispatcher.url]
+    assert limits['n_jobs'] == 8
+    assert limits['max_jobs_in_flight_seen'] == 2
+    assert limits['jobs_in_flight'] == 0
+    assert limits['job_wait']['max'] > 0
+
+
+def test_no_limits(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = 0
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        disp.get_product(instrument="isgri", product="isgri_image")
+
+    assert disp.limits is None
+    assert 'queue_wait' not in disp.metrics.snapshot()['spans']['run_analysis']
+
+
+def test_in_flight_slots():
+    limits = ratelimit.DispatcherLimits('http://dispatcher', max_in_flight_jobs=1)
+
+    # held by this thread, the slot would never be free
+    limits.acquire_job()
+    with pytest.raises(ratelimit.InFlightLimitError):
+        limits.acquire_job()
+
+    # jobs already running take a slot beyond the limit
+    limits.acquire_job(wait=False)
+    assert limits.jobs_in_flight == 2
+    limits.release_job()
+    limits.release_job()
+
+    # held by another thread, it may be
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(limits.acquire_job).result()
+        with pytest.raises(ratelimit.InFlightLimitError):
+            limits.acquire_job(timeout=0.05)
+
+    assert limits.jobs_waiting == 0
+    assert limits.jobs_in_flight == 1
+
+
+def test_more_jobs_than_slots(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", wait=False)
+    disp.poll_interval_s = 0
+    disp.set_limits(max_in_flight_jobs=2)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        jobs = [disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST", T1=i)) for i in range(4)]
+
+        jobs[0].run(wait=False)
+        jobs[1].run(wait=False)
+        with pytest.raises(ratelimit.InFlightLimitError):
+            jobs[2].run(wait=False)
+
+        # completed and forgotten jobs free their slots
+        jobs[0].run(wait=True)
+        jobs[2].run(wait=False)
+        del jobs[1]
+        jobs[-1].run(wait=False)
+
+    assert disp.limits.jobs_in_flight == 2
+
+
+def test_failed_poll_releases_slot(dispatcher):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri", wait=False)
+    disp.n_max_tries = 2
+    disp.retry_sleep_s = 0
+    disp.set_limits(max_in_flight_jobs=1)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        job = disp.new_job(dict(instrument="isgri", product_type="isgri_image", session_id="TEST"))
+        job.run(wait=False)
+        assert disp.limits.jobs_in_flight == 1
+
+        def unreachable(*args, **kwargs):
+            raise ConnectionError("dispatcher unreachable")
+
+        job.request_to_json = unreachable
+        with pytest.raises(SystemExit):
+            job.run(wait=False)
+        assert disp.limits.jobs_in_flight == 0
+
+        # polled again, the job takes a slot again
+        del job.request_to_json
+        job.run(wait=False)
+        assert disp.limits.jobs_in_flight == 1
@@ -0,0 +1,56 @@
+from oda_api.custom_formatters import response_summary_lines
+from oda_api.mock_dispatcher import MockDispatcher
+
+
+description = [
+    [
+        {'instrument': 'isgri'},
+        {'prod_dict': {'isgri_image': 'isgri_image_query'}},
+        "[{'query_name': 'src_query'}, {'name': 'RA', 'units': 'deg', 'value': 83.6}]",
+        [{'query_name': 'isgri_image_query'}, {'product_name': 'isgri_image'}, {'name': 'E1_keV', 'units': 'keV', 'value': None}],
+        [1, 2.0, None, 'isgri'],
+    ]
+]
+
+
+def test_summary_lines():
+    assert list(response_summary_lines(description)) == [
+        '',
+        '--------------',
+        'instrument: isgri',
+        '',
+        '--------------',
+        'query_name: src_query',
+        ' name: RA,  value: 83.6,  units: deg, ',
+        '',
+        '--------------',
+        'query_name: isgri_image_query',
+        ' product_name: isgri_image',
+        ' name: E1_keV,  value: None,  units: keV, ',
+    ]
+
+    assert 'instrument: isgri' not in list(response_summary_lines(description, only_prod=True))
+
+
+def test_summary_deep_nesting():
+    nested = [{'name': 'deep', 'value': 1}]
+    for _ in range(5000):
+        nested = [nested]
+
+    assert list(response_summary_lines(nested)) == [' name: deep,  value: 1, ']
+
+
+def test_decode_is_silent(capsys):
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher() as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+
+        capsys.readouterr()
+        disp.get_instruments_list()
+        assert capsys.readouterr().out == ''
+
+        description = disp.get_instrument_description()
+        assert 'query_name: src_query' in capsys.readouterr().out
+
+    assert description[0][0] == {'instrument': 'isgri'}
@@ -0,0 +1,49 @@
+import jsonschema
+import pytest
+
+from oda_api.api import DispatcherAPI, UserError
+
+
+valid_response = {
+    'exit_status': {'status': 0},
+    'query_status': 'done',
+    'job_monitor': {'job_id': 'abc', 'full_report_dict_list': []},
+    'products': {'numpy_data_product_list': ['...']},
+}
+
+
+@pytest.mark.parametrize("level", ["off", "envelope", "full"])
+def test_validation_levels(level):
+    disp = DispatcherAPI(url="http://localhost:1", instrument="mock")
+    disp.response_validation_level = level
+
+    disp.validate_response(valid_response)
+
+    invalid_response = {**valid_response, 'job_monitor': {'job_id': 1}}
+
+    if level == "off":
+        disp.validate_response(invalid_response)
+    else:
+        with pytest.raises(jsonschema.ValidationError):
+            disp.validate_response(invalid_response)
+
+
+def test_validator_compiled_once():
+    disp = DispatcherAPI(url="http://localhost:1", instrument="mock")
+
+    validator = disp.response_validator
+    assert disp.response_validator is validator
+
+    disp.dispatcher_response_schema = {'type': 'object', 'properties': {'query_status': {'type': 'number'}}}
+    assert disp.response_validator is not validator
+
+    with pytest.raises(jsonschema.ValidationError):
+        disp.validate_response(valid_response)
+
+
+def test_unknown_level():
+    disp = DispatcherAPI(url="http://localhost:1", instrument="mock")
+    disp.response_validation_level = "strict"
+
+    with pytest.raises(UserError):
+        disp.validate_response(valid_response)
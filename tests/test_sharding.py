@@ -0,0 +1,129 @@
+import contextlib
+import io
+
+import numpy
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+from oda_api.sharding import split_scw_list
+
+scw_list = ",".join("%04d%04d0010.001" % (1000 + i // 3, i % 3) for i in range(10))
+
+
+def test_split_scw_list():
+    assert split_scw_list("a,b, c,d,e", 2) == ["a,b", "c,d", "e"]
+    assert split_scw_list(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+
+
+def get_product(dispatcher, product, shard_size):
+    from oda_api.api import DispatcherAPI
+
+    disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+    disp.poll_interval_s = 0
+    disp.retry_sleep_s = 0
+    disp.shard_size = shard_size
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return disp.get_product(instrument="isgri", product=product, scw_list=scw_list)
+
+
+def test_light_curve():
+    with MockDispatcher(job_n_polls=2) as dispatcher:
+        whole = get_product(dispatcher, "isgri_lc", None)
+        n_jobs = len(dispatcher.jobs)
+
+        sharded = get_product(dispatcher, "isgri_lc", 3)
+        assert len(dispatcher.jobs) - n_jobs == 4
+
+    lc, lc_whole = sharded._p_list[0].data_unit[0], whole._p_list[0].data_unit[0]
+
+    assert len(lc.data) == 100
+    assert (numpy.diff(lc.data['TIME']) > 0).all()
+    assert (lc.data == lc_whole.data).all()
+    assert lc.units_dict == lc_whole.units_dict
+
+
+def test_current_job():
+    from oda_api.api import DispatcherAPI
+
+    with MockDispatcher(job_n_polls=2) as dispatcher:
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0
+        disp.shard_size = 3
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            disp.get_product(instrument="isgri", product="isgri_image", scw_list=scw_list)
+            image_job_id = disp.job_id
+            disp.get_product(instrument="isgri", product="isgri_lc", scw_list=scw_list)
+            disp.report_last_request()
+
+    # the sharded run, over the whole scw_list, with no job id of its own
+    assert disp.is_ready
+    assert disp.job_id is None
+    assert disp.parameters_dict['scw_list'] == scw_list
+    assert sorted(job.job_id for job in disp.job.shard_jobs) == sorted(set(dispatcher.jobs) - {image_job_id})
+    assert disp.job.n_poll == 8
+
+
+def test_spectrum():
+    with MockDispatcher(job_n_polls=2) as dispatcher:
+        whole = get_product(dispatcher, "isgri_spectrum", None)
+        sharded = get_product(dispatcher, "isgri_spectrum", 4)
+
+    spectrum, spectrum_whole = sharded._p_list[0].data_unit[0], whole._p_list[0].data_unit[0]
+
+    assert spectrum.header['EXPOSURE'] == pytest.approx(spectrum_whole.header['EXPOSURE'])
+    assert numpy.allclose(spectrum.data['RATE'], spectrum_whole.data['RATE'])
+    assert numpy.allclose(spectrum.data['STAT_ERR'], spectrum_whole.data['STAT_ERR'])
+    assert (spectrum.data['CHANNEL'] == spectrum_whole.data['CHANNEL']).all()
+
+    # response is not additive, and taken from one of the shards
+    assert (sharded._p_list[0].data_unit[1].data == whole._p_list[0].data_unit[1].data).all()
+
+
+def test_failed_shards_retried():
+    with MockDispatcher(job_n_polls=1, failure_rate=0.5, transient_failures=True, seed=2) as dispatcher:
+        sharded = get_product(dispatcher, "isgri_lc", 2)
+
+        n_failed = sum(job.query_status == 'failed' for job in dispatcher.jobs.values())
+
+    assert n_failed > 0
+    assert len(dispatcher.jobs) == 5 + n_failed
+    assert len(sharded._p_list[0].data_unit[0].data) == 100
+
+
+def test_images_not_sharded():
+    with MockDispatcher(job_n_polls=1, product_shape=(4, 4)) as dispatcher:
+        get_product(dispatcher, "isgri_image", 2)
+
+        assert len(dispatcher.jobs) == 1
+
+
+def lc_collection(sources, t0=0):
+    from oda_api.api import DataCollection
+    from oda_api.data_products import NumpyDataProduct, NumpyDataUnit
+
+    products = []
+    for i, source in enumerate(sources):
+        data = numpy.zeros(3, dtype=[('TIME', '<f8'), ('RATE', '<f4')])
+        data['TIME'] = t0 + numpy.arange(3)
+        data['RATE'] = i
+        products.append(NumpyDataProduct(NumpyDataUnit(data, hdu_type='bintable', name='LC'), name='lc', meta_data=dict(src_name=source)))
+
+    return DataCollection(products)
+
+
+def test_merge_by_source():
+    from oda_api.sharding import merge_collections
+
+    # sources listed in a different order by the shards
+    merged = merge_collections([lc_collection(['A', 'B']), lc_collection(['B', 'A'], t0=3)], 'lc')
+
+    a, b = merged._p_list
+    assert a.meta_data['src_name'] == 'A'
+    assert list(a.data_unit[0].data['RATE']) == [0] * 3 + [1] * 3
+    assert list(b.data_unit[0].data['RATE']) == [1] * 3 + [0] * 3
+
+    # as many products, for different sources
+    with pytest.raises(RuntimeError):
+        merge_collections([lc_collection(['A', 'B']), lc_collection(['A', 'C'], t0=3)], 'lc')
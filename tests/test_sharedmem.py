@@ -0,0 +1,144 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+import pytest
+
+from oda_api.api import DataCollection
+from oda_api.data_products import ApiCatalog, NumpyDataProduct, NumpyDataUnit
+
+
+def lc_product(n_bins=1000):
+    data = numpy.zeros(n_bins, dtype=[('TIME', 'f8'), ('RATE', 'f4'), ('ERROR', 'f4')])
+    data['TIME'] = numpy.arange(n_bins)
+    data['RATE'] = numpy.random.RandomState(0).normal(10, 1, n_bins)
+    return NumpyDataProduct([NumpyDataUnit(None, data_header=dict(ORIGIN='ODA'), hdu_type='primary', name='PRIMARY'),
+                             NumpyDataUnit(data, data_header=dict(KEY1=1), hdu_type='bintable', name='LC',
+                                           units_dict=dict(TIME='d'))],
+                            name='isgri_lc', meta_data=dict(src_name='Crab'))
+
+
+def image_product(size=64):
+    data = numpy.arange(size * size, dtype=numpy.float32).reshape(size, size)
+    return NumpyDataProduct(NumpyDataUnit(data, hdu_type='image', name='image'), name='mosaic_image', meta_data={})
+
+
+def collection():
+    catalog = ApiCatalog(dict(cat_column_list=[[1], ['Crab'], [10.], [83.6], [22.0], [0], [0.1]],
+                              cat_column_names=['meta_ID', 'src_names', 'significance', 'ra', 'dec', 'NEW_SOURCE', 'ERR_RAD'],
+                              cat_column_descr=[['meta_ID', '<i8'], ['src_names', '<U5'], ['significance', '<f8'],
+                                                ['ra', '<f8'], ['dec', '<f8'], ['NEW_SOURCE', '<i8'], ['ERR_RAD', '<f8']],
+                              cat_lat_name='dec', cat_lon_name='ra'))
+    return DataCollection([lc_product(), image_product(), catalog], instrument='isgri', product='isgri_lc')
+
+
+def summarize(descriptor):
+    with DataCollection.from_shared_memory(descriptor) as data:
+        lc = data._p_list[0].data_unit[1].data
+        image = data._p_list[1].data_unit[0].data
+        return os.getpid(), float(lc['RATE'].sum()), float(image.sum()), lc.flags.writeable, data._n_list
+
+
+def test_collection_in_process():
+    data = collection()
+
+    with data.to_shared_memory() as shared:
+        assert shared.kind == 'collection'
+
+        with DataCollection.from_shared_memory(shared.descriptor) as view:
+            assert view._n_list == data._n_list
+
+            lc = view._p_list[0]
+            assert lc.name == 'isgri_lc'
+            assert lc.meta_data == dict(src_name='Crab')
+            assert lc.data_unit[0].data is None
+            assert lc.data_unit[0].header == dict(ORIGIN='ODA')
+            assert lc.data_unit[1].units_dict == dict(TIME='d')
+            assert lc.data_unit[1].data.dtype == data._p_list[0].data_unit[1].data.dtype
+            assert numpy.array_equal(lc.data_unit[1].data, data._p_list[0].data_unit[1].data)
+
+            image = view._p_list[1].data_unit[0].data
+            assert numpy.array_equal(image, data._p_list[1].data_unit[0].data)
+            assert image.ctypes.data % 64 == 0
+
+            # views, not copies, and read-only
+            assert not image.flags.owndata
+            with pytest.raises(ValueError):
+                image[0, 0] = 1
+
+            assert view._p_list[2].name == 'catalog'
+
+        # arrays are removed from the products of a closed view
+        assert lc.data_unit[1].data is None
+
+    # the block is removed
+    with pytest.raises(FileNotFoundError):
+        DataCollection.from_shared_memory(shared.descriptor)
+
+
+def test_unit_and_product():
+    product = lc_product()
+
+    with product.to_shared_memory() as shared:
+        with NumpyDataProduct.from_shared_memory(shared.descriptor) as view:
+            assert numpy.array_equal(view.data_unit[1].data, product.data_unit[1].data)
+
+        with pytest.raises(RuntimeError):
+            NumpyDataUnit.from_shared_memory(shared.descriptor)
+
+    unit = image_product().data_unit[0]
+    with unit.to_shared_memory() as shared:
+        with NumpyDataUnit.from_shared_memory(shared.descriptor) as view:
+            assert view.name == 'image'
+            assert numpy.array_equal(view.data, unit.data)
+
+
+def test_workers():
+    data = collection()
+    expected_rate = float(data._p_list[0].data_unit[1].data['RATE'].sum())
+    expected_image = float(data._p_list[1].data_unit[0].data.sum())
+
+    with data.to_shared_memory() as shared:
+        # descriptors are small, whatever the size of the arrays
+        import pickle
+        assert len(pickle.dumps(shared.descriptor)) < 4000
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(summarize, [shared.descriptor] * 4))
+
+    for pid, rate, image, writeable, names in results:
+        assert pid != os.getpid()
+        assert rate == pytest.approx(expected_rate)
+        assert image == pytest.approx(expected_image)
+        assert not writeable
+        assert names == data._n_list
+
+
+def test_pool_started_before_export():
+    import subprocess
+    import sys
+
+    # in a new interpreter, where no resource tracker runs before the pool is started
+    script = '''
+import sys
+from concurrent.futures import ProcessPoolExecutor
+sys.path.insert(0, sys.argv[1])
+import test_sharedmem as t
+
+with ProcessPoolExecutor(max_workers=2) as executor:
+    executor.submit(int).result()
+    data = t.collection()
+    shared = data.to_shared_memory()
+    print(len(list(executor.map(t.summarize, [shared.descriptor] * 4))))
+
+# the block is still there after the workers exit
+with t.DataCollection.from_shared_memory(shared.descriptor) as view:
+    print(view._n_list == data._n_list)
+
+shared.close()
+shared.unlink()
+'''
+    output = subprocess.run([sys.executable, '-c', script, os.path.dirname(__file__)], capture_output=True, text=True, check=True)
+
+    assert output.stdout.split() == ['4', 'True']
+    assert 'leaked' not in output.stderr
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from oda_api.mock_dispatcher import MockDispatcher
+from oda_api.singleflight import SingleFlight, request_key
+
+
+def get_products(dispatcher, single_flights, n_clients=8):
+    from oda_api.api import DispatcherAPI
+
+    barrier = threading.Barrier(n_clients)
+
+    def run(i):
+        disp = DispatcherAPI(url=dispatcher.url, instrument="isgri")
+        disp.poll_interval_s = 0.05
+        disp.deduplicate = True
+        disp.single_flight = single_flights[i % len(single_flights)]
+
+        barrier.wait()
+        return disp, disp.get_product(instrument="isgri", product="isgri_image", scw_list="066500230010.001")
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=n_clients) as executor:
+        return list(executor.map(run, range(n_clients)))
+
+
+def test_request_key():
+    assert request_key("http://a", dict(T1=1, session_id="A")) == request_key("http://a", dict(T1=1, session_id="B"))
+    assert request_key("http://a", dict(T1=1)) != request_key("http://a", dict(T1=2))
+    assert request_key("http://a", dict(T1=1)) != request_key("http://b", dict(T1=1))
+    assert request_key("http://a", dict(T1=1), dict(token="x")) != request_key("http://a", dict(T1=1), dict(token="y"))
+
+
+def test_coalesced_in_process():
+    single_flight = SingleFlight()
+
+    with MockDispatcher(job_duration_s=1, product_shape=(4, 4)) as dispatcher:
+        results = get_products(dispatcher, [single_flight])
+
+        assert len(dispatcher.jobs) == 1
+        job_id, = dispatcher.jobs
+
+    # each client has its own copy of the products, and the job which got them
+    data = [r for _, r in results]
+    assert len({id(r) for r in data}) == len(data)
+    assert all((r.mock_image_0_mosaic.data_unit[0].data == data[0].mock_image_0_mosaic.data_unit[0].data).all() for r in data)
+    assert all(disp.job_id == job_id and disp.is_ready and disp.response_json is not None for disp, _ in results)
+
+    assert single_flight.n_calls == 1
+    assert single_flight.n_coalesced == len(results) - 1
+
+
+def test_coalesced_between_processes(tmpdir):
+    # separate SingleFlight instances only share the lock directory, as they would from different processes
+    single_flights = [SingleFlight(lock_dir=str(tmpdir)) for _ in range(2)]
+
+    with MockDispatcher(job_duration_s=1, product_shape=(4, 4)) as dispatcher:
+        results = get_products(dispatcher, single_flights)
+
+        assert len(dispatcher.jobs) == 1
+
+    assert sum(sf.n_calls for sf in single_flights) == 1
+    # callers arriving after their process got the result read it from the lock directory too
+    assert sum(sf.n_shared_between_processes + sf.n_coalesced for sf in single_flights) == len(results) - 1
+    data = [r for _, r in results]
+    assert all((r.mock_image_0_mosaic.data_unit[0].data == data[0].mock_image_0_mosaic.data_unit[0].data).all() for r in data)
+    assert all(disp.job_id in dispatcher.jobs and disp.is_ready for disp, _ in results)
+
+    # results are not kept for later requests
+    assert os.listdir(str(tmpdir)) == []
+
+
+def test_lock_dir_private(tmpdir):
+    lock_dir = tmpdir.mkdir('locks')
+    os.chmod(str(lock_dir), 0o777)
+
+    with pytest.raises(RuntimeError):
+        SingleFlight(lock_dir=str(lock_dir)).do("key", lambda: 1)
+
+    new_lock_dir = os.path.join(str(tmpdir), 'new')
+    assert SingleFlight(lock_dir=new_lock_dir).do("key", lambda: 1) == 1
+    assert os.stat(new_lock_dir).st_mode & 0o777 == 0o700
+
+
+def test_not_cached_between_processes(tmpdir):
+    single_flight = SingleFlight(lock_dir=str(tmpdir))
+
+    assert single_flight.do("key", lambda: 1) == 1
+    assert single_flight.do("key", lambda: 2) == 2
+    assert single_flight.n_calls == 2
+
+
+def test_exception_shared():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait()
+        raise RuntimeError("remote failure")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(single_flight.do, "key", fail)
+        started.wait()
+        waiter = executor.submit(single_flight.do, "key", lambda: "not called")
+
+        while single_flight.n_coalesced == 0:
+            pass
+        release.set()
+
+        for future in leader, waiter:
+            with pytest.raises(RuntimeError):
+                future.result()